@@ -0,0 +1,39 @@
+# batch_ingestion.py - File parsing kernel for the dashboard's batch ingestion
+#
+# Workers receive either a server-side path (folder/glob ingestion) or the bytes of
+# an uploaded file, parse it and send the raw rows back. Type detection and schema
+# normalization run once over the union of all files in the dashboard process.
+
+import io
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import excel_engines
+
+def parse_file(name, path=None, data=None, excel_engine='auto', stream_min_bytes=excel_engines.STREAM_MIN_BYTES):
+    """Raw rows of one file: the first sheet of a workbook, a (gzip) CSV or a Parquet/Arrow file"""
+    source = path if path is not None else io.BytesIO(data)
+    lower = name.lower()
+    if lower.endswith(('.csv', '.csv.gz', '.gz')):
+        return pd.read_csv(source, compression='gzip' if lower.endswith('.gz') else None)
+    if lower.endswith('.parquet'):
+        return pq.read_table(source).to_pandas()
+    if lower.endswith(('.arrow', '.feather')):
+        if path is not None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        try:
+            return pa.ipc.open_file(pa.BufferReader(data)).read_all().to_pandas()
+        except pa.ArrowInvalid:
+            return pa.ipc.open_stream(pa.BufferReader(data)).read_all().to_pandas()
+    if path is not None:
+        with open(path, 'rb') as f:
+            head = f.read(8)
+        size = os.path.getsize(path)
+    else:
+        head, size = data[:8], len(data)
+    engine = excel_engines.choose_engine(excel_engines.workbook_format(head), size, excel_engine, stream_min_bytes)
+    return excel_engines.read_sheet(path if path is not None else data, 0, engine)
@@ -0,0 +1,291 @@
+# benchmark.py - Headless benchmark of the dashboard pipeline on synthetic sales data
+#
+# Generates workbooks and CSVs shaped like the example in the upload instructions
+# (Date, Product, Category, Quantity, Price, Total), runs every pipeline stage of
+# supermarket_multilingual without a browser and writes a JSON report that can be
+# compared across versions.
+#
+#   python benchmark.py --rows 100000 1000000 --sheets 3 --formats xlsx csv --output report.json
+
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# The app runs without `streamlit run` here: silence its bare-mode warnings
+st.logger.set_log_level('error')
+
+import excel_engines
+import supermarket_multilingual as app
+from environment_info import environment
+
+REPORT_VERSION = 1
+# Pipeline stages in the order the dashboard runs them
+STAGES = (
+    'parse', 'type_detection', 'kpi',
+    'chart1_time_series', 'chart2_top_categories', 'chart3_distribution',
+    'chart4_correlation', 'chart5_category_share', 'export',
+)
+
+# ============================================
+# SYNTHETIC DATA
+# ============================================
+def generate_sales(rows, products=200, categories=12, days=365, start='2024-01-01', seed=0):
+    """Sales rows with the columns of the dashboard's example structure"""
+    rng = np.random.default_rng(seed)
+    product_ids = rng.zipf(1.2, rows) % products
+    # Every product belongs to one category and has a base price
+    product_category = np.arange(products) % categories
+    base_price = rng.integers(20, 500, products) * 100
+    quantity = rng.integers(1, 50, rows)
+    price = base_price[product_ids] * rng.uniform(0.9, 1.1, rows).round(2)
+    seconds = rng.integers(0, days * 86400, rows)
+    return pd.DataFrame({
+        'Date': (pd.Timestamp(start) + pd.to_timedelta(np.sort(seconds), unit='s')).floor('min'),
+        'Product': np.char.add('Product ', (product_ids + 1).astype(str)),
+        'Category': np.char.add('Category ', (product_category[product_ids] + 1).astype(str)),
+        'Quantity': quantity,
+        'Price': price.round(0),
+        'Total': (quantity * price).round(0),
+    })
+
+def write_dataset(path, fmt, rows, sheets=1, seed=0, **params):
+    """Write synthetic sales to `path`: `sheets` sheets for xlsx, one table for csv / csv.gz"""
+    if fmt == 'xlsx':
+        with pd.ExcelWriter(path, engine='openpyxl') as writer:
+            for i in range(sheets):
+                sheet_df = generate_sales(rows, seed=seed + i, **params)
+                sheet_df.to_excel(writer, sheet_name=f'Sheet{i + 1}', index=False)
+    else:
+        sheet_df = generate_sales(rows, seed=seed, **params)
+        sheet_df.to_csv(path, index=False, compression='gzip' if fmt == 'csv.gz' else None)
+
+# ============================================
+# PIPELINE STAGES
+# ============================================
+class BenchmarkUpload(io.BytesIO):
+    """In-memory stand-in for Streamlit's UploadedFile"""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+class StageTimer:
+    """Wall-clock seconds per stage of one pipeline run"""
+
+    def __init__(self):
+        self.seconds = {}
+
+    def __call__(self, stage, compute):
+        start = time.perf_counter()
+        result = compute()
+        self.seconds[stage] = time.perf_counter() - start
+        return result
+
+def render(draw, *inputs):
+    """Render a chart exactly as the Matplotlib backend does, without serving it"""
+    return app.figure_to_png(draw(*inputs))
+
+def run_pipeline(data, filename, sheet, run_id):
+    """Time every stage once, cold: fresh caches and no snapshots"""
+    timer = StageTimer()
+    file_hash = f"benchmark-{run_id}-{app.hash_bytes(data)}"
+    if app.is_streaming_file(filename):
+        # CSVs are parsed, typed and aggregated in one chunked pass, as in the dashboard
+        aggregates = timer('parse', lambda: app.stream_csv_aggregates(BenchmarkUpload(data, filename), file_hash))
+        col_types = aggregates.col_types
+    else:
+        loader = app.SheetLoader(app.MemoryLRUCache(app.INGESTION_CACHE_MB * 1024 * 1024))
+        raw = timer('parse', lambda: loader.load(data, file_hash, sheet))
+
+        def detect_types():
+            # Cleaning, type detection and the dtype downcast that follows it
+            df, col_types = app.prepare_dataframe(raw)
+            return app.optimize_memory(df, col_types), col_types
+
+        df, col_types = timer('type_detection', detect_types)
+        aggregates = app.FrameAggregates(df, col_types)
+    aggregates = app.CachedAggregates(aggregates, (file_hash, sheet), app.MemoryLRUCache(app.AGGREGATION_CACHE_MB * 1024 * 1024))
+
+    numeric_cols = col_types['numeric']
+    categorical_cols = col_types['categorical']
+    date_col = col_types['datetime'][0]
+    value_col = 'Total' if 'Total' in numeric_cols else numeric_cols[-1]
+    cat_col = 'Category' if 'Category' in categorical_cols else categorical_cols[0]
+    top_n = 10
+
+    def kpi():
+        return (aggregates.row_count, aggregates.numeric_total(numeric_cols),
+                aggregates.numeric_average(numeric_cols), aggregates.unique_count(categorical_cols[:3]))
+
+    def chart1():
+        ts_data = aggregates.time_series(date_col, value_col)
+        app.SummaryStats.from_frame(ts_data, [value_col])
+        plot_data = app.downsample_series(ts_data, date_col, value_col)
+        return render(app.draw_time_series, plot_data, date_col, value_col)
+
+    def chart2():
+        cat_data = aggregates.category_totals(cat_col, value_col).head(top_n)
+        return render(app.draw_top_categories, cat_data, cat_col, value_col, top_n)
+
+    def chart3():
+        counts, edges = aggregates.histogram(value_col)
+        return render(app.draw_histogram, counts, edges, value_col)
+
+    def chart4():
+        return render(app.draw_correlation, aggregates.correlation(numeric_cols[:6]))
+
+    def chart5():
+        share_data = aggregates.value_counts(cat_col).reset_index()
+        share_data.columns = ['Category', 'Count']
+        return render(app.draw_category_share, share_data.head(8), cat_col)
+
+    def export():
+        summary_df = pd.DataFrame({
+            'Metric': ['Total Rows', 'Total Columns', 'Numeric Columns',
+                       'Categorical Columns', 'Date Columns', 'File Name', 'Sheet Name'],
+            'Value': [aggregates.row_count, len(aggregates.columns), len(numeric_cols),
+                      len(categorical_cols), len(col_types['datetime']), filename, sheet],
+        })
+        # The dataset download (where rows are kept) and the aggregate tables, as CSV
+        if hasattr(aggregates, 'iter_chunks'):
+            app.export_dataset(aggregates, 'csv').close()
+        app.export_tables({'Summary': summary_df.astype(str)}, 'csv').close()
+
+    timer('kpi', kpi)
+    timer('chart1_time_series', chart1)
+    timer('chart2_top_categories', chart2)
+    timer('chart3_distribution', chart3)
+    timer('chart4_correlation', chart4)
+    timer('chart5_category_share', chart5)
+    timer('export', export)
+    return timer.seconds, aggregates.row_count
+
+def run_engines(data, sheet, engines, repeat):
+    """Parse throughput (rows/s) and peak memory of each Excel engine on one sheet"""
+    results = {}
+    for engine in engines:
+        seconds, peaks, rows = [], [], 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            with app.PeakMemory(reset=True) as peak:
+                rows = len(excel_engines.read_sheet(data, sheet, engine))
+            seconds.append(time.perf_counter() - start)
+            peaks.append(peak.delta)
+        median = statistics.median(seconds)
+        results[engine] = {
+            'seconds': median,
+            'rows_per_second': rows / median if median else None,
+            'peak_rss_delta_bytes': None if None in peaks else max(peaks),
+        }
+        print(f"{engine:>16}: {results[engine]['rows_per_second']:12,.0f} rows/s  "
+              f"peak +{app.format_bytes(results[engine]['peak_rss_delta_bytes'] or 0)}", file=sys.stderr)
+    return results
+
+# ============================================
+# REPORT
+# ============================================
+def summarize(runs):
+    """Median, min and max seconds per stage over repeated runs"""
+    stages = [stage for stage in STAGES if stage in runs[0]]
+    return {
+        stage: {
+            'median': statistics.median(run[stage] for run in runs),
+            'min': min(run[stage] for run in runs),
+            'max': max(run[stage] for run in runs),
+        }
+        for stage in stages
+    }
+
+def run_benchmark(args):
+    results = []
+    with tempfile.TemporaryDirectory(prefix='dashboard-benchmark-') as scratch:
+        data_dir = args.data_dir or scratch
+        os.makedirs(data_dir, exist_ok=True)
+        for rows in args.rows:
+            for fmt in args.formats:
+                path = os.path.join(data_dir, f"sales_{rows}.{fmt}")
+                params = dict(products=args.products, categories=args.categories, days=args.days,
+                              start=args.start, seed=args.seed)
+                start = time.perf_counter()
+                write_dataset(path, fmt, rows, args.sheets, **params)
+                generate_seconds = time.perf_counter() - start
+                with open(path, 'rb') as f:
+                    data = f.read()
+                filename = os.path.basename(path)
+                sheet = 'Sheet1' if fmt == 'xlsx' else None
+
+                runs = []
+                for run_id in range(args.repeat):
+                    seconds, row_count = run_pipeline(data, filename, sheet, run_id)
+                    runs.append(seconds)
+                stages = summarize(runs)
+                engines = {}
+                if fmt == 'xlsx':
+                    available = excel_engines.available_engines('xlsx')
+                    engines = run_engines(data, sheet, [e for e in args.engines or available if e in available],
+                                          args.repeat)
+                result = {
+                    'format': fmt,
+                    'rows': rows,
+                    'sheets': args.sheets if fmt == 'xlsx' else 1,
+                    'file_bytes': len(data),
+                    'rows_loaded': int(row_count),
+                    'generate_seconds': generate_seconds,
+                    'excel_engine': app.choose_excel_engine(data[:8], len(data)) if fmt == 'xlsx' else None,
+                    'engines': engines,
+                    'stages': stages,
+                    'total_median': sum(stage['median'] for stage in stages.values()),
+                    'runs': runs,
+                }
+                results.append(result)
+                print(f"{fmt:>6} {rows:>10,} rows: {result['total_median']:8.3f}s "
+                      + ' '.join(f"{stage}={s['median']:.3f}" for stage, s in stages.items()),
+                      file=sys.stderr)
+    return {
+        'report_version': REPORT_VERSION,
+        'generated_at': pd.Timestamp.now(tz='UTC').isoformat(),
+        'environment': environment(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'data_dir')},
+        'results': results,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard pipeline on synthetic sales data")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000],
+                        help="dataset sizes to benchmark (rows per sheet)")
+    parser.add_argument('--sheets', type=int, default=1, help="sheets per workbook; the first one is analyzed")
+    parser.add_argument('--products', type=int, default=200, help="distinct products")
+    parser.add_argument('--categories', type=int, default=12, help="distinct categories")
+    parser.add_argument('--days', type=int, default=365, help="date span in days")
+    parser.add_argument('--start', default='2024-01-01', help="first date")
+    parser.add_argument('--formats', nargs='+', choices=['xlsx', 'csv', 'csv.gz'], default=['xlsx', 'csv'])
+    parser.add_argument('--engines', nargs='+', choices=excel_engines.ENGINES,
+                        help="Excel engines to compare on each workbook (default: every installed one)")
+    parser.add_argument('--repeat', type=int, default=3, help="cold runs per dataset; the report keeps the median")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', help="keep the generated files here (default: a temporary directory)")
+    parser.add_argument('--output', default='benchmark_report.json', help="JSON report path ('-' for stdout)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmark(args)
+    text = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+if __name__ == "__main__":
+    main()
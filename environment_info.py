@@ -0,0 +1,33 @@
+# environment_info.py - Where a benchmark, load test or startup profile ran
+#
+# The environment section of their JSON reports: Python, platform, CPU count,
+# git revision and package versions. Free of the app, so reading it does not
+# import the dashboard (startup_profile.py times that import in fresh
+# interpreters and must not pay for it itself).
+
+import os
+import platform
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment():
+    import matplotlib
+    import pyarrow
+    import streamlit
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'revision': git_revision(),
+        'packages': {module.__name__: module.__version__
+                     for module in (pd, np, pyarrow, streamlit, matplotlib)},
+    }
@@ -0,0 +1,228 @@
+# excel_engines.py - Pluggable Excel sheet readers for the dashboard's ingestion
+#
+# calamine (Rust, optional python-calamine package) is the fastest reader for
+# .xlsx and .xls alike. Without it, large .xlsx workbooks are streamed through
+# openpyxl's read-only mode in row batches that go straight into typed
+# columns, and everything else uses pandas' default reader. Free of Streamlit
+# so batch-ingestion workers can import it. The reader libraries themselves are
+# only looked up here and imported on first use, keeping them off the app's
+# startup path.
+
+import datetime
+import importlib.util
+import io
+
+import numpy as np
+import pandas as pd
+
+# Optional Rust-backed reader (used through pandas) and legacy .xls reader
+HAS_CALAMINE = importlib.util.find_spec('python_calamine') is not None
+HAS_XLRD = importlib.util.find_spec('xlrd') is not None
+
+ENGINES = ('calamine', 'openpyxl_stream', 'pandas')
+# Rows per batch when streaming a sheet through openpyxl
+STREAM_BATCH_ROWS = 10000
+# .xlsx workbooks at least this large are streamed when calamine is missing
+STREAM_MIN_BYTES = 8 * 1024 * 1024
+# Text cells pandas reads as missing by default (read_excel's na_values)
+NA_STRINGS = frozenset({
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+})
+# Legacy .xls files are OLE2 compound documents; .xlsx files are zip archives
+OLE2_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+def workbook_format(head):
+    """'xls' or 'xlsx' from the first bytes of a workbook"""
+    return 'xls' if head.startswith(OLE2_MAGIC) else 'xlsx'
+
+def available_engines(fmt):
+    """Engines able to read a workbook of the given format, fastest first"""
+    engines = []
+    if HAS_CALAMINE:
+        engines.append('calamine')
+    if fmt == 'xlsx':
+        engines.append('openpyxl_stream')
+    if fmt == 'xlsx' or HAS_XLRD:
+        engines.append('pandas')
+    return engines
+
+def choose_engine(fmt, size, requested='auto', stream_min_bytes=STREAM_MIN_BYTES):
+    """Engine for one workbook: the requested one if it can read the format, else by format and size"""
+    available = available_engines(fmt)
+    if requested in available:
+        return requested
+    if 'calamine' in available:
+        return 'calamine'
+    if fmt == 'xlsx' and size >= stream_min_bytes:
+        return 'openpyxl_stream'
+    # pandas needs xlrd for .xls and says so when it is missing
+    return 'pandas'
+
+class ColumnBuilder:
+    """One column collected batch by batch into typed arrays
+
+    Every batch is converted to a typed array (int, float, bool, datetime, str
+    or object) as soon as it is read. At the end the parts are unified the way
+    pandas would type the whole column: int and float give float, any other mix
+    gives object, and blank cells turn an int or bool column into float. In an
+    object column blanks are NaN, as pandas reads them.
+    """
+
+    def __init__(self):
+        self.kinds = set()
+        self.parts = []
+
+    @staticmethod
+    def _batch_kind(values):
+        types = set(map(type, values))
+        has_blanks = type(None) in types
+        types.discard(type(None))
+        if not types:
+            return None
+        if types <= {bool}:
+            return 'bool'
+        if types <= {int}:
+            return 'float' if has_blanks else 'int'
+        if types <= {int, float}:
+            return 'float'
+        if types <= {datetime.datetime, datetime.date}:
+            return 'datetime'
+        if types <= {str}:
+            return 'str'
+        return 'object'
+
+    def add(self, values):
+        if any(isinstance(value, str) for value in values):
+            values = [None if isinstance(value, str) and value in NA_STRINGS else value for value in values]
+        kind = self._batch_kind(values)
+        if kind is None:
+            # An all-blank batch: only its length is kept
+            self.parts.append(len(values))
+        elif kind == 'int':
+            self.parts.append(pd.Series(np.array(values, dtype=np.int64)))
+        elif kind == 'bool':
+            # With blanks: nullable, so the column still reads 1.0/0.0/NaN as float or True/False as object
+            self.parts.append(pd.Series(values, dtype='boolean' if None in values else bool))
+        elif kind == 'float':
+            # None becomes NaN
+            self.parts.append(pd.Series(np.array(values, dtype=np.float64)))
+        elif kind == 'datetime':
+            self.parts.append(pd.Series(pd.to_datetime(values)))
+        elif kind == 'str':
+            self.parts.append(pd.Series(values, dtype='str'))
+        else:
+            self.parts.append(pd.Series(np.array(values, dtype=object)))
+        self.kinds.add(kind)
+
+    def finish(self):
+        kinds = self.kinds - {None}
+        if not self.parts:
+            return pd.Series([], dtype=object)
+        if not kinds:
+            # Only blank cells: pandas reads a float column of NaN
+            return pd.Series(np.nan, index=range(sum(self.parts)), dtype=np.float64)
+        if kinds <= {'int', 'float'}:
+            kind = 'float' if 'float' in kinds or None in self.kinds else 'int'
+        elif kinds == {'bool'}:
+            blanks = None in self.kinds or any(part.dtype != bool for part in self.parts)
+            kind = 'float' if blanks else 'bool'
+        elif len(kinds) == 1:
+            kind = kinds.pop()
+        else:
+            kind = 'object'
+        if kind == 'object':
+            values = []
+            for part in self.parts:
+                values.extend([np.nan] * part if isinstance(part, int)
+                              else map(_object_cell, part.astype(object).tolist()))
+            return pd.Series(values, dtype=object)
+        if kind == 'datetime':
+            # Whatever resolution pandas parsed the dates at
+            dtype = next(part.dtype for part in self.parts if not isinstance(part, int))
+        else:
+            dtype = {'int': np.int64, 'float': np.float64, 'bool': bool, 'str': 'str'}[kind]
+        missing = {'float': np.nan, 'datetime': pd.NaT, 'str': np.nan}.get(kind)
+        parts = [pd.Series(missing, index=range(part), dtype=dtype) if isinstance(part, int)
+                 else part.astype(dtype) for part in self.parts]
+        return pd.concat(parts, ignore_index=True)
+
+def _object_cell(value):
+    """A typed part's value as pandas' openpyxl reader puts it in an object column
+
+    Blanks are NaN, whole numbers int and dates datetime.datetime.
+    """
+    if value is None or value is pd.NA or value is pd.NaT:
+        return np.nan
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else value
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+def _header(row):
+    """Column names as pandas makes them: 'Unnamed: i' for blanks, '.n' suffixes for duplicates"""
+    names, seen = [], {}
+    for i, value in enumerate(row):
+        name = f"Unnamed: {i}" if value is None else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def read_openpyxl_stream(source, sheet=0, batch_rows=STREAM_BATCH_ROWS):
+    """One sheet through openpyxl's read-only mode, a batch of rows at a time
+
+    Only the current batch exists as Python objects; each is moved into typed
+    column arrays before the next is read.
+    """
+    from openpyxl import load_workbook
+    workbook = load_workbook(source, read_only=True, data_only=True, keep_links=False)
+    try:
+        worksheet = workbook[sheet] if isinstance(sheet, str) else workbook.worksheets[sheet]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        # Trailing blank header cells are formatting, not columns
+        header = list(header)
+        while header and header[-1] is None:
+            header.pop()
+        width = len(header)
+        columns = [ColumnBuilder() for _ in range(width)]
+        batch, blank_run = [], []
+
+        def flush(batch):
+            for i, builder in enumerate(columns):
+                builder.add([row[i] if i < len(row) else None for row in batch])
+
+        for row in rows:
+            if all(value is None for value in row[:width]):
+                # Blank rows only count when data follows them (pandas drops trailing ones)
+                blank_run.append(())
+                continue
+            if blank_run:
+                batch.extend(blank_run)
+                blank_run = []
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+        return pd.DataFrame(dict(zip(_header(header), (builder.finish() for builder in columns))))
+    finally:
+        workbook.close()
+
+def read_sheet(source, sheet=0, engine='pandas', batch_rows=STREAM_BATCH_ROWS):
+    """One sheet (name or position) of a workbook given as bytes or a path"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    if engine == 'openpyxl_stream':
+        return read_openpyxl_stream(source, sheet, batch_rows)
+    if engine == 'calamine':
+        return pd.read_excel(source, sheet_name=sheet, engine='calamine')
+    return pd.read_excel(source, sheet_name=sheet)
@@ -0,0 +1,368 @@
+# loadtest.py - Concurrent simulated users of the dashboard, driven headlessly
+#
+# Every simulated user is a Streamlit AppTest session of supermarket_multilingual
+# running in this process, so the sessions share the app's process-wide caches and
+# worker pools just like the sessions of one Streamlit server. Users upload a
+# workbook, switch language and change widgets with randomized think time. For
+# each session count the JSON report gives p50/p95/p99 rerun latency, throughput
+# and the memory of this process and of its worker processes.
+#
+#   python loadtest.py --sessions 1 10 25 50 --actions 8 --think-time 2 --output loadtest_report.json
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest, app_test, local_script_runner
+from streamlit.testing.v1.util import patch_config_options
+
+# Sessions run without a server: silence the bare-mode warnings, here and in the
+# config that AppTest re-applies when it parses it
+st.config.set_option('logger.level', 'error')
+st.logger.set_log_level('error')
+
+import benchmark
+from benchmark import app
+from environment_info import environment
+
+REPORT_VERSION = 1
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'supermarket_multilingual.py')
+XLSX_MIME = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+LANGUAGE_BUTTONS = {'en': "🇺🇸 English", 'id': "🇮🇩 Indonesia"}
+# Seconds between two memory samples
+MEMORY_SAMPLE_SECONDS = 0.25
+
+# ============================================
+# CONCURRENT APPTEST SESSIONS
+# ============================================
+@contextlib.contextmanager
+def concurrent_sessions():
+    """Let AppTest sessions run concurrently in this process
+
+    Every AppTest run installs a mock Runtime singleton and removes it when it
+    finishes, which breaks any other session still running, and compiles the
+    app with a cache of its own. Inside this context a removed runtime is
+    replaced by the last one installed and all sessions share one script cache
+    (as the sessions of one server share its runtime), and the AppTest config
+    override stays on even when overlapping runs restore it out of order.
+    """
+    original_instance = Runtime.__dict__['instance'].__func__
+    last = []
+    script_cache = ScriptCache()
+
+    def instance(cls):
+        runtime = cls._instance
+        if runtime is None and last:
+            return last[0]
+        if runtime is not None:
+            last[:] = [runtime]
+        return original_instance(cls)
+
+    def exists(cls):
+        return cls._instance is not None or bool(last)
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(mock.patch.object(Runtime, 'instance', classmethod(instance)))
+        stack.enter_context(mock.patch.object(Runtime, 'exists', classmethod(exists)))
+        for module in (app_test, local_script_runner):
+            stack.enter_context(mock.patch.object(module, 'ScriptCache', lambda: script_cache))
+        stack.enter_context(patch_config_options({'global.appTest': True}))
+        yield
+
+# ============================================
+# SIMULATED USERS
+# ============================================
+def upload(at, rng, workbooks):
+    path = rng.choice(workbooks)
+    with open(path, 'rb') as f:
+        at.file_uploader[0].set_value((os.path.basename(path), f.read(), XLSX_MIME))
+    return True
+
+def switch_language(at, rng, workbooks):
+    other = 'id' if at.session_state['language'] == 'en' else 'en'
+    buttons = [b for b in at.sidebar.button if b.label == LANGUAGE_BUTTONS[other]]
+    if not buttons:
+        return False
+    buttons[0].click()
+    return True
+
+def flip_sidebar_toggle(at, rng, workbooks):
+    # Parallel aggregation and approximate mode
+    toggles = list(at.sidebar.toggle)
+    if not toggles:
+        return False
+    toggle = rng.choice(toggles)
+    toggle.set_value(not toggle.value)
+    return True
+
+def change_chart_backend(at, rng, workbooks):
+    radios = list(at.sidebar.radio)
+    if not radios:
+        return False
+    # The only sidebar radio; its options are display labels, so pick by value
+    radio = radios[0]
+    radio.set_value(rng.choice([name for name in app.CHART_BACKENDS if name != radio.value]))
+    return True
+
+def change_filter(at, rng, workbooks):
+    filters = list(at.sidebar.multiselect)
+    if not filters:
+        return False
+    widget = rng.choice(filters)
+    # Half the time a filter is cleared again
+    picked = [] if widget.value and rng.random() < 0.5 else rng.sample(widget.options, min(2, len(widget.options)))
+    widget.set_value(picked)
+    return True
+
+def change_chart_control(at, rng, workbooks):
+    # Panel controls (column pickers) live in the main area
+    selects = [s for s in at.main.selectbox if len(s.options) > 1]
+    if not selects:
+        return False
+    widget = rng.choice(selects)
+    # Any option but the current one (and the None placeholder of the column pickers)
+    widget.select_index(rng.choice([i for i, option in enumerate(widget.options)
+                                    if option != 'None' and i != widget.index] or [0]))
+    return True
+
+# Interactions after the upload, with their relative frequency
+ACTIONS = {
+    'language': (switch_language, 1),
+    'sidebar_toggle': (flip_sidebar_toggle, 1),
+    'chart_backend': (change_chart_backend, 1),
+    'filter': (change_filter, 2),
+    'chart_control': (change_chart_control, 3),
+}
+
+def run_session(session_id, workbooks, args, rng, samples, start_delay):
+    """One user: open the page, upload a workbook, then interact with think time between reruns"""
+    time.sleep(start_delay)
+    at = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+    names = list(ACTIONS)
+    weights = [ACTIONS[name][1] for name in names]
+    plan = ['open', 'upload'] + rng.choices(names, weights, k=args.actions)
+    for step, action in enumerate(plan):
+        if step:
+            time.sleep(rng.expovariate(1 / args.think_time) if args.think_time > 0 else 0)
+        start = time.perf_counter()
+        error = None
+        try:
+            if action == 'upload':
+                upload(at, rng, workbooks)
+            elif action != 'open' and not ACTIONS[action][0](at, rng, workbooks):
+                # The widget is not on the page (e.g. no filterable column)
+                continue
+            at.run()
+            if len(at.exception):
+                error = at.exception[0].value.splitlines()[0]
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        samples.append({'session': session_id, 'action': action, 'seconds': time.perf_counter() - start,
+                        'error': error})
+        if error is not None and action in ('open', 'upload'):
+            # Nothing to interact with
+            break
+
+# ============================================
+# MEMORY
+# ============================================
+def read_rss(pid):
+    """Resident set size of a process in bytes from /proc (Linux), else None"""
+    try:
+        with open(f'/proc/{pid}/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+def child_pids(pid):
+    """Direct children of a process (the app's spawned worker pools)"""
+    children = []
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return children
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', encoding='ascii') as f:
+                # The process name is parenthesized and may contain spaces
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+class MemorySampler:
+    """Samples the RSS of this process and each of its children in a background thread"""
+
+    def __init__(self, interval=MEMORY_SAMPLE_SECONDS):
+        self.interval = interval
+        self.samples = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='memory-sampler', daemon=True)
+
+    def _sample(self):
+        pid = os.getpid()
+        for process in [pid] + child_pids(pid):
+            rss = read_rss(process)
+            if rss is not None:
+                self.samples.setdefault(process, []).append(rss)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def summary(self):
+        own = self.samples.get(os.getpid(), [])
+        workers = {pid: rss for pid, rss in self.samples.items() if pid != os.getpid()}
+        return {
+            'process': {'peak_rss_bytes': max(own, default=None),
+                        'mean_rss_bytes': float(np.mean(own)) if own else None},
+            'workers': [{'pid': pid, 'peak_rss_bytes': max(rss)} for pid, rss in sorted(workers.items())],
+            # Processes peak at different times, so this is an upper bound
+            'total_peak_rss_bytes': sum(max(rss) for rss in self.samples.values()) or None,
+        }
+
+# ============================================
+# LOAD LEVELS
+# ============================================
+def latency_summary(seconds):
+    if not seconds:
+        return None
+    p50, p95, p99 = np.percentile(seconds, [50, 95, 99])
+    return {'count': len(seconds), 'p50': float(p50), 'p95': float(p95), 'p99': float(p99),
+            'mean': float(np.mean(seconds)), 'max': float(np.max(seconds))}
+
+def run_level(sessions, workbooks, args, level):
+    """Run `sessions` simulated users at once and summarize their reruns"""
+    samples = []
+    threads = []
+    for session_id in range(sessions):
+        rng = random.Random(f"{args.seed}-{level}-{session_id}")
+        # Users arrive spread over the ramp-up period rather than all in the same instant
+        delay = rng.uniform(0, args.ramp_up)
+        threads.append(threading.Thread(target=run_session, name=f'session-{session_id}',
+                                        args=(session_id, workbooks, args, rng, samples, delay)))
+    start = time.perf_counter()
+    with MemorySampler() as memory:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    wall_seconds = time.perf_counter() - start
+    ok = [s['seconds'] for s in samples if s['error'] is None]
+    errors = [s for s in samples if s['error'] is not None]
+    return {
+        'sessions': sessions,
+        'reruns': len(samples),
+        'errors': len(errors),
+        'error_messages': sorted({s['error'] for s in errors})[:10],
+        'wall_seconds': wall_seconds,
+        'throughput_reruns_per_second': len(samples) / wall_seconds if wall_seconds else None,
+        'latency': latency_summary(ok),
+        'latency_by_action': {
+            action: latency_summary([s['seconds'] for s in samples if s['action'] == action and s['error'] is None])
+            for action in ['open', 'upload', *ACTIONS]
+            if any(s['action'] == action for s in samples)
+        },
+        'memory': memory.summary(),
+    }
+
+def prepare_workbooks(args, directory):
+    """The workbooks users upload: the given ones, or synthetic sales workbooks of different stores"""
+    if args.workbooks:
+        return args.workbooks
+    paths = []
+    for i in range(args.files):
+        path = os.path.join(directory, f"store_{i + 1}.xlsx")
+        benchmark.write_dataset(path, 'xlsx', args.rows, seed=args.seed + i)
+        paths.append(path)
+    return paths
+
+def run_loadtest(args):
+    levels = []
+    with tempfile.TemporaryDirectory(prefix='dashboard-loadtest-') as scratch:
+        workbooks = prepare_workbooks(args, scratch)
+        with concurrent_sessions():
+            # Imports and first-run work happen once, outside the measurements
+            AppTest.from_file(APP_PATH, default_timeout=args.timeout).run()
+            for level, sessions in enumerate(args.sessions):
+                if args.clear_caches:
+                    st.cache_resource.clear()
+                    st.cache_data.clear()
+                result = run_level(sessions, workbooks, args, level)
+                levels.append(result)
+                latency = result['latency'] or {'p50': float('nan'), 'p95': float('nan'), 'p99': float('nan')}
+                memory = result['memory']
+                print(f"{sessions:>4} sessions: {result['reruns']:>5} reruns {result['errors']:>3} errors  "
+                      f"p50={latency['p50']:.2f}s p95={latency['p95']:.2f}s p99={latency['p99']:.2f}s  "
+                      f"{result['throughput_reruns_per_second']:.2f} reruns/s  "
+                      f"peak RSS {app.format_bytes(memory['process']['peak_rss_bytes'] or 0)}"
+                      f" + {len(memory['workers'])} workers", file=sys.stderr)
+    return {
+        'report_version': REPORT_VERSION,
+        'generated_at': pd.Timestamp.now(tz='UTC').isoformat(),
+        'environment': environment(),
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        # Cache budgets and engines under test, so runs with different settings can be compared
+        'settings': {key: value for key, value in sorted(os.environ.items()) if key.startswith('DASHBOARD_')},
+        'levels': levels,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the dashboard with concurrent simulated users")
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 5, 10],
+                        help="concurrent session counts to run, one load level each")
+    parser.add_argument('--actions', type=int, default=6, help="interactions per session after the upload")
+    parser.add_argument('--think-time', type=float, default=2.0,
+                        help="mean seconds a user waits between reruns (exponentially distributed)")
+    parser.add_argument('--ramp-up', type=float, default=5.0, help="seconds over which the sessions of a level arrive")
+    parser.add_argument('--workbooks', nargs='+', help="workbooks users upload (default: synthetic ones)")
+    parser.add_argument('--files', type=int, default=3, help="synthetic workbooks (distinct stores) to generate")
+    parser.add_argument('--rows', type=int, default=20_000, help="rows per synthetic workbook")
+    parser.add_argument('--clear-caches', action='store_true',
+                        help="clear the app's process-wide caches before each level (cold start)")
+    parser.add_argument('--timeout', type=float, default=300, help="seconds before a rerun counts as failed")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='loadtest_report.json', help="JSON report path ('-' for stdout)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_loadtest(args)
+    text = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# parallel_aggregation.py - Row-range aggregation kernels for the dashboard's process pool
+#
+# Workers receive file paths and row ranges only. The arrays themselves live in
+# memory-mapped .npy files (on /dev/shm where available), so every worker maps the
+# same physical pages instead of unpickling its own copy of the data. The
+# statistics kernel is also used in-process on DataFrames and streamed chunks.
+
+from collections import OrderedDict
+
+import numpy as np
+
+# Keep a few datasets mapped per worker; older mappings are released
+_MAX_MAPPED = 8
+_mapped = OrderedDict()
+
+def _load(path):
+    """Memory-map an array once per worker process"""
+    array = _mapped.get(path)
+    if array is None:
+        array = np.load(path, mmap_mode='r')
+        _mapped[path] = array
+        while len(_mapped) > _MAX_MAPPED:
+            _mapped.popitem(last=False)
+    else:
+        _mapped.move_to_end(path)
+    return array
+
+# Rows per block of the statistics kernel; bounds the temporaries of one step
+STATS_BLOCK_ROWS = 65536
+
+def column_stats(block):
+    """Mergeable statistics of a 2-D float block (NaN = missing)
+
+    Means, M2 and co-moments are pairwise-complete: entry [i, j] is taken over the
+    rows where columns i and j are both present, so the diagonal holds the
+    per-column values. Sums are computed on data shifted by the block's column
+    means, which keeps the single pass numerically stable.
+    """
+    block = np.asarray(block, dtype=np.float64)
+    mask = ~np.isnan(block)
+    m = mask.astype(np.float64)
+    count = mask.sum(axis=0)
+    x = np.where(mask, block, 0.0)
+    total = x.sum(axis=0)
+    shift = np.divide(total, count, out=np.zeros_like(total), where=count > 0)
+    y = np.where(mask, block - shift, 0.0)
+    n = m.T @ m
+    sy = y.T @ m
+    mean = np.divide(sy, n, out=np.zeros_like(sy), where=n > 0)
+    return {
+        'rows': len(block),
+        'sum': total,
+        'min': np.where(mask, block, np.inf).min(axis=0, initial=np.inf),
+        'max': np.where(mask, block, -np.inf).max(axis=0, initial=-np.inf),
+        'n': n,
+        'mean': mean + shift[:, None],
+        'm2': (y * y).T @ m - mean * sy,
+        'comoment': y.T @ y - mean * sy.T,
+    }
+
+def merge_column_stats(a, b):
+    """Combine the statistics of two disjoint row sets (Chan et al.)"""
+    n = a['n'] + b['n']
+    share = np.divide(b['n'], n, out=np.zeros_like(n), where=n > 0)
+    delta = b['mean'] - a['mean']
+    weight = a['n'] * share
+    return {
+        'rows': a['rows'] + b['rows'],
+        'sum': a['sum'] + b['sum'],
+        'min': np.minimum(a['min'], b['min']),
+        'max': np.maximum(a['max'], b['max']),
+        'n': n,
+        'mean': a['mean'] + delta * share,
+        'm2': a['m2'] + b['m2'] + delta * delta * weight,
+        'comoment': a['comoment'] + b['comoment'] + delta * delta.T * weight,
+    }
+
+def block_stats(values, block_rows=STATS_BLOCK_ROWS):
+    """column_stats of a 2-D array, accumulated block by block"""
+    stats = column_stats(values[:0])
+    for start in range(0, len(values), block_rows):
+        stats = merge_column_stats(stats, column_stats(values[start:start + block_rows]))
+    return stats
+
+def stats_partial(numeric_path, start, stop):
+    """Summary statistics of every numeric column over one row range"""
+    return block_stats(_load(numeric_path)[start:stop])
+
+def histogram_partial(numeric_path, col, low, high, bins, start, stop):
+    """Bin counts of one numeric column over a fixed global range"""
+    values = np.asarray(_load(numeric_path)[start:stop, col])
+    values = values[~np.isnan(values)]
+    return np.histogram(values, bins=bins, range=(low, high))[0]
+
+def group_partial(numeric_path, keys_path, key_col, n_groups, start, stop):
+    """Per-group sums and non-null counts of every numeric column, plus row counts per group"""
+    codes = np.asarray(_load(keys_path)[start:stop, key_col])
+    block = np.asarray(_load(numeric_path)[start:stop])
+    keyed = codes >= 0
+    codes, block = codes[keyed], block[keyed]
+
+    rows = np.bincount(codes, minlength=n_groups)
+    sums = np.zeros((block.shape[1], n_groups))
+    counts = np.zeros((block.shape[1], n_groups), dtype=np.int64)
+    for j in range(block.shape[1]):
+        values = block[:, j]
+        present = ~np.isnan(values)
+        sums[j] = np.bincount(codes[present], weights=values[present], minlength=n_groups)
+        counts[j] = np.bincount(codes[present], minlength=n_groups)
+    return sums, counts, rows
@@ -0,0 +1,176 @@
+# sketches.py - Mergeable probabilistic summaries for the dashboard's approximate mode
+#
+# Each sketch is fed column chunks, merges with another sketch of the same kind and
+# reports an error bound next to its estimates. Memory stays fixed however many rows
+# (or distinct values) pass through.
+
+import math
+
+import numpy as np
+import pandas as pd
+
+def hash_values(values):
+    """64-bit hashes of the non-missing values of a column chunk"""
+    series = pd.Series(values).dropna()
+    return pd.util.hash_pandas_object(series, index=False).to_numpy()
+
+class HyperLogLog:
+    """Distinct-value estimate with a relative standard error of 1.04 / sqrt(2 ** precision)"""
+
+    def __init__(self, precision=14):
+        # At least 11 index bits keep the hash suffix exactly representable as a float64
+        self.precision = max(precision, 11)
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+
+    def update(self, values):
+        hashes = hash_values(values)
+        if not len(hashes):
+            return
+        suffix_bits = 64 - self.precision
+        index = (hashes >> np.uint64(suffix_bits)).astype(np.int64)
+        suffix = hashes & np.uint64((1 << suffix_bits) - 1)
+        # Position of the first 1-bit in the suffix (frexp's exponent is its bit length)
+        bit_length = np.frexp(suffix.astype(np.float64))[1]
+        rank = (suffix_bits - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        merged = HyperLogLog(self.precision)
+        merged.registers = np.maximum(self.registers, other.registers)
+        return merged
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int((self.registers == 0).sum())
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            return m * math.log(m / zeros)
+        return raw
+
+    def nbytes(self):
+        return self.registers.nbytes
+
+class HeavyHitters:
+    """Weighted Misra-Gries (Space-Saving) summary of the largest per-key totals
+
+    At most `capacity` keys are kept. Reported totals are lower bounds that fall
+    short of the true total by at most `error`, which never exceeds
+    total / (capacity + 1). Weights must be non-negative.
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.counters = pd.Series(dtype=np.float64)
+        self.error = 0.0
+        self.total = 0.0
+
+    def _absorb(self, partial):
+        counters = self.counters.add(partial, fill_value=0)
+        if len(counters) > self.capacity:
+            threshold = counters.nlargest(self.capacity + 1).iloc[-1]
+            counters = counters[counters > threshold] - threshold
+            self.error += threshold
+        self.counters = counters
+
+    def update(self, keys, weights=None):
+        keys = pd.Series(keys)
+        weights = pd.Series(1.0 if weights is None else np.asarray(weights, dtype=np.float64),
+                            index=keys.index)
+        present = keys.notna()
+        partial = weights[present].groupby(keys[present].to_numpy()).sum()
+        self.total += float(partial.sum())
+        self._absorb(partial)
+
+    def merge(self, other):
+        merged = HeavyHitters(self.capacity)
+        merged.counters, merged.error, merged.total = self.counters, self.error + other.error, self.total + other.total
+        merged._absorb(other.counters)
+        return merged
+
+    def top(self):
+        return self.counters.sort_values(ascending=False)
+
+    def nbytes(self):
+        return int(self.counters.memory_usage(index=True, deep=True))
+
+class TDigest:
+    """Merging t-digest: quantiles and CDF with rank error concentrated away from the tails"""
+
+    def __init__(self, compression=400):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        q = (np.cumsum(weights) - weights / 2) / weights.sum()
+        # k1 scale: small clusters near the tails, large ones around the median
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        cluster = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, np.diff(cluster) != 0])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._compress(np.concatenate([self.means, values]),
+                       np.concatenate([self.weights, np.ones(len(values))]))
+
+    def merge(self, other):
+        merged = TDigest(self.compression)
+        merged.min, merged.max = min(self.min, other.min), max(self.max, other.max)
+        if len(self.means) or len(other.means):
+            merged._compress(np.concatenate([self.means, other.means]),
+                             np.concatenate([self.weights, other.weights]))
+        return merged
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def _knots(self):
+        """Interpolation points (value, cumulative weight) from min through centroids to max"""
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return (np.r_[self.min, self.means, self.max], np.r_[0.0, centers, self.count])
+
+    def quantile(self, q):
+        values, ranks = self._knots()
+        return float(np.interp(q * self.count, ranks, values))
+
+    def cdf(self, x):
+        values, ranks = self._knots()
+        return np.interp(x, values, ranks) / self.count
+
+    def rank_error(self, q):
+        """Half the weight of the centroid holding quantile q, as a fraction of all values"""
+        index = np.searchsorted(np.cumsum(self.weights), q * self.count)
+        return float(self.weights[min(index, len(self.weights) - 1)] / 2 / self.count)
+
+    def histogram(self, bins):
+        """Bin counts over [min, max] and the largest possible error of any bin"""
+        if not self.count:
+            counts, edges = np.histogram(np.array([]), bins=bins)
+            return counts, edges, 0.0
+        low, high = self.min, self.max
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+        edges = np.histogram_bin_edges([], bins=bins, range=(low, high))
+        counts = np.diff(self.cdf(edges)) * self.count
+        return counts.round().astype(np.int64), edges, float(self.weights.max())
+
+    def nbytes(self):
+        return self.means.nbytes + self.weights.nbytes
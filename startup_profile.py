@@ -0,0 +1,134 @@
+# startup_profile.py - Cold-start profile of the dashboard
+#
+# Imports supermarket_multilingual in fresh interpreters under `python -X importtime`
+# and reports what a new server process pays before the first page: the import
+# time per module the app pulls in, which of the chart and Excel libraries are
+# still deferred, and what each of them costs on first use (see prewarm()).
+#
+#   python startup_profile.py --repeat 5 --cold-font-cache --output startup.json
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+from environment_info import environment
+
+REPORT_VERSION = 1
+APP_MODULE = 'supermarket_multilingual'
+# Libraries the app defers until a chart is drawn, a workbook is read or the
+# DuckDB engine is picked
+DEFERRED_MODULES = ('matplotlib', 'matplotlib.figure', 'openpyxl', 'duckdb', 'pyarrow.dataset')
+# Runs in the fresh interpreter: time the app import, then the first use of everything deferred
+CHILD_SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+import {APP_MODULE} as app
+import_seconds = time.perf_counter() - start
+loaded = {{name: name in sys.modules for name in {DEFERRED_MODULES!r}}}
+print(json.dumps({{'import': import_seconds, 'loaded': loaded, 'first_use': app.prewarm()}}))
+"""
+
+def parse_importtime(text):
+    """(module, self seconds, cumulative seconds, depth) for each line of -X importtime output"""
+    records = []
+    for line in text.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        records.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+    return records
+
+def app_imports(records):
+    """Cumulative seconds of each module the app module itself imports
+
+    importtime prints a module after everything it imported, one level deeper,
+    so the app's direct imports are the deeper-by-one lines just before it.
+    """
+    end = next(i for i, record in enumerate(records) if record[0] == APP_MODULE)
+    depth = records[end][3]
+    start = end
+    while start > 0 and records[start - 1][3] > depth:
+        start -= 1
+    return {name: cumulative for name, _, cumulative, level in records[start:end] if level == depth + 1}
+
+def run_once(env):
+    """One cold start in a fresh interpreter"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD_SCRIPT],
+                            capture_output=True, text=True, env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(f"profiling run failed:\n{result.stderr[-2000:]}")
+    run = json.loads(result.stdout.strip().splitlines()[-1])
+    run['modules'] = app_imports(parse_importtime(result.stderr))
+    return run
+
+def median_of(runs, key):
+    """Median seconds per name of a per-run {name: seconds} dict"""
+    return {name: statistics.median(run[key][name] for run in runs) for name in runs[0][key]}
+
+def run_profile(args):
+    env = dict(os.environ)
+    runs = []
+    for i in range(args.repeat):
+        with tempfile.TemporaryDirectory() as config_dir:
+            if args.cold_font_cache:
+                # An empty Matplotlib config dir: the first chart rebuilds the font cache
+                env['MPLCONFIGDIR'] = config_dir
+            runs.append(run_once(env))
+        print(f"run {i + 1}/{args.repeat}: import={runs[-1]['import']:.3f}s "
+              + ' '.join(f"{name}={seconds:.3f}s" for name, seconds in runs[-1]['first_use'].items()),
+              file=sys.stderr)
+    modules = median_of(runs, 'modules')
+    top = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:args.top]
+    first_use = median_of(runs, 'first_use')
+    print(f"app import: {statistics.median(run['import'] for run in runs):.3f}s (median of {args.repeat})",
+          file=sys.stderr)
+    for name, seconds in top:
+        print(f"  {seconds:8.3f}s  {name}", file=sys.stderr)
+    print("first use: " + ' '.join(f"{name}={seconds:.3f}s" for name, seconds in first_use.items()),
+          file=sys.stderr)
+    return {
+        'report_version': REPORT_VERSION,
+        'generated_at': pd.Timestamp.now(tz='UTC').isoformat(),
+        'environment': environment(),
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'settings': {key: value for key, value in os.environ.items() if key.startswith('DASHBOARD_')},
+        'import_seconds': {
+            'median': statistics.median(run['import'] for run in runs),
+            'min': min(run['import'] for run in runs),
+            'max': max(run['import'] for run in runs),
+        },
+        'top_imports': dict(top),
+        # Loaded by the app import itself, i.e. not deferred (from the last run)
+        'deferred_loaded_at_startup': runs[-1]['loaded'],
+        'first_use_seconds': first_use,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the dashboard's cold start in fresh interpreters")
+    parser.add_argument('--repeat', type=int, default=3, help="fresh interpreters; the report keeps the median")
+    parser.add_argument('--top', type=int, default=15, help="slowest direct imports of the app to report")
+    parser.add_argument('--cold-font-cache', action='store_true',
+                        help="start every run without a Matplotlib font cache, as a fresh container does")
+    parser.add_argument('--output', default='startup_profile.json', help="JSON report path ('-' for stdout)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_profile(args)
+    text = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+if __name__ == "__main__":
+    main()
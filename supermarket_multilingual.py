@@ -8,18 +8,135 @@ warnings.filterwarnings('ignore')
 
 import os
 import sys
+import io
+import re
+import argparse
+import base64
+import html
+import hashlib
+import importlib
+import importlib.util
+import json
+import logging
+import threading
+import time
+import shutil
+import tempfile
+import weakref
+import copy
+import glob
+import pickle
+import contextlib
+import contextvars
+import uuid
+import multiprocessing
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from xml.etree import ElementTree
 
 # Suppress Streamlit warnings
 os.environ['STREAMLIT_SERVER_ENABLE_STATIC_SERVING'] = 'true'
 os.environ['STREAMLIT_BROWSER_GATHER_USAGE_STATS'] = 'false'
+# Charts are only ever rasterized: pick the non-interactive backend before
+# Matplotlib is first imported, so it never probes for a GUI toolkit
+os.environ.setdefault('MPLBACKEND', 'Agg')
+# `python supermarket_multilingual.py report|warmup ...` runs without Streamlit
+# (spawned worker processes see the same argv)
+HEADLESS_COMMAND = sys.argv[1] if sys.argv[1:2] in (['report'], ['warmup']) else None
 
 # ============================================
 # MAIN IMPORTS
 # ============================================
 import streamlit as st
+if HEADLESS_COMMAND or __name__ == '__mp_main__':
+    # No Streamlit server behind the headless commands, nor in spawned pool workers
+    # (which re-import this script as __mp_main__): silence bare-mode warnings
+    st.logger.set_log_level('error')
 import pandas as pd
+from pandas.tseries.api import guess_datetime_format
 import numpy as np
-import matplotlib.pyplot as plt
+# Streamlit itself imports Plotly; Matplotlib and the Excel readers are imported
+# where they are first used (see COLD START for pre-warming them)
+import plotly.graph_objects as go
+
+import batch_ingestion
+import excel_engines
+import parallel_aggregation
+import sketches
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+# Optional out-of-core query engine; it and pyarrow.dataset are imported when
+# the DuckDB engine is first used
+HAS_DUCKDB = importlib.util.find_spec('duckdb') is not None
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# PERFORMANCE SETTINGS
+# ============================================
+# Memory budget shared by every session for parsed workbooks (in MB)
+INGESTION_CACHE_MB = int(os.environ.get('DASHBOARD_INGESTION_CACHE_MB', '1024'))
+# Parse the sheet after the selected one in the background
+PREFETCH_NEXT_SHEET = os.environ.get('DASHBOARD_PREFETCH_NEXT_SHEET', '1') == '1'
+# Directory for cleaned, type-detected Arrow snapshots of uploaded sheets
+SNAPSHOT_DIR = os.environ.get('DASHBOARD_SNAPSHOT_DIR', os.path.join('.dashboard_cache', 'snapshots'))
+# Memory budget for memoized chart/KPI aggregates shared between sessions (in MB)
+AGGREGATION_CACHE_MB = int(os.environ.get('DASHBOARD_AGGREGATION_CACHE_MB', '256'))
+# Pre-aggregate loaded datasets into a rollup cube (totals, days, categories and cells)
+ROLLUP_CUBE = os.environ.get('DASHBOARD_ROLLUP_CUBE', '1') == '1'
+# Categorical columns with more distinct values get no rollup (their queries read the rows)
+CUBE_MAX_CARDINALITY = int(os.environ.get('DASHBOARD_CUBE_MAX_CARDINALITY', '1000'))
+# Cells (one per combination of day and categorical values) kept for filtered views
+CUBE_MAX_CELLS = int(os.environ.get('DASHBOARD_CUBE_MAX_CELLS', '100000'))
+# Default chart renderer: 'matplotlib' (cached static images) or 'plotly' (client-side WebGL)
+CHART_BACKEND = os.environ.get('DASHBOARD_CHART_BACKEND', 'matplotlib')
+# Memory budget for rendered Matplotlib images (in MB)
+IMAGE_CACHE_MB = int(os.environ.get('DASHBOARD_IMAGE_CACHE_MB', '128'))
+# Largest number of points plotted for one series (larger series are LTTB-downsampled)
+MAX_PLOT_POINTS = int(os.environ.get('DASHBOARD_MAX_PLOT_POINTS', '2000'))
+# Process-pool aggregation: '1' on, '0' off, 'auto' on for datasets of PARALLEL_MIN_ROWS or more
+PARALLEL_AGGREGATION = os.environ.get('DASHBOARD_PARALLEL_AGGREGATION', 'auto')
+PARALLEL_WORKERS = int(os.environ.get('DASHBOARD_PARALLEL_WORKERS', str(os.cpu_count() or 1)))
+PARALLEL_MIN_ROWS = int(os.environ.get('DASHBOARD_PARALLEL_MIN_ROWS', '1000000'))
+# Default query engine: 'pandas' (in memory) or 'duckdb' (SQL over the Arrow snapshot, out of core)
+QUERY_ENGINE = os.environ.get('DASHBOARD_QUERY_ENGINE', 'pandas')
+# Where DuckDB spills intermediate results that exceed its memory limit
+DUCKDB_TEMP_DIR = os.environ.get('DASHBOARD_DUCKDB_TEMP_DIR', os.path.join('.dashboard_cache', 'duckdb'))
+# DuckDB memory limit, e.g. '2GB' (empty: DuckDB's default of 80% of RAM)
+DUCKDB_MEMORY_LIMIT = os.environ.get('DASHBOARD_DUCKDB_MEMORY_LIMIT', '')
+# Directory of datasets grown by append-mode uploads
+DATASET_DIR = os.environ.get('DASHBOARD_DATASET_DIR', os.path.join('.dashboard_cache', 'datasets'))
+# Dataset that append mode writes to unless another name is entered
+APPEND_DATASET = os.environ.get('DASHBOARD_APPEND_DATASET', 'sales')
+# Comma-separated dedupe key columns for new append datasets (empty: the whole row)
+APPEND_KEY = [c.strip() for c in os.environ.get('DASHBOARD_APPEND_KEY', '').split(',') if c.strip()]
+# Record per-stage timings for every session ('1'); a single session can opt in with ?debug=1
+INSTRUMENTATION = os.environ.get('DASHBOARD_INSTRUMENTATION', '0') == '1'
+# JSON-lines file receiving one record per instrumented stage (empty: no log)
+INSTRUMENTATION_LOG = os.environ.get('DASHBOARD_INSTRUMENTATION_LOG', '')
+# Prometheus text file rewritten after each instrumented run, for a textfile collector (empty: none)
+METRICS_FILE = os.environ.get('DASHBOARD_METRICS_FILE', '')
+# Server-side directory batch mode may read folders / glob patterns from (empty: uploads only)
+BATCH_ROOT = os.environ.get('DASHBOARD_BATCH_ROOT', '')
+# Categorical columns with more distinct values than this get no filter
+FILTER_MAX_VALUES = int(os.environ.get('DASHBOARD_FILTER_MAX_VALUES', '1000'))
+# Excel reader: 'auto' (by format and size), 'calamine', 'openpyxl_stream' or 'pandas'
+EXCEL_ENGINE = os.environ.get('DASHBOARD_EXCEL_ENGINE', 'auto')
+# Without calamine, .xlsx workbooks of at least this many MB are streamed through openpyxl
+EXCEL_STREAM_MIN_MB = float(os.environ.get('DASHBOARD_EXCEL_STREAM_MIN_MB', '8'))
+# Rows per chunk when exporting the dataset; bounds the memory of an export
+EXPORT_CHUNK_ROWS = int(os.environ.get('DASHBOARD_EXPORT_CHUNK_ROWS', '100000'))
+# Start in approximate mode: sketches answer distinct counts, Top-N, shares and histograms
+APPROXIMATE_MODE = os.environ.get('DASHBOARD_APPROXIMATE', '0') == '1'
+# Rows per chunk when streaming CSV uploads
+STREAM_CHUNK_ROWS = int(os.environ.get('DASHBOARD_STREAM_CHUNK_ROWS', '200000'))
+# Categorical columns with more distinct values than this are dropped from streamed aggregates
+STREAM_MAX_DISTINCT = int(os.environ.get('DASHBOARD_STREAM_MAX_DISTINCT', '100000'))
+# Import the chart and Excel libraries in the background on the server's first run
+PREWARM = os.environ.get('DASHBOARD_PREWARM', '0') == '1'
 
 # ============================================
 # MULTI-LANGUAGE DICTIONARIES
@@ -41,21 +158,82 @@ translations = {
         'numeric': "Numeric",
         'categorical': "Categorical",
         'date': "Date",
+        'memory': "Memory",
+        'cube_info': "🧊 Rollup cube built in {seconds:.2f}s · {size}",
+        'parallel_aggregation': "⚙️ Parallel aggregation ({workers} workers)",
+        'parallel_aggregation_help': "Compute KPIs and chart aggregates across a process pool over shared memory (filtered views use the rollup cube)",
+        'query_engine': "🧮 Query Engine",
+        'query_engine_help': "DuckDB answers every aggregate with SQL over the on-disk Arrow snapshot and spills to disk instead of holding the dataset in memory",
+        'engine_pandas': "pandas (in memory)",
+        'engine_duckdb': "DuckDB (out of core)",
+        'approximate_mode': "≈ Approximate mode",
+        'approximate_mode_help': "Answer distinct counts, Top-N, shares and histograms from fixed-size sketches (HyperLogLog, heavy hitters, t-digest) built once per dataset",
+        'sketch_info': "≈ Sketches built in {seconds:.2f}s · {size}",
+        'filters': "🔎 Filters",
+        'filter_all': "All",
+        'filter_info': "🔎 Filter matches {rows:,} of {total:,} rows",
+        'filter_empty': "No rows match the active filters",
+        'debug_panel': "🐞 Debug: stage timings",
+        'debug_stage': "Stage",
+        'debug_wall': "Wall (ms)",
+        'debug_cpu': "CPU (ms)",
+        'debug_rss': "Peak RSS Δ",
+        'debug_hits': "Cache hits",
+        'debug_misses': "Cache misses",
+        'debug_metrics': "Process-wide metrics (Prometheus text format)",
+        'batch_mode': "🗂️ Batch mode",
+        'batch_mode_help': "Combine many files (e.g. one per store per week) into one dataset with a source-file column; files are parsed in parallel",
+        'batch_upload_label': "📤 Upload files",
+        'batch_upload_help': "Workbooks use their first sheet; columns are matched by name",
+        'batch_pattern': "📁 Folder or glob pattern",
+        'batch_pattern_help': "Relative to {root}, e.g. stores/2024-*/*.xlsx or **/*.csv",
+        'batch_no_files': "No supported files match",
+        'batch_parsing': "Parsing {files:,} files…",
+        'batch_progress': "{done:,} of {total:,} files",
+        'batch_file_ok': "✅ {name}: {rows:,} rows",
+        'batch_file_failed': "❌ {name}: {error}",
+        'batch_done': "🗂️ {files:,} files · {rows:,} rows",
+        'batch_failures': "⚠️ {count:,} files could not be read and were skipped:",
+        'batch_all_failed': "❌ None of the files could be read",
+        'batch_name': "{files:,} files",
+        'approx_unique': "≈ ±{bound:,.0f} (95%, HyperLogLog)",
+        'approx_top': "≈ Heavy-hitter totals; each bar may be low by up to {bound:,.0f}",
+        'approx_share': "≈ Heavy-hitter counts; each slice may be low by up to {bound:,.0f}",
+        'approx_hist': "≈ t-digest: each bin ±{bound:,.0f} rows · p5 {p5:,.2f} · p50 {p50:,.2f} · p95 {p95:,.2f} (rank error ±{rank:.2%})",
+        'append_mode': "➕ Append mode",
+        'append_mode_help': "Add this upload to a persisted dataset instead of replacing it; rows already in the dataset are skipped",
+        'dataset_name': "Dataset",
+        'dedupe_key': "Deduplicate on",
+        'dedupe_key_help': "Rows whose values in these columns are already in the dataset are skipped (empty: the whole row)",
+        'append_ready': "{rows:,} rows ready to append to dataset **{dataset}**",
+        'append_button': "➕ Append",
+        'append_done': "✅ Appended {added:,} new rows ({duplicates:,} duplicates skipped)",
+        'append_already': "This upload is already part of dataset **{dataset}**",
+        'append_pending': "Append this upload to create the dataset",
+        'dataset_info': "📚 Dataset **{dataset}**: {rows:,} rows from {uploads} uploads",
+        'append_schema_mismatch': "❌ Upload does not match the dataset schema: {problems}",
+        'schema_missing': "missing columns {columns}",
+        'schema_extra': "unexpected columns {columns}",
+        'schema_type': "column {column} is not {kind}",
         
         # Chart Controls
-        'time_series': "📈 Time Series",
+        'chart_backend': "🖼️ Chart Rendering",
+        'backend_matplotlib': "Static (Matplotlib)",
+        'backend_plotly': "Interactive (Plotly)",
         'select_date': "Date Column",
         'select_value': "Numeric Value",
-        'top_categories': "🏆 Top Categories",
+        'granularity': "Granularity",
+        'granularity_hour': "Hour",
+        'granularity_day': "Day",
+        'granularity_week': "Week",
+        'granularity_month': "Month",
+        'granularity_quarter': "Quarter",
         'category_column': "Category Column",
         'value_for_category': "Value for Category",
         'top_n_items': "Number of Top N",
-        'distribution': "📊 Distribution",
         'column_for_histogram': "Column for Histogram",
-        'correlation': "🔗 Correlation",
         'select_numeric_columns': "Select numeric columns",
         'correlation_warning': "Minimum 2 numeric columns for correlation",
-        'category_share': "🍕 Category Share",
         'column_for_pie': "Column for Pie Chart",
         
         # KPI Section
@@ -74,23 +252,38 @@ translations = {
         'chart5_title': "5. Category Share",
         
         # Chart Info Messages
-        'ts_info': "⚠️ Select date column and numeric value in sidebar",
-        'cat_info': "⚠️ Select category column and numeric value in sidebar",
+        'ts_info': "⚠️ Select a date column and a numeric value above",
+        'downsampled': "Showing {shown:,} of {total:,} points (LTTB downsampling)",
+        'cat_info': "⚠️ Select a category column and a numeric value above",
         'dist_info': "⚠️ Select numeric column for histogram",
         'corr_info': "⚠️ Select minimum 2 numeric columns",
-        'share_info': "⚠️ Select category column in sidebar",
+        'share_info': "⚠️ Select a category column above",
         
         # Export Section
         'export_title': "💾 Export Data",
-        'download_report': "📥 Download Summary Report",
-        'download_csv': "Click to Download CSV",
+        'export_format': "Format",
+        'export_csv': "CSV",
+        'export_parquet': "Parquet",
+        'export_xlsx': "Excel",
+        'download_dataset': "📥 Download Data ({rows:,} rows)",
+        'download_dataset_help': "The cleaned dataset with the sidebar filters applied, written in chunks",
+        'download_aggregates': "📥 Download Summary & Chart Tables",
+        'download_aggregates_help': "Summary and the full aggregate behind every configured chart; one sheet (Excel) or one file in a zip (CSV, Parquet) per table",
+        'export_streamed': "Streamed CSV uploads keep aggregates only; their rows are not available for export",
+        'export_failed': "❌ The last export failed: {error}",
         'refresh': "🔄 Refresh Dashboard",
         
+        # Cache Statistics
+        'cache_stats': "⚡ Cache Statistics",
+        'cache_ingestion': "Parsed files",
+        'cache_aggregation': "Chart aggregates",
+        'cache_summary': "{hits:,} hits / {misses:,} misses · {entries:,} entries · {size}",
+        
         # Upload Instructions
         'upload_instructions_title': "👆 **Please upload your supermarket data Excel file**",
         'upload_instructions': """
         **Recommended file format:**
-        - Extension: .xlsx or .xls
+        - Extension: .xlsx or .xls (or a .parquet/.arrow snapshot)
         - Minimum columns: Date, Product/Category, and Value (numeric)
         - Example columns: `Date`, `Product Name`, `Category`, `Quantity`, `Price`, `Total`
         
@@ -104,8 +297,16 @@ translations = {
         
         # Success/Error Messages
         'success_upload': "✅ File successfully uploaded: {filename} | Sheet: {sheet}",
+        'parse_info': "⚡ Parsed with {engine}: {rows:,} rows in {seconds:.2f}s ({rate:,.0f} rows/s) · peak memory +{peak}",
+        'excel_engine_calamine': "calamine",
+        'excel_engine_openpyxl_stream': "openpyxl (streaming)",
+        'excel_engine_pandas': "pandas (default reader)",
         'error_reading': "❌ Error reading Excel file: {error}",
         
+        # Headless reports
+        'report_source': "Source: {filename} · {rows:,} rows · generated {timestamp}",
+        'report_chart_skipped': "This file has no suitable columns for this chart.",
+        
         # Footer
         'footer': "🛒 **Supermarket Business Dashboard** v1.0 | Built with Streamlit | Last uploaded: {timestamp}",
         
@@ -136,21 +337,82 @@ translations = {
         'numeric': "Numerik",
         'categorical': "Kategorikal",
         'date': "Tanggal",
+        'memory': "Memori",
+        'cube_info': "🧊 Rollup cube dibangun dalam {seconds:.2f} detik · {size}",
+        'parallel_aggregation': "⚙️ Agregasi paralel ({workers} worker)",
+        'parallel_aggregation_help': "Hitung KPI dan agregat chart di beberapa proses melalui shared memory (tampilan terfilter memakai rollup cube)",
+        'query_engine': "🧮 Mesin Kueri",
+        'query_engine_help': "DuckDB menjawab setiap agregat dengan SQL langsung dari snapshot Arrow di disk dan menumpahkan data ke disk alih-alih menyimpan seluruh dataset di memori",
+        'engine_pandas': "pandas (di memori)",
+        'engine_duckdb': "DuckDB (di luar memori)",
+        'approximate_mode': "≈ Mode perkiraan",
+        'approximate_mode_help': "Jawab jumlah nilai unik, Top-N, proporsi, dan histogram dari sketch berukuran tetap (HyperLogLog, heavy hitters, t-digest) yang dibangun sekali per dataset",
+        'sketch_info': "≈ Sketch dibangun dalam {seconds:.2f} detik · {size}",
+        'filters': "🔎 Filter",
+        'filter_all': "Semua",
+        'filter_info': "🔎 Filter cocok dengan {rows:,} dari {total:,} baris",
+        'filter_empty': "Tidak ada baris yang cocok dengan filter aktif",
+        'debug_panel': "🐞 Debug: waktu per tahap",
+        'debug_stage': "Tahap",
+        'debug_wall': "Waktu (ms)",
+        'debug_cpu': "CPU (ms)",
+        'debug_rss': "Puncak RSS Δ",
+        'debug_hits': "Cache hit",
+        'debug_misses': "Cache miss",
+        'debug_metrics': "Metrik seluruh proses (format teks Prometheus)",
+        'batch_mode': "🗂️ Mode batch",
+        'batch_mode_help': "Gabungkan banyak file (mis. satu per toko per minggu) menjadi satu dataset dengan kolom file sumber; file diproses secara paralel",
+        'batch_upload_label': "📤 Upload file",
+        'batch_upload_help': "Workbook memakai sheet pertamanya; kolom dicocokkan berdasarkan nama",
+        'batch_pattern': "📁 Folder atau pola glob",
+        'batch_pattern_help': "Relatif terhadap {root}, mis. stores/2024-*/*.xlsx atau **/*.csv",
+        'batch_no_files': "Tidak ada file didukung yang cocok",
+        'batch_parsing': "Memproses {files:,} file…",
+        'batch_progress': "{done:,} dari {total:,} file",
+        'batch_file_ok': "✅ {name}: {rows:,} baris",
+        'batch_file_failed': "❌ {name}: {error}",
+        'batch_done': "🗂️ {files:,} file · {rows:,} baris",
+        'batch_failures': "⚠️ {count:,} file tidak dapat dibaca dan dilewati:",
+        'batch_all_failed': "❌ Tidak ada file yang dapat dibaca",
+        'batch_name': "{files:,} file",
+        'approx_unique': "≈ ±{bound:,.0f} (95%, HyperLogLog)",
+        'approx_top': "≈ Total heavy-hitter; setiap batang bisa kurang hingga {bound:,.0f}",
+        'approx_share': "≈ Jumlah heavy-hitter; setiap irisan bisa kurang hingga {bound:,.0f}",
+        'approx_hist': "≈ t-digest: setiap bin ±{bound:,.0f} baris · p5 {p5:,.2f} · p50 {p50:,.2f} · p95 {p95:,.2f} (galat peringkat ±{rank:.2%})",
+        'append_mode': "➕ Mode Tambah",
+        'append_mode_help': "Tambahkan unggahan ini ke dataset tersimpan alih-alih menggantinya; baris yang sudah ada di dataset dilewati",
+        'dataset_name': "Dataset",
+        'dedupe_key': "Deduplikasi berdasarkan",
+        'dedupe_key_help': "Baris yang nilai kolom-kolom ini sudah ada di dataset akan dilewati (kosong: seluruh baris)",
+        'append_ready': "{rows:,} baris siap ditambahkan ke dataset **{dataset}**",
+        'append_button': "➕ Tambahkan",
+        'append_done': "✅ {added:,} baris baru ditambahkan ({duplicates:,} duplikat dilewati)",
+        'append_already': "Unggahan ini sudah menjadi bagian dari dataset **{dataset}**",
+        'append_pending': "Tambahkan unggahan ini untuk membuat dataset",
+        'dataset_info': "📚 Dataset **{dataset}**: {rows:,} baris dari {uploads} unggahan",
+        'append_schema_mismatch': "❌ Unggahan tidak sesuai dengan skema dataset: {problems}",
+        'schema_missing': "kolom hilang {columns}",
+        'schema_extra': "kolom tidak dikenal {columns}",
+        'schema_type': "kolom {column} bukan {kind}",
         
         # Chart Controls
-        'time_series': "📈 Time Series",
+        'chart_backend': "🖼️ Rendering Chart",
+        'backend_matplotlib': "Statis (Matplotlib)",
+        'backend_plotly': "Interaktif (Plotly)",
         'select_date': "Kolom Tanggal",
         'select_value': "Nilai Numerik",
-        'top_categories': "🏆 Top Categories",
+        'granularity': "Granularitas",
+        'granularity_hour': "Jam",
+        'granularity_day': "Hari",
+        'granularity_week': "Minggu",
+        'granularity_month': "Bulan",
+        'granularity_quarter': "Kuartal",
         'category_column': "Kolom Kategori",
         'value_for_category': "Nilai untuk Kategori",
         'top_n_items': "Jumlah Top N",
-        'distribution': "📊 Distribusi",
         'column_for_histogram': "Kolom untuk Histogram",
-        'correlation': "🔗 Korelasi",
         'select_numeric_columns': "Pilih kolom numerik",
         'correlation_warning': "Minimal 2 kolom numerik untuk korelasi",
-        'category_share': "🍕 Category Share",
         'column_for_pie': "Kolom untuk Pie Chart",
         
         # KPI Section
@@ -169,23 +431,38 @@ translations = {
         'chart5_title': "5. Pembagian Kategori",
         
         # Chart Info Messages
-        'ts_info': "⚠️ Pilih kolom tanggal dan nilai numerik di sidebar",
-        'cat_info': "⚠️ Pilih kolom kategori dan nilai numerik di sidebar",
+        'ts_info': "⚠️ Pilih kolom tanggal dan nilai numerik di atas",
+        'downsampled': "Menampilkan {shown:,} dari {total:,} titik (downsampling LTTB)",
+        'cat_info': "⚠️ Pilih kolom kategori dan nilai numerik di atas",
         'dist_info': "⚠️ Pilih kolom numerik untuk histogram",
         'corr_info': "⚠️ Pilih minimal 2 kolom numerik",
-        'share_info': "⚠️ Pilih kolom kategori di sidebar",
+        'share_info': "⚠️ Pilih kolom kategori di atas",
         
         # Export Section
         'export_title': "💾 Export Data",
-        'download_report': "📥 Download Laporan Ringkasan",
-        'download_csv': "Klik untuk Download CSV",
+        'export_format': "Format",
+        'export_csv': "CSV",
+        'export_parquet': "Parquet",
+        'export_xlsx': "Excel",
+        'download_dataset': "📥 Download Data ({rows:,} baris)",
+        'download_dataset_help': "Dataset yang sudah dibersihkan dengan filter sidebar diterapkan, ditulis per bagian",
+        'download_aggregates': "📥 Download Ringkasan & Tabel Grafik",
+        'download_aggregates_help': "Ringkasan dan agregat lengkap dari setiap grafik yang dikonfigurasi; satu sheet (Excel) atau satu file dalam zip (CSV, Parquet) per tabel",
+        'export_streamed': "Upload CSV yang di-stream hanya menyimpan agregat; barisnya tidak tersedia untuk diekspor",
+        'export_failed': "❌ Ekspor terakhir gagal: {error}",
         'refresh': "🔄 Refresh Dashboard",
         
+        # Cache Statistics
+        'cache_stats': "⚡ Statistik Cache",
+        'cache_ingestion': "File yang sudah diparse",
+        'cache_aggregation': "Agregat chart",
+        'cache_summary': "{hits:,} hit / {misses:,} miss · {entries:,} entri · {size}",
+        
         # Upload Instructions
         'upload_instructions_title': "👆 **Silakan upload file Excel data supermarket Anda**",
         'upload_instructions': """
         **Format file yang disarankan:**
-        - Ekstensi: .xlsx atau .xls
+        - Ekstensi: .xlsx atau .xls (atau snapshot .parquet/.arrow)
         - Minimal memiliki kolom: Tanggal, Produk/Kategori, dan Nilai (angka)
         - Contoh kolom: `Tanggal`, `Nama Produk`, `Kategori`, `Jumlah`, `Harga`, `Total`
         
@@ -198,8 +475,16 @@ translations = {
         
         # Success/Error Messages
         'success_upload': "✅ File berhasil diupload: {filename} | Sheet: {sheet}",
+        'parse_info': "⚡ Diproses dengan {engine}: {rows:,} baris dalam {seconds:.2f} dtk ({rate:,.0f} baris/dtk) · memori puncak +{peak}",
+        'excel_engine_calamine': "calamine",
+        'excel_engine_openpyxl_stream': "openpyxl (streaming)",
+        'excel_engine_pandas': "pandas (pembaca bawaan)",
         'error_reading': "❌ Error membaca file Excel: {error}",
         
+        # Headless reports
+        'report_source': "Sumber: {filename} · {rows:,} baris · dibuat {timestamp}",
+        'report_chart_skipped': "File ini tidak memiliki kolom yang sesuai untuk chart ini.",
+        
         # Footer
         'footer': "🛒 **Dashboard Bisnis Supermarket** v1.0 | Dibuat dengan Streamlit | Data terakhir diupload: {timestamp}",
         
@@ -245,239 +530,3932 @@ st.set_page_config(
 )
 
 # ============================================
-# LANGUAGE SWITCHER IN SIDEBAR
+# INGESTION CACHE
 # ============================================
-def create_language_switcher():
-    """Create language switcher in sidebar"""
-    st.sidebar.markdown("---")
-    st.sidebar.subheader("🌍 Language / Bahasa")
+def frame_nbytes(df):
+    """Approximate in-memory size of a DataFrame in bytes"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+class MemoryLRUCache:
+    """Thread-safe LRU cache bounded by the total byte size of its entries"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, key, value, nbytes):
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            # Entries larger than the whole budget are never stored
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self.total_bytes += nbytes
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_bytes
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+@st.cache_resource
+def get_ingestion_cache():
+    """Process-wide workbook cache shared between all sessions"""
+    return MemoryLRUCache(INGESTION_CACHE_MB * 1024 * 1024)
+
+def hash_bytes(data):
+    """Content hash used as the cache key for uploaded files"""
+    return hashlib.sha256(data).hexdigest()
+
+def _cell_ref_to_row_col(ref):
+    """Convert an A1-style cell reference to 1-based (row, column) numbers"""
+    letters = ''.join(ch for ch in ref if ch.isalpha())
+    digits = ''.join(ch for ch in ref if ch.isdigit())
+    col = 0
+    for ch in letters.upper():
+        col = col * 26 + (ord(ch) - ord('A') + 1)
+    return int(digits or 0), col
+
+def _read_xlsx_sheet_dimension(zf, member):
+    """Read the <dimension ref=...> of a worksheet without touching sheetData"""
+    with zf.open(member) as fh:
+        for _, elem in ElementTree.iterparse(fh, events=("start",)):
+            tag = elem.tag.rsplit('}', 1)[-1]
+            if tag == 'dimension':
+                ref = elem.get('ref', '')
+                if ':' not in ref:
+                    return None
+                (first_row, first_col), (last_row, last_col) = (
+                    _cell_ref_to_row_col(part) for part in ref.split(':')
+                )
+                # First row of the used range is the header row
+                return max(last_row - first_row, 0), last_col - first_col + 1
+            if tag == 'sheetData':
+                return None
+    return None
+
+def list_sheets(data, filename):
+    """List (sheet name, (rows, cols) or None) from workbook metadata without parsing cells"""
+    if filename.lower().endswith('.xls'):
+        try:
+            import xlrd
+            book = xlrd.open_workbook(file_contents=data, on_demand=True)
+            return [(name, None) for name in book.sheet_names()]
+        except ImportError:
+            engine = 'calamine' if excel_engines.HAS_CALAMINE else None
+            return [(name, None) for name in pd.ExcelFile(io.BytesIO(data), engine=engine).sheet_names]
     
-    col1, col2 = st.sidebar.columns(2)
+    ns = {
+        'm': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
+        'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+        'rel': 'http://schemas.openxmlformats.org/package/2006/relationships',
+    }
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        workbook = ElementTree.fromstring(zf.read('xl/workbook.xml'))
+        rels = ElementTree.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+        targets = {
+            rel.get('Id'): rel.get('Target') for rel in rels.findall('rel:Relationship', ns)
+        }
+        sheets = []
+        for sheet in workbook.findall('m:sheets/m:sheet', ns):
+            target = targets.get(sheet.get(f"{{{ns['r']}}}id"), '')
+            member = target.lstrip('/') if target.startswith('/') else f"xl/{target}"
+            dims = None
+            if member in zf.namelist():
+                dims = _read_xlsx_sheet_dimension(zf, member)
+            sheets.append((sheet.get('name'), dims))
+    return sheets
+
+def format_sheet_label(name, dims):
+    """Selectbox label for a sheet, with its size when the workbook records it"""
+    if dims is None:
+        return name
+    return f"{name} ({dims[0]:,} × {dims[1]:,})"
+
+def choose_excel_engine(head, size):
+    """Excel reader for a workbook, from its first bytes (format) and size"""
+    return excel_engines.choose_engine(excel_engines.workbook_format(head), size, EXCEL_ENGINE,
+                                       int(EXCEL_STREAM_MIN_MB * 1024 * 1024))
+
+class SheetLoader:
+    """Parses single sheets on demand and prefetches likely next sheets in the background
+
+    Every parse records its engine, rows, seconds and peak memory in `parse_stats`.
+    """
+
+    MAX_PARSE_STATS = 256
+
+    def __init__(self, cache, max_workers=2):
+        self.cache = cache
+        self.parse_stats = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sheet-prefetch")
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _parse(self, key, data, sheet):
+        try:
+            engine = choose_excel_engine(data[:8], len(data))
+            start = time.perf_counter()
+            with PeakMemory() as peak:
+                sheet_df = excel_engines.read_sheet(data, sheet, engine)
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self.parse_stats[key] = {'engine': engine, 'rows': len(sheet_df), 'seconds': seconds,
+                                         'peak_rss_delta_bytes': peak.delta}
+                while len(self.parse_stats) > self.MAX_PARSE_STATS:
+                    self.parse_stats.popitem(last=False)
+            self.cache.put(key, sheet_df, frame_nbytes(sheet_df))
+            return sheet_df
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def load(self, data, file_hash, sheet):
+        key = (file_hash, sheet)
+        sheet_df = self.cache.get(key)
+        if sheet_df is not None:
+            return sheet_df
+        with self._lock:
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._pending[key] = future
+        if not owner:
+            # Already being parsed by a prefetch or another session: wait for it
+            return future.result()
+        try:
+            sheet_df = self._parse(key, data, sheet)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        future.set_result(sheet_df)
+        return sheet_df
+
+    def prefetch(self, data, file_hash, sheet):
+        key = (file_hash, sheet)
+        with self._lock:
+            if key in self._pending or key in self.cache:
+                return
+            self._pending[key] = self._executor.submit(self._parse, key, data, sheet)
+
+@st.cache_resource
+def get_sheet_loader():
+    """Process-wide sheet loader backed by the shared ingestion cache"""
+    return SheetLoader(get_ingestion_cache())
+
+# ============================================
+# DATA PREPARATION
+# ============================================
+TYPE_SAMPLE_SIZE = 2000
+DATE_MIN_VALID_RATIO = 0.3      # 30% valid dates
+NUMERIC_MIN_VALID_RATIO = 0.95  # share of non-empty values that must parse as numbers
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+CATEGORY_MAX_UNIQUE = 10000
+
+def is_text_column(series):
+    """Object or pandas string columns, the only ones that need type detection"""
+    return series.dtype == object or isinstance(series.dtype, pd.StringDtype)
+
+def stratified_sample(series, size=TYPE_SAMPLE_SIZE, seed=0):
+    """One random row from each of `size` equal-width row-range strata"""
+    n = len(series)
+    if n <= size:
+        return series
+    rng = np.random.default_rng(seed)
+    edges = np.linspace(0, n, size + 1)
+    positions = (edges[:-1] + rng.random(size) * np.diff(edges)).astype(np.int64)
+    return series.iloc[np.minimum(positions, n - 1)]
+
+def guess_date_format(sample):
+    """Most common strftime format among sampled strings, or None if none is recognised"""
+    formats = [
+        guess_datetime_format(value)
+        for value in sample.dropna().astype(str).head(50)
+    ]
+    formats = [fmt for fmt in formats if fmt]
+    if not formats:
+        return None
+    return max(set(formats), key=formats.count)
+
+def parse_dates_cached(series, date_format=None):
+    """Parse each distinct string once and broadcast the results back to every row"""
+    codes, uniques = pd.factorize(series)
+    parsed = pd.to_datetime(
+        pd.Index(uniques, dtype=object), format=date_format or 'mixed', errors='coerce'
+    ).to_numpy()
+    result = np.full(len(codes), np.datetime64('NaT'), dtype=parsed.dtype)
+    valid = codes >= 0
+    result[valid] = parsed[codes[valid]]
+    return pd.Series(result, index=series.index, name=series.name)
+
+def detect_text_column(series, allow_dates):
+    """Classify one text column from a sample; convert it in full only if the sample passes"""
+    sample = stratified_sample(series)
+    non_empty = sample.dropna()
+    if len(non_empty) == 0:
+        return 'categorical', series, None
     
-    with col1:
-        if st.button("🇺🇸 English", use_container_width=True, 
-                    type="primary" if st.session_state.language == 'en' else "secondary"):
-            st.session_state.language = 'en'
-            st.rerun()
+    try:
+        numeric_sample = pd.to_numeric(non_empty, errors='coerce')
+        if numeric_sample.notna().mean() >= NUMERIC_MIN_VALID_RATIO:
+            return 'numeric', pd.to_numeric(series, errors='coerce'), None
+        
+        if allow_dates:
+            date_format = guess_date_format(non_empty)
+            parsed_sample = parse_dates_cached(sample, date_format)
+            if parsed_sample.notna().mean() > DATE_MIN_VALID_RATIO:
+                parsed = parse_dates_cached(series, date_format)
+                if parsed.notna().sum() > len(parsed) * DATE_MIN_VALID_RATIO:
+                    return 'datetime', parsed, date_format
+    except (ValueError, TypeError, OverflowError) as e:
+        logger.debug("Type detection failed for column %r: %s", series.name, e)
+    return 'categorical', series, None
+
+def is_low_cardinality(series):
+    """Whether a categorical column repeats few enough values to store as `category`"""
+    n = len(series)
+    if n == 0:
+        return False
+    # Cheap sample estimate first; the full count only runs for likely candidates
+    sample = stratified_sample(series)
+    if sample.nunique() > len(sample) * CATEGORY_MAX_UNIQUE_RATIO and n > len(sample):
+        return False
+    n_unique = series.nunique()
+    return n_unique <= CATEGORY_MAX_UNIQUE and n_unique <= n * CATEGORY_MAX_UNIQUE_RATIO
+
+def prepare_dataframe(df):
+    """Basic cleaning and column type detection for a freshly parsed sheet"""
+    # Basic cleaning (returns a new frame, so cached raw sheets are never mutated)
+    with stage('cleaning'):
+        df = df.dropna(axis=1, how="all")
     
-    with col2:
-        if st.button("🇮🇩 Indonesia", use_container_width=True,
-                    type="primary" if st.session_state.language == 'id' else "secondary"):
-            st.session_state.language = 'id'
-            st.rerun()
+    # Detect column types
+    with stage('type_detection'):
+        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+        datetime_cols = df.select_dtypes(include=["datetime"]).columns.tolist()
+        # Date auto-detection only runs when the sheet has no native date column
+        allow_dates = not datetime_cols
     
-    st.sidebar.markdown("---")
+        text_cols = [c for c in df.columns if is_text_column(df[c])]
+        date_formats = {}
+        if text_cols:
+            with ThreadPoolExecutor(max_workers=min(8, len(text_cols))) as pool:
+                results = list(pool.map(lambda c: detect_text_column(df[c], allow_dates), text_cols))
+            for col, (kind, converted, date_format) in zip(text_cols, results):
+                if kind == 'numeric':
+                    df[col] = converted
+                    numeric_cols.append(col)
+                elif kind == 'datetime':
+                    df[col] = converted
+                    datetime_cols.append(col)
+                    date_formats[col] = date_format
+    
+        categorical_cols = [c for c in df.columns if c not in numeric_cols + datetime_cols]
+        col_types = {
+            'numeric': numeric_cols,
+            'datetime': datetime_cols,
+            'categorical': categorical_cols,
+            'low_cardinality': [c for c in categorical_cols if is_low_cardinality(df[c])],
+            'date_formats': date_formats,
+        }
+    return df, col_types
+
+def format_bytes(nbytes):
+    """Human-readable byte size"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(nbytes) < 1024 or unit == 'GB':
+            return f"{nbytes:,.1f} {unit}" if unit != 'B' else f"{nbytes:,} B"
+        nbytes /= 1024
+
+def optimize_memory(df, col_types):
+    """Store low-cardinality text as `category` and downcast numbers where lossless"""
+    before = frame_nbytes(df)
+    for col in col_types.get('low_cardinality', []):
+        if not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    for col in col_types['numeric']:
+        series = df[col]
+        if pd.api.types.is_integer_dtype(series.dtype):
+            df[col] = pd.to_numeric(series, downcast='integer')
+        elif series.dtype == np.float64:
+            narrowed = series.astype(np.float32)
+            if np.array_equal(narrowed.to_numpy(np.float64), series.to_numpy(), equal_nan=True):
+                df[col] = narrowed
+    col_types['memory'] = {'before': before, 'after': frame_nbytes(df)}
+    return df
+
+def widen_floats(obj):
+    """Upcast float32 columns so sums accumulate in float64 like the original data"""
+    if isinstance(obj, pd.Series):
+        return obj.astype(np.float64) if obj.dtype == np.float32 else obj
+    narrow = {c: np.float64 for c, dtype in obj.dtypes.items() if dtype == np.float32}
+    return obj.astype(narrow) if narrow else obj
 
 # ============================================
-# MAIN DASHBOARD UI
+# COLUMNAR SNAPSHOTS
 # ============================================
-def main():
-    # Title and subtitle
-    st.title(t('title'))
-    st.markdown(t('subtitle'))
-    
-    # Language switcher in sidebar
-    create_language_switcher()
+# Bump when prepare_dataframe changes so stale snapshots are rebuilt
+SNAPSHOT_FORMAT_VERSION = 3
+SNAPSHOT_METADATA_KEY = b'dashboard.column_types'
+COLUMNAR_EXTENSIONS = ('.parquet', '.arrow', '.feather')
+
+def is_columnar_file(filename):
+    """Whether an upload is a Parquet/Arrow file rather than an Excel workbook"""
+    return filename.lower().endswith(COLUMNAR_EXTENSIONS)
+
+def snapshot_path(file_hash, sheet):
+    """Location of the Arrow snapshot for one sheet of an uploaded workbook"""
+    sheet_hash = hash_bytes(str(sheet).encode('utf-8'))[:12]
+    return os.path.join(SNAPSHOT_DIR, f"{file_hash}-{sheet_hash}.arrow")
+
+def table_column_types(table):
+    """Column classification stored in a snapshot's schema metadata, if any"""
+    metadata = table.schema.metadata or {}
+    if SNAPSHOT_METADATA_KEY not in metadata:
+        return None
+    stored = json.loads(metadata[SNAPSHOT_METADATA_KEY])
+    if stored.get('version') != SNAPSHOT_FORMAT_VERSION:
+        return None
+    return {key: value for key, value in stored.items() if key != 'version'}
+
+def write_arrow_file(table, path):
+    """Write an uncompressed Arrow IPC file atomically"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary name first so readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+def arrow_safe_frame(df):
+    """The frame with object columns, and categoricals with object categories, as strings
+
+    Such columns can mix Python types (a store column holding 'S1' and 7), which
+    pa.Table.from_pandas rejects. Missing values stay missing.
+    """
+    mixed = [col for col in df.columns
+             if df[col].dtype == object
+             or (isinstance(df[col].dtype, pd.CategoricalDtype) and df[col].cat.categories.dtype == object)]
+    if not mixed:
+        return df
+    df = df.copy(deep=False)
+    for col in mixed:
+        df[col] = df[col].astype(str)
+    return df
+
+def save_snapshot(df, col_types, file_hash, sheet):
+    """Persist a prepared sheet as an uncompressed Arrow IPC file (memory-mappable)"""
+    path = snapshot_path(file_hash, sheet)
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[SNAPSHOT_METADATA_KEY] = json.dumps(
+            {'version': SNAPSHOT_FORMAT_VERSION, **col_types}
+        ).encode('utf-8')
+        table = table.replace_schema_metadata(metadata)
+        write_arrow_file(table, path)
+    except (pa.ArrowException, OSError, TypeError, ValueError) as e:
+        # Mixed-type object columns or non-string headers cannot be stored
+        logger.warning("Could not write snapshot for sheet %r: %s", sheet, e)
+
+def load_snapshot(file_hash, sheet):
+    """Memory-map a previously saved snapshot, or return None if there is none"""
+    path = snapshot_path(file_hash, sheet)
+    if not os.path.exists(path):
+        return None
+    try:
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    except (pa.ArrowException, OSError) as e:
+        logger.warning("Ignoring unreadable snapshot %s: %s", path, e)
+        return None
+    col_types = table_column_types(table)
+    if col_types is None:
+        return None
+    # split_blocks keeps one block per column so null-free columns stay zero-copy
+    return table.to_pandas(split_blocks=True), col_types
+
+def read_columnar_upload(data, filename):
+    """Read an uploaded Parquet or Arrow (IPC file/stream) payload into an Arrow table"""
+    if filename.lower().endswith('.parquet'):
+        return pq.read_table(pa.BufferReader(data))
+    try:
+        return pa.ipc.open_file(pa.BufferReader(data)).read_all()
+    except pa.ArrowInvalid:
+        return pa.ipc.open_stream(pa.BufferReader(data)).read_all()
+
+def load_prepared_dataset(loader, data, file_hash, filename, sheet=None):
+    """Cleaned, type-detected DataFrame for an upload, via memory cache, snapshot or parse"""
+    cache = get_ingestion_cache()
+    key = (file_hash, sheet, 'prepared')
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
     
-    # File uploader
-    uploaded_file = st.file_uploader(
-        t('upload_label'), 
-        type=["xlsx", "xls"], 
-        help=t('upload_help')
-    )
+    if is_columnar_file(filename):
+        table = read_columnar_upload(data, filename)
+        col_types = table_column_types(table)
+        df = table.to_pandas(split_blocks=True)
+        if col_types is None:
+            df, col_types = prepare_dataframe(df)
+            df = optimize_memory(df, col_types)
+    else:
+        with stage('snapshot_load'):
+            snapshot = load_snapshot(file_hash, sheet)
+        if snapshot is not None:
+            df, col_types = snapshot
+        else:
+            with stage('parse'):
+                raw = loader.load(data, file_hash, sheet)
+            df, col_types = prepare_dataframe(raw)
+            with stage('cleaning'):
+                df = optimize_memory(df, col_types)
+            with stage('snapshot_save'):
+                save_snapshot(df, col_types, file_hash, sheet)
     
-    if uploaded_file is not None:
-        # Read Excel file
-        try:
-            xl = pd.read_excel(uploaded_file, sheet_name=None)
-        except Exception as e:
-            st.error(t('error_reading', error=str(e)))
-            st.stop()
-        
-        # Sheet selection
-        sheet_names = list(xl.keys())
-        if len(sheet_names) > 1:
-            sheet = st.selectbox(
-                t('select_sheet'), 
-                sheet_names, 
-                help=t('select_sheet_help')
-            )
+    cache.put(key, (df, col_types), frame_nbytes(df))
+    return df, col_types
+
+# ============================================
+# SUMMARY STATISTICS
+# ============================================
+class SummaryStats:
+    """Count, sum, mean, variance, covariance, min/max and nulls of every numeric column
+
+    Built in one vectorized pass (parallel_aggregation.column_stats) and mergeable,
+    so chunks, row ranges and appended uploads combine without revisiting rows.
+    Any subset of columns is answered from the full matrices.
+    """
+
+    def __init__(self, columns, moments):
+        self.columns = list(columns)
+        self.moments = moments
+
+    @classmethod
+    def from_values(cls, columns, values):
+        return cls(columns, parallel_aggregation.block_stats(values))
+
+    @classmethod
+    def from_frame(cls, df, columns=None):
+        columns = list(df.columns if columns is None else columns)
+        values = widen_floats(df[columns]).to_numpy(np.float64, na_value=np.nan)
+        return cls.from_values(columns, values.reshape(len(df), len(columns)))
+
+    def merge(self, other):
+        return SummaryStats(self.columns, parallel_aggregation.merge_column_stats(self.moments, other.moments))
+
+    def _idx(self, cols):
+        return [self.columns.index(c) for c in cols]
+
+    def _diagonal(self, name, cols):
+        idx = self._idx(cols)
+        return pd.Series(np.diagonal(self.moments[name])[idx], index=list(cols))
+
+    def count(self, cols):
+        return self._diagonal('n', cols).astype(np.int64)
+
+    def nulls(self, cols):
+        return self.moments['rows'] - self.count(cols)
+
+    def sum(self, cols):
+        return pd.Series(self.moments['sum'][self._idx(cols)], index=list(cols))
+
+    def mean(self, cols):
+        # Sum over count, exactly as pandas computes a column mean
+        count = self.count(cols)
+        return (self.sum(cols) / count).where(count > 0)
+
+    def variance(self, cols):
+        count = self.count(cols)
+        return (self._diagonal('m2', cols) / (count - 1)).where(count > 1)
+
+    def min(self, cols):
+        return pd.Series(self.moments['min'][self._idx(cols)], index=list(cols)).replace(np.inf, np.nan)
+
+    def max(self, cols):
+        return pd.Series(self.moments['max'][self._idx(cols)], index=list(cols)).replace(-np.inf, np.nan)
+
+    def total(self, cols):
+        return self.sum(cols).sum()
+
+    def average(self, cols):
+        """Mean of the per-column means, like DataFrame.mean().mean()"""
+        return self.mean(cols).mean()
+
+    def covariance(self, cols):
+        ix = np.ix_(self._idx(cols), self._idx(cols))
+        n = self.moments['n'][ix]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = np.where(n > 1, self.moments['comoment'][ix] / (n - 1), np.nan)
+        return pd.DataFrame(cov, index=list(cols), columns=list(cols))
+
+    def correlation(self, cols):
+        """Pairwise-complete Pearson correlation, like DataFrame.corr()"""
+        ix = np.ix_(self._idx(cols), self._idx(cols))
+        n, m2 = self.moments['n'][ix], self.moments['m2'][ix]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = np.clip(self.moments['comoment'][ix] / np.sqrt(m2 * m2.T), -1.0, 1.0)
+        corr[(n < 2) | (m2 <= 0) | (m2.T <= 0)] = np.nan
+        # Exact ones on the diagonal of columns that vary
+        diagonal = np.diag_indices_from(corr)
+        corr[diagonal] = np.where(np.isnan(corr[diagonal]), np.nan, 1.0)
+        return pd.DataFrame(corr, index=list(cols), columns=list(cols))
+
+    def nbytes(self):
+        return sum(getattr(value, 'nbytes', 8) for value in self.moments.values())
+
+# ============================================
+# CHART AGGREGATES
+# ============================================
+HISTOGRAM_BINS = 30
+# Time-series granularities offered in the sidebar and their resample rules
+TIME_GRANULARITIES = {'hour': 'h', 'day': 'D', 'week': 'W', 'month': 'MS', 'quarter': 'QS'}
+
+def resample_totals(sums, counts, freq):
+    """Sum time-bucketed totals into `freq` periods, keeping only periods that have values"""
+    period_sums = sums.resample(freq).sum()
+    period_counts = counts.resample(freq).sum()
+    return period_sums[period_counts > 0]
+
+def series_frame(totals, date_col, value_col):
+    """Time-series chart data from a period-indexed Series"""
+    return pd.DataFrame({date_col: totals.index, value_col: totals.to_numpy()})
+
+class FrameAggregates:
+    """KPI and chart aggregates computed from a fully loaded DataFrame"""
+
+    def __init__(self, df, col_types, stats=None):
+        self.df = df
+        self.col_types = col_types
+        # Precomputed SummaryStats (e.g. merged incrementally for append datasets)
+        self._stats = stats
+
+    @property
+    def row_count(self):
+        return len(self.df)
+
+    @property
+    def columns(self):
+        return list(self.df.columns)
+
+    def preview(self, n=100):
+        return self.df.head(n)
+
+    def summary_stats(self):
+        if self._stats is None:
+            self._stats = SummaryStats.from_frame(self.df, self.col_types['numeric'])
+        return self._stats
+
+    def numeric_total(self, cols):
+        return self.summary_stats().total(cols)
+
+    def numeric_average(self, cols):
+        return self.summary_stats().average(cols)
+
+    def unique_count(self, cols):
+        return sum(self.df[c].nunique() for c in cols)
+
+    def time_series(self, date_col, value_col, freq='D'):
+        ts_data = widen_floats(self.df[[date_col, value_col]].dropna())
+        values = pd.Series(ts_data[value_col].to_numpy(), index=pd.DatetimeIndex(ts_data[date_col]))
+        totals = resample_totals(values, pd.Series(1, index=values.index), freq)
+        return series_frame(totals, date_col, value_col)
+
+    def category_totals(self, cat_col, value_col):
+        values = widen_floats(self.df[value_col])
+        cat_data = values.groupby(self.df[cat_col], observed=True).sum().reset_index()
+        return cat_data.sort_values(value_col, ascending=False)
+
+    def histogram(self, col, bins=HISTOGRAM_BINS):
+        # Binned in float64 like every other engine, so float32 columns get identical edges
+        return np.histogram(widen_floats(self.df[col].dropna()), bins=bins)
+
+    def value_counts(self, col):
+        counts = self.df[col].value_counts()
+        # Categorical columns also report categories that do not occur
+        return counts[counts > 0]
+
+    def iter_chunks(self, rows):
+        for start in range(0, len(self.df), rows):
+            yield self.df.iloc[start:start + rows]
+
+# ============================================
+# STREAMING CSV INGESTION
+# ============================================
+STREAMING_EXTENSIONS = ('.csv', '.csv.gz', '.gz')
+
+def is_streaming_file(filename):
+    """Whether an upload is a (gzip) CSV that is aggregated chunk by chunk"""
+    return filename.lower().endswith(STREAMING_EXTENSIONS)
+
+def hash_file(fileobj, block_size=8 * 1024 * 1024):
+    """Content hash of a file object, read in blocks to avoid copying it whole"""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(block_size), b''):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+class StreamingHistogram:
+    """Fixed number of fine bins whose range doubles whenever streamed values fall outside it"""
+
+    def __init__(self, n_bins=1024):
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.low = None
+        self.width = None
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _grow(self, downward):
+        n_bins = len(self.counts)
+        merged = self.counts.reshape(-1, 2).sum(axis=1)
+        self.counts = np.zeros_like(self.counts)
+        if downward:
+            self.low -= self.width * n_bins
+            self.counts[n_bins // 2:] = merged
         else:
-            sheet = sheet_names[0]
-        
-        df = xl[sheet].copy()
-        
-        # Show file info
-        st.success(t('success_upload', filename=uploaded_file.name, sheet=sheet))
-        
-        # Data preview
-        with st.expander(t('preview')):
-            st.dataframe(df.head(100), use_container_width=True)
-        
-        # Basic cleaning
-        df.dropna(axis=1, how="all", inplace=True)
-        
-        # Detect column types
-        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-        datetime_cols = df.select_dtypes(include=["datetime"]).columns.tolist()
-        
-        # Auto-detect date columns
-        if not datetime_cols:
-            for col in df.columns:
-                if df[col].dtype == object:
-                    try:
-                        parsed = pd.to_datetime(df[col], errors="coerce")
-                        if parsed.notna().sum() > len(parsed) * 0.3:  # 30% valid dates
-                            df[col] = parsed
-                            datetime_cols.append(col)
-                    except:
-                        pass
+            self.counts[:n_bins // 2] = merged
+        self.width *= 2
+
+    def update(self, values):
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        n_bins = len(self.counts)
+        vmin, vmax = values.min(), values.max()
+        if self.low is None:
+            self.low = vmin
+            self.width = (vmax - vmin) / (n_bins - 1) if vmax > vmin else 1.0
+        while vmin < self.low:
+            self._grow(downward=True)
+        while vmax >= self.low + self.width * n_bins:
+            self._grow(downward=False)
+        idx = ((values - self.low) / self.width).astype(np.int64)
+        np.clip(idx, 0, n_bins - 1, out=idx)
+        self.counts += np.bincount(idx, minlength=n_bins)
+        self.min = min(self.min, vmin)
+        self.max = max(self.max, vmax)
+
+    def finalize(self, bins=HISTOGRAM_BINS):
+        """Re-bin the fine bins into the chart's bins over the observed range"""
+        if self.low is None:
+            return np.histogram(np.array([]), bins=bins)
+        centers = self.low + (np.arange(len(self.counts)) + 0.5) * self.width
+        counts, edges = np.histogram(
+            np.clip(centers, self.min, self.max), bins=bins,
+            range=(self.min, self.max), weights=self.counts
+        )
+        return counts.round().astype(np.int64), edges
+
+class StreamingAggregates:
+    """KPI and chart aggregates accumulated chunk by chunk, without keeping the rows"""
+
+    def __init__(self, col_types, columns, preview_df):
+        self.col_types = {key: (list(cols) if isinstance(cols, list) else dict(cols))
+                          for key, cols in col_types.items()}
+        self._columns = list(columns)
+        self._preview = preview_df
+        self.rows = 0
+        numeric_cols = self.col_types['numeric']
+        self.stats = SummaryStats.from_values(numeric_cols, np.empty((0, len(numeric_cols))))
+        self.hourly_sums = {}
+        self.hourly_counts = {}
+        self.category_sums = {}
+        self.category_counts = {}
+        self.histograms = {col: StreamingHistogram() for col in numeric_cols}
+
+    @staticmethod
+    def _accumulate(store, key, partial):
+        store[key] = partial if key not in store else store[key].add(partial, fill_value=0)
+
+    def coerce(self, chunk):
+        """Apply the first chunk's column types to a later chunk"""
+        chunk = chunk.reindex(columns=self._columns)
+        for col in self.col_types['numeric']:
+            chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+        date_formats = self.col_types.get('date_formats', {})
+        for col in self.col_types['datetime']:
+            if is_text_column(chunk[col]):
+                chunk[col] = parse_dates_cached(chunk[col], date_formats.get(col))
+        return chunk
+
+    def update(self, chunk):
+        numeric_cols = self.col_types['numeric']
+        self.rows += len(chunk)
+        numeric = chunk[numeric_cols]
         
-        categorical_cols = [c for c in df.columns if c not in numeric_cols + datetime_cols]
+        for date_col in self.col_types['datetime']:
+            # Hourly buckets can be resampled to every granularity offered in the sidebar
+            hours = pd.to_datetime(chunk[date_col]).dt.floor('h')
+            grouped = numeric.groupby(hours)
+            self._accumulate(self.hourly_sums, date_col, grouped.sum())
+            self._accumulate(self.hourly_counts, date_col, grouped.count())
         
-        # ============================================
-        # SIDEBAR CONTROLS
-        # ============================================
-        st.sidebar.header(t('sidebar_title'))
-        st.sidebar.info(f"""
-        {t('data_info')}
-        - {t('rows')}: {len(df):,}
-        - {t('columns')}: {len(df.columns):,}
-        - {t('numeric')}: {len(numeric_cols)}
-        - {t('categorical')}: {len(categorical_cols)}
-        - {t('date')}: {len(datetime_cols)}
-        """)
+        for cat_col in list(self.col_types['categorical']):
+            grouped = numeric.groupby(chunk[cat_col])
+            self._accumulate(self.category_sums, cat_col, grouped.sum())
+            self._accumulate(self.category_counts, cat_col, chunk[cat_col].value_counts())
+            if len(self.category_counts[cat_col]) > STREAM_MAX_DISTINCT:
+                # Identifier-like column: tracking it would approach materializing the table
+                logger.info("Dropping high-cardinality column %r from streamed aggregates", cat_col)
+                self.col_types['categorical'].remove(cat_col)
+                del self.category_sums[cat_col], self.category_counts[cat_col]
         
-        # Chart 1: Time Series
-        st.sidebar.subheader(t('time_series'))
-        date_col = st.sidebar.selectbox(t('select_date'), [None] + datetime_cols)
-        ts_value_col = st.sidebar.selectbox(t('select_value'), [None] + numeric_cols)
-        
-        # Chart 2: Top Categories
-        st.sidebar.subheader(t('top_categories'))
-        cat_col = st.sidebar.selectbox(t('category_column'), [None] + categorical_cols)
-        cat_value = st.sidebar.selectbox(t('value_for_category'), [None] + numeric_cols)
-        top_n = st.sidebar.slider(t('top_n_items'), 3, 20, 10)
-        
-        # Chart 3: Distribution
-        st.sidebar.subheader(t('distribution'))
-        dist_col = st.sidebar.selectbox(t('column_for_histogram'), [None] + numeric_cols)
-        
-        # Chart 4: Correlation
-        st.sidebar.subheader(t('correlation'))
-        if len(numeric_cols) > 1:
-            default_corr = numeric_cols[:min(6, len(numeric_cols))]
-            corr_cols = st.sidebar.multiselect(
-                t('select_numeric_columns'), 
-                numeric_cols, 
-                default=default_corr
-            )
+        if numeric_cols:
+            block = numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+            for i, col in enumerate(numeric_cols):
+                self.histograms[col].update(block[:, i])
+            self.stats = self.stats.merge(SummaryStats.from_values(numeric_cols, block))
+
+    @property
+    def row_count(self):
+        return self.rows
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def preview(self, n=100):
+        return self._preview.head(n)
+
+    def nbytes(self):
+        frames = [*self.hourly_sums.values(), *self.hourly_counts.values(),
+                  *self.category_sums.values(), *self.category_counts.values()]
+        return sum(int(f.memory_usage(deep=True).sum()) if isinstance(f, pd.DataFrame)
+                   else int(f.memory_usage(deep=True)) for f in frames) + frame_nbytes(self._preview)
+
+    def summary_stats(self):
+        return self.stats
+
+    def numeric_total(self, cols):
+        return self.summary_stats().total(cols)
+
+    def numeric_average(self, cols):
+        return self.summary_stats().average(cols)
+
+    def unique_count(self, cols):
+        return sum(len(self.category_counts[c]) for c in cols)
+
+    def time_series(self, date_col, value_col, freq='D'):
+        totals = resample_totals(self.hourly_sums[date_col][value_col],
+                                 self.hourly_counts[date_col][value_col], freq)
+        return series_frame(totals, date_col, value_col)
+
+    def category_totals(self, cat_col, value_col):
+        cat_data = self.category_sums[cat_col][value_col].rename_axis(cat_col).reset_index()
+        return cat_data.sort_values(value_col, ascending=False)
+
+    def histogram(self, col, bins=HISTOGRAM_BINS):
+        return self.histograms[col].finalize(bins)
+
+    def value_counts(self, col):
+        return self.category_counts[col].sort_values(ascending=False)
+
+def stream_csv_aggregates(uploaded_file, file_hash, progress=None):
+    """Aggregate a (gzip) CSV upload chunk by chunk; the full table is never materialized"""
+    cache = get_ingestion_cache()
+    key = (file_hash, 'stream')
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    
+    compression = 'gzip' if uploaded_file.name.lower().endswith('.gz') else None
+    total_size = max(uploaded_file.size, 1)
+    uploaded_file.seek(0)
+    aggregates = None
+    for chunk in pd.read_csv(uploaded_file, chunksize=STREAM_CHUNK_ROWS, compression=compression):
+        if aggregates is None:
+            # Column types are detected on the first chunk and enforced on the rest
+            chunk, col_types = prepare_dataframe(chunk)
+            aggregates = StreamingAggregates(col_types, chunk.columns, chunk.head(100))
         else:
-            corr_cols = []
-            st.sidebar.warning(t('correlation_warning'))
-        
-        # Chart 5: Category Share
-        st.sidebar.subheader(t('category_share'))
-        share_cat = st.sidebar.selectbox(t('column_for_pie'), [None] + categorical_cols)
-        
-        # ============================================
-        # KPI SECTION
-        # ============================================
-        st.markdown(f"## {t('kpi_title')}")
-        
-        kpi1, kpi2, kpi3, kpi4 = st.columns(4)
-        
-        with kpi1:
-            st.metric(t('total_rows'), f"{len(df):,}")
-        
-        with kpi2:
-            if numeric_cols:
-                total_sum = df[numeric_cols].sum().sum()
-                st.metric(t('total_numeric'), f"{total_sum:,.0f}")
-            else:
-                st.metric(t('total_numeric'), t('na'))
-        
-        with kpi3:
-            if numeric_cols:
-                avg_val = df[numeric_cols].mean().mean()
-                st.metric(t('average_value'), f"{avg_val:,.2f}")
-            else:
-                st.metric(t('average_value'), t('na'))
+            chunk = aggregates.coerce(chunk)
+        aggregates.update(chunk)
+        if progress is not None:
+            progress(min(uploaded_file.tell() / total_size, 1.0))
+    
+    if aggregates is None:
+        raise ValueError("CSV file contains no rows")
+    cache.put(key, aggregates, aggregates.nbytes())
+    return aggregates
+
+# ============================================
+# ROLLUP CUBE
+# ============================================
+class Rollup:
+    """Per-group count/sum/sum of squares/min/max of every numeric column, plus row counts"""
+
+    def __init__(self, stats, rows):
+        self.stats = stats  # columns: (stat, measure)
+        self.rows = rows
+
+    @classmethod
+    def build(cls, measures, keys, dropna=True):
+        grouped = measures.groupby(keys, observed=True, dropna=dropna)
+        stats = pd.concat({
+            'count': grouped.count(),
+            'sum': grouped.sum(),
+            # Squares of large integers overflow int64, so they are summed as floats
+            'sumsq': (measures.astype(np.float64) ** 2).groupby(keys, observed=True, dropna=dropna).sum(),
+            'min': grouped.min(),
+            'max': grouped.max(),
+        }, axis=1)
+        rows = grouped.size()
+        return cls(stats, rows)
+
+    def collapse(self, level):
+        """Roll a multi-key rollup up to some of its index levels"""
+        grouped = self.stats.groupby(level=level, dropna=False)
+        additive = [c for c in self.stats.columns if c[0] in ('count', 'sum', 'sumsq')]
+        stats = pd.concat([
+            grouped[additive].sum(),
+            grouped[[c for c in self.stats.columns if c[0] == 'min']].min(),
+            grouped[[c for c in self.stats.columns if c[0] == 'max']].max(),
+        ], axis=1)
+        return Rollup(stats, self.rows.groupby(level=level, dropna=False).sum())
+
+    def merge(self, other):
+        """Rollup of the union of two disjoint row sets, without revisiting the rows"""
+        combined = Rollup(pd.concat([self.stats, other.stats]), pd.concat([self.rows, other.rows]))
+        return combined.collapse(list(range(self.stats.index.nlevels)))
+
+    def total(self, cols):
+        return float(self.stats['sum'][cols].to_numpy(np.float64).sum())
+
+    def average(self, cols):
+        """Mean of the per-column means, like SummaryStats.average"""
+        sums, counts = self.stats['sum'][cols].sum(), self.stats['count'][cols].sum()
+        return (sums / counts).where(counts > 0).mean()
+
+    def nbytes(self):
+        return frame_nbytes(self.stats) + int(self.rows.memory_usage(index=True, deep=True))
+
+class RollupCube:
+    """Rollups of the dataset as a whole, by day and hour, by category and by cell, built once per dataset
+
+    Categorical columns with more than CUBE_MAX_CARDINALITY distinct values get
+    no rollup: one group per value would approach a copy of the rows; so do
+    date columns with more than CUBE_MAX_CELLS distinct hours. Cells group by
+    the day of every date column and by as many categorical columns as fit in
+    CUBE_MAX_CELLS; they answer filtered views without reading rows.
+    """
+
+    def __init__(self, grand, by_day, by_hour, by_category, cells, build_seconds):
+        self.grand = grand
+        self.by_day = by_day
+        self.by_hour = by_hour
+        self.by_category = by_category
+        self.cells = cells  # None when not even the day columns fit
+        self.build_seconds = build_seconds
+
+    @staticmethod
+    def _measures(df, cols):
+        """Numeric columns widened for accumulation: integers to int64, everything else to float64"""
+        return df[cols].astype({
+            col: np.int64 if isinstance(df[col].dtype, np.dtype) and df[col].dtype.kind in 'iu' else np.float64
+            for col in cols
+        })
+
+    @staticmethod
+    def _keys(df, col_types):
+        days = {col: pd.to_datetime(df[col]).dt.floor('D') for col in col_types['datetime']}
+        categories = {col: df[col] for col in col_types['categorical']
+                      if df[col].nunique() <= CUBE_MAX_CARDINALITY}
+        return days, categories
+
+    @staticmethod
+    def _cell_keys(days, categories, rows):
+        """Day columns, then categorical columns from the fewest values up, while the cells stay within the limit"""
+        keys = []
+        cell_ids = np.zeros(rows, dtype=np.int64)
+        candidates = [*days.values(), *sorted(categories.values(), key=lambda values: values.nunique())]
+        for values in candidates:
+            codes, uniques = pd.factorize(values)
+            # Refactorized at every step, so the combined ids never outgrow int64
+            combined, cells = pd.factorize(cell_ids * (len(uniques) + 1) + codes + 1)
+            if len(cells) <= CUBE_MAX_CELLS:
+                keys.append(values)
+                cell_ids = combined
+        return keys
+
+    @classmethod
+    def build(cls, df, col_types):
+        start = time.perf_counter()
+        measures = cls._measures(df, col_types['numeric'])
+        days, categories = cls._keys(df, col_types)
+        grand = Rollup.build(measures, np.zeros(len(df), dtype=np.int8))
+        by_day = {col: Rollup.build(measures, keys) for col, keys in days.items()}
+        hours = {col: pd.to_datetime(df[col]).dt.floor('h') for col in col_types['datetime']}
+        by_hour = {col: Rollup.build(measures, keys) for col, keys in hours.items()
+                   if keys.nunique() <= CUBE_MAX_CELLS}
+        by_category = {col: Rollup.build(measures, keys) for col, keys in categories.items()}
+        cell_keys = cls._cell_keys(days, categories, len(df))
+        # Rows with a missing key still count towards every filter that does not select on it
+        cells = Rollup.build(measures, cell_keys, dropna=False) if cell_keys else None
+        return cls(grand, by_day, by_hour, by_category, cells, time.perf_counter() - start)
+
+    @staticmethod
+    def _merge_capped(mine, theirs, limit):
+        """Merge rollups present on both sides; a rollup missing on either side, or growing past the limit, is dropped"""
+        merged = {}
+        for col, rollup in mine.items():
+            if col in theirs:
+                combined = rollup.merge(theirs[col])
+                if len(combined.rows) <= limit:
+                    merged[col] = combined
+        return merged
+
+    def _merge_cells(self, other):
+        if self.cells is None or other.cells is None:
+            return None
+        # Each side picked its own categorical columns; merge over the ones both kept
+        theirs = other.cells.stats.index.names
+        levels = [name for name in self.cells.stats.index.names if name in theirs]
+        if not levels:
+            return None
+        merged = self.cells.collapse(levels).merge(other.cells.collapse(levels))
+        return merged if len(merged.rows) <= CUBE_MAX_CELLS else None
+
+    def merge(self, other):
+        """Cube of this cube's rows plus another cube's (e.g. an appended upload)"""
+        start = time.perf_counter()
+        by_day = {col: rollup.merge(other.by_day[col]) for col, rollup in self.by_day.items()}
+        by_hour = self._merge_capped(self.by_hour, other.by_hour, CUBE_MAX_CELLS)
+        by_category = self._merge_capped(self.by_category, other.by_category, CUBE_MAX_CARDINALITY)
+        return RollupCube(self.grand.merge(other.grand), by_day, by_hour, by_category, self._merge_cells(other),
+                          time.perf_counter() - start)
+
+    def filter_cells(self, row_filter):
+        """Rollup of the cells matching a RowFilter, or None when the filter selects on a column the cells lack"""
+        if self.cells is None:
+            return None
+        index = self.cells.stats.index
+        matched = np.ones(len(index), dtype=bool)
+        for col, selected in row_filter.values.items():
+            if col not in index.names:
+                return None
+            matched &= index.get_level_values(col).isin(selected)
+        for col, (start, end) in row_filter.dates.items():
+            # Cells hold whole days
+            if col not in index.names or start != start.floor('D') or end != end.floor('D'):
+                return None
+            days = index.get_level_values(col)
+            matched &= np.asarray((days >= start) & (days < end))
+        return Rollup(self.cells.stats[matched], self.cells.rows[matched])
+
+    def nbytes(self):
+        rollups = [self.grand, *self.by_day.values(), *self.by_hour.values(), *self.by_category.values(),
+                   *filter(None, [self.cells])]
+        return sum(rollup.nbytes() for rollup in rollups)
+
+class CubeAggregates:
+    """Answers KPI, time-series, Top-N and share queries from a rollup cube; the rest falls back"""
+
+    def __init__(self, cube, fallback):
+        self.cube = cube
+        self.fallback = fallback
+
+    def __getattr__(self, name):
+        return getattr(self.fallback, name)
+
+    def numeric_total(self, cols):
+        return self.cube.grand.total(cols)
+
+    def numeric_average(self, cols):
+        return self.cube.grand.average(cols)
+
+    def unique_count(self, cols):
+        return sum(len(self.cube.by_category[c].rows) if c in self.cube.by_category
+                   else self.fallback.unique_count([c]) for c in cols)
+
+    def time_series(self, date_col, value_col, freq='D'):
+        rollup = self.cube.by_hour.get(date_col) if freq == 'h' else self.cube.by_day[date_col]
+        if rollup is None:
+            return self.fallback.time_series(date_col, value_col, freq)
+        stats = rollup.stats
+        totals = resample_totals(stats[('sum', value_col)], stats[('count', value_col)], freq)
+        return series_frame(totals, date_col, value_col)
+
+    def category_totals(self, cat_col, value_col):
+        if cat_col not in self.cube.by_category:
+            return self.fallback.category_totals(cat_col, value_col)
+        sums = self.cube.by_category[cat_col].stats[('sum', value_col)]
+        cat_data = pd.DataFrame({cat_col: sums.index, value_col: sums.to_numpy()})
+        return cat_data.sort_values(value_col, ascending=False)
+
+    def value_counts(self, col):
+        if col not in self.cube.by_category:
+            return self.fallback.value_counts(col)
+        rows = self.cube.by_category[col].rows
+        return rows.rename('count').rename_axis(col).sort_values(ascending=False)
+
+def load_rollup_cube(df, col_types, fingerprint):
+    """Rollup cube for a prepared dataset, built on first use and kept in the ingestion cache"""
+    cache = get_ingestion_cache()
+    key = (*fingerprint, 'cube')
+    cube = cache.get(key)
+    if cube is None:
+        cube = RollupCube.build(df, col_types)
+        cache.put(key, cube, cube.nbytes())
+    return cube
+
+# ============================================
+# PARALLEL AGGREGATION
+# ============================================
+# tmpfs-backed directory so memory-mapped arrays are shared pages, not disk files
+SHARED_ARRAY_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+PARALLEL_MIN_TASK_ROWS = 100000
+
+class SharedDataset:
+    """Numeric values and integer group keys of a dataset, memory-mapped by pool workers"""
+
+    def __init__(self, df, col_types):
+        self.directory = tempfile.mkdtemp(prefix='dashboard-', dir=SHARED_ARRAY_DIR)
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.directory, True)
+        self.rows = len(df)
+        self.numeric_cols = list(col_types['numeric'])
+        self.numeric_path = os.path.join(self.directory, 'numeric.npy')
+        np.save(self.numeric_path, widen_floats(df[self.numeric_cols]).to_numpy(np.float64, na_value=np.nan))
         
-        with kpi4:
-            if categorical_cols:
-                unique_vals = sum(df[c].nunique() for c in categorical_cols[:3])
-                st.metric(t('unique_values'), f"{unique_vals:,}")
+        # Categories and the hours of dates become factorized codes; -1 means missing.
+        # Only hours that occur get a group, so outlying dates cost no empty groups
+        self.key_cols = list(col_types['categorical']) + list(col_types['datetime'])
+        self.key_meta = {}
+        keys = np.full((self.rows, len(self.key_cols)), -1, dtype=np.int64)
+        for i, col in enumerate(self.key_cols):
+            if col in col_types['datetime']:
+                hours = pd.DatetimeIndex(df[col]).to_numpy().astype('datetime64[h]')
+                codes, uniques = pd.factorize(hours, sort=True)
+                keys[:, i] = codes
+                self.key_meta[col] = ('datetime', uniques, len(uniques))
             else:
-                st.metric(t('unique_values'), t('na'))
+                codes, uniques = pd.factorize(df[col])
+                keys[:, i] = codes
+                self.key_meta[col] = ('categorical', uniques, len(uniques))
+        self.keys_path = os.path.join(self.directory, 'keys.npy')
+        np.save(self.keys_path, keys)
+        
+        # Merged partial results, shared by every session viewing this dataset
+        self.memo = {}
+        self.lock = threading.Lock()
+
+    def nbytes(self):
+        return (self.rows * (len(self.numeric_cols) + len(self.key_cols))) * 8
+
+def load_shared_dataset(df, col_types, fingerprint):
+    """Shared-memory copy of a prepared dataset, built once and kept in the ingestion cache"""
+    cache = get_ingestion_cache()
+    key = (*fingerprint, 'shared')
+    shared = cache.get(key)
+    if shared is None:
+        shared = SharedDataset(df, col_types)
+        cache.put(key, shared, shared.nbytes())
+    return shared
+
+@st.cache_resource
+def get_process_pool():
+    """Process pool shared by all sessions; spawned so workers never inherit server threads"""
+    return ProcessPoolExecutor(max_workers=PARALLEL_WORKERS,
+                               mp_context=multiprocessing.get_context('spawn'))
+
+class ParallelAggregates:
+    """Computes partial aggregates over row ranges in a process pool and merges them
+
+    Works over a list of shared datasets (one, or one per segment of an append
+    dataset). Each memoizes its own merged partials, so a new segment costs only
+    its own rows; per-segment results are then combined by group label.
+    """
+
+    def __init__(self, shareds, pool, fallback):
+        self.shareds = shareds
+        self.pool = pool
+        self.fallback = fallback
+
+    def __getattr__(self, name):
+        return getattr(self.fallback, name)
+
+    def _map(self, shared, kernel, *args):
+        n_tasks = max(1, min(PARALLEL_WORKERS * 2, shared.rows // PARALLEL_MIN_TASK_ROWS))
+        bounds = np.linspace(0, shared.rows, n_tasks + 1).astype(np.int64)
+        futures = [
+            self.pool.submit(kernel, *args, int(start), int(stop))
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def _merged(shared, key, compute):
+        with shared.lock:
+            if key not in shared.memo:
+                shared.memo[key] = compute()
+            return shared.memo[key]
+
+    def _segment_stats(self, shared):
+        def compute():
+            parts = self._map(shared, parallel_aggregation.stats_partial, shared.numeric_path)
+            stats = SummaryStats(shared.numeric_cols, parts[0])
+            for part in parts[1:]:
+                stats = stats.merge(SummaryStats(shared.numeric_cols, part))
+            return stats
+        return self._merged(shared, 'stats', compute)
+
+    def summary_stats(self):
+        stats = self._segment_stats(self.shareds[0])
+        for shared in self.shareds[1:]:
+            stats = stats.merge(self._segment_stats(shared))
+        return stats
+
+    def numeric_total(self, cols):
+        return self.summary_stats().total(cols)
+
+    def numeric_average(self, cols):
+        return self.summary_stats().average(cols)
+
+    def _segment_groups(self, shared, key_col):
+        def compute():
+            kind, meta, n_groups = shared.key_meta[key_col]
+            parts = self._map(shared, parallel_aggregation.group_partial, shared.numeric_path,
+                              shared.keys_path, shared.key_cols.index(key_col), n_groups)
+            sums = sum(part[0] for part in parts)
+            counts = sum(part[1] for part in parts)
+            rows = sum(part[2] for part in parts)
+            if kind == 'datetime':
+                index = pd.DatetimeIndex(meta)
+            else:
+                index = pd.Index(meta, name=key_col)
+            cols = shared.numeric_cols
+            return (pd.DataFrame(sums.T, index=index, columns=cols),
+                    pd.DataFrame(counts.T, index=index, columns=cols),
+                    pd.Series(rows, index=index))
+        return self._merged(shared, ('groups', key_col), compute)
+
+    def _groups(self, key_col):
+        parts = [self._segment_groups(shared, key_col) for shared in self.shareds]
+        if len(parts) == 1:
+            return parts[0]
+        # Segments factorize their keys separately; combine them by label
+        return tuple(pd.concat(frames).groupby(level=0).sum() for frames in zip(*parts))
+
+    def _col(self, col):
+        return self.shareds[0].numeric_cols.index(col)
+
+    def unique_count(self, cols):
+        if len(self.shareds) == 1:
+            return sum(self.shareds[0].key_meta[c][2] for c in cols)
+        # Values seen by several segments count once
+        labels = {c: [pd.Index(shared.key_meta[c][1]) for shared in self.shareds] for c in cols}
+        return sum(len(labels[c][0].append(labels[c][1:]).unique()) for c in cols)
+
+    def time_series(self, date_col, value_col, freq='D'):
+        sums, counts, _ = self._groups(date_col)
+        totals = resample_totals(sums[value_col], counts[value_col], freq)
+        return series_frame(totals, date_col, value_col)
+
+    def category_totals(self, cat_col, value_col):
+        sums, _, rows = self._groups(cat_col)
+        present = rows > 0
+        cat_data = pd.DataFrame({cat_col: sums.index[present], value_col: sums[value_col][present].to_numpy()})
+        return cat_data.sort_values(value_col, ascending=False)
+
+    def value_counts(self, col):
+        _, _, rows = self._groups(col)
+        return rows[rows > 0].rename('count').rename_axis(col).sort_values(ascending=False)
+
+    def histogram(self, col, bins=HISTOGRAM_BINS):
+        stats = self.summary_stats()
+        i = self._col(col)
+        if stats.count([col]).iloc[0] == 0:
+            return np.histogram(np.array([]), bins=bins)
+        low, high = float(stats.min([col]).iloc[0]), float(stats.max([col]).iloc[0])
+        if low == high:
+            # Same widening np.histogram applies to a constant column
+            low, high = low - 0.5, high + 0.5
+        parts = [part for shared in self.shareds
+                 for part in self._map(shared, parallel_aggregation.histogram_partial, shared.numeric_path,
+                                       i, low, high, bins)]
+        return np.sum(parts, axis=0), np.histogram_bin_edges([], bins=bins, range=(low, high))
+
+# ============================================
+# DUCKDB QUERY ENGINE
+# ============================================
+QUERY_ENGINES = ('pandas', 'duckdb')
+
+def available_query_engines():
+    """Query engines usable in this environment (DuckDB is an optional dependency)"""
+    return [engine for engine in QUERY_ENGINES if engine != 'duckdb' or HAS_DUCKDB]
+
+def quote_identifier(name):
+    """SQL identifier for a column name"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+def quote_literal(value):
+    """SQL string literal (for SET statements and filter views, which take no parameters)"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+def typed_literal(value):
+    """SQL literal of the value's own type, so numeric and boolean columns are not compared with strings"""
+    if isinstance(value, (bool, np.bool_)):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    if isinstance(value, (float, np.floating)):
+        # Through a string, so the double round-trips exactly (inf included)
+        return f"CAST({quote_literal(repr(float(value)))} AS DOUBLE)"
+    return quote_literal(value)
+
+class DuckDBAggregates:
+    """Answers every KPI and chart aggregate with SQL over an Arrow snapshot on disk
+
+    Only the columns a query touches are scanned, and DuckDB spills large
+    group-bys to DUCKDB_TEMP_DIR, so the dataset never has to fit in memory.
+    Results are post-processed exactly like FrameAggregates so both engines
+    report the same numbers.
+    """
+
+    def __init__(self, source, col_types):
+        import duckdb
+        self.col_types = col_types
+        self.connection = duckdb.connect()
+        os.makedirs(DUCKDB_TEMP_DIR, exist_ok=True)
+        self.connection.execute(f"SET temp_directory = {quote_literal(DUCKDB_TEMP_DIR)}")
+        if DUCKDB_MEMORY_LIMIT:
+            self.connection.execute(f"SET memory_limit = {quote_literal(DUCKDB_MEMORY_LIMIT)}")
+        self.connection.execute("SET preserve_insertion_order = false")
+        self.connection.register('dataset', source)
+        # A DuckDB connection runs one query at a time; sessions share this object
+        self.lock = threading.Lock()
+        # Queries read from this relation; filtered views replace it with a subquery
+        self.relation = 'dataset'
+        self._filter_values = {}
+        self.row_count = self._scalar(f"SELECT COUNT(*) FROM {self.relation}")
+        self.columns = list(source.schema.names)
+
+    def _query(self, sql, params=None):
+        with self.lock:
+            return self.connection.execute(sql, params).df()
+
+    def _scalar(self, sql, params=None):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchone()[0]
+
+    def _column_stats(self, template, cols):
+        selects = ', '.join(template.format(quote_identifier(c)) for c in cols)
+        row = self._query(f"SELECT {selects} FROM {self.relation}").iloc[0]
+        return pd.Series(row.to_numpy(dtype=np.float64, na_value=np.nan), index=cols)
+
+    def preview(self, n=100):
+        return self._query(f"SELECT * FROM {self.relation} LIMIT {int(n)}")
+
+    def summary_stats(self):
+        # regr_* aggregates are pairwise-complete, matching SummaryStats' co-moment matrices
+        cols = list(self.col_types['numeric'])
+        k = len(cols)
+        q = [quote_identifier(c) for c in cols]
+        pairs = [(i, j) for i in range(k) for j in range(i, k)]
+        selects = ['COUNT(*)']
+        for c in q:
+            selects += [f"fsum({c})", f"MIN(CAST({c} AS DOUBLE))", f"MAX(CAST({c} AS DOUBLE))"]
+        for i, j in pairs:
+            selects += [f"{name}({q[i]}, {q[j]})" for name in
+                        ('regr_count', 'regr_avgy', 'regr_avgx', 'regr_syy', 'regr_sxx', 'regr_sxy')]
+        row = self._query(f"SELECT {', '.join(selects)} FROM {self.relation}").iloc[0].to_numpy(np.float64, na_value=np.nan)
+        
+        per_column = row[1:1 + 3 * k].reshape(k, 3) if k else np.zeros((0, 3))
+        moments = {
+            'rows': int(row[0]),
+            'sum': np.nan_to_num(per_column[:, 0]),
+            'min': np.nan_to_num(per_column[:, 1], nan=np.inf),
+            'max': np.nan_to_num(per_column[:, 2], nan=-np.inf),
+        }
+        for name in ('n', 'mean', 'm2', 'comoment'):
+            moments[name] = np.zeros((k, k))
+        for (i, j), values in zip(pairs, np.nan_to_num(row[1 + 3 * k:]).reshape(-1, 6)):
+            n, mean_i, mean_j, m2_i, m2_j, comoment = values
+            moments['n'][i, j] = moments['n'][j, i] = n
+            moments['mean'][i, j], moments['mean'][j, i] = mean_i, mean_j
+            moments['m2'][i, j], moments['m2'][j, i] = m2_i, m2_j
+            moments['comoment'][i, j] = moments['comoment'][j, i] = comoment
+        return SummaryStats(cols, moments)
+
+    def numeric_total(self, cols):
+        return self.summary_stats().total(cols)
+
+    def numeric_average(self, cols):
+        return self.summary_stats().average(cols)
+
+    def unique_count(self, cols):
+        return int(self._column_stats('COUNT(DISTINCT {})', cols).sum())
+
+    def time_series(self, date_col, value_col, freq='D'):
+        # Hourly/daily buckets in SQL; weeks, months and quarters use pandas' own calendar rules
+        unit = 'hour' if freq == 'h' else 'day'
+        d, v = quote_identifier(date_col), quote_identifier(value_col)
+        buckets = self._query(
+            f"SELECT date_trunc('{unit}', {d}) AS bucket, fsum({v}) AS total, COUNT(*) AS n "
+            f"FROM {self.relation} WHERE {d} IS NOT NULL AND {v} IS NOT NULL GROUP BY 1 ORDER BY 1"
+        )
+        index = pd.DatetimeIndex(buckets['bucket'])
+        totals = resample_totals(pd.Series(buckets['total'].to_numpy(), index=index),
+                                 pd.Series(buckets['n'].to_numpy(), index=index), freq)
+        return series_frame(totals, date_col, value_col)
+
+    def category_totals(self, cat_col, value_col):
+        c, v = quote_identifier(cat_col), quote_identifier(value_col)
+        cat_data = self._query(
+            f"SELECT {c} AS category, COALESCE(fsum({v}), 0) AS total "
+            f"FROM {self.relation} WHERE {c} IS NOT NULL GROUP BY 1"
+        )
+        cat_data.columns = [cat_col, value_col]
+        return cat_data.sort_values(value_col, ascending=False)
+
+    def value_counts(self, col):
+        c = quote_identifier(col)
+        counts = self._query(f"SELECT {c} AS value, COUNT(*) AS n FROM {self.relation} WHERE {c} IS NOT NULL GROUP BY 1")
+        return pd.Series(counts['n'].to_numpy(), index=pd.Index(counts['value'], name=col),
+                         name='count').sort_values(ascending=False)
+
+    def histogram(self, col, bins=HISTOGRAM_BINS):
+        c = quote_identifier(col)
+        low, high, count = self._query(
+            f"SELECT MIN(CAST({c} AS DOUBLE)), MAX(CAST({c} AS DOUBLE)), COUNT({c}) FROM {self.relation}"
+        ).iloc[0]
+        if count == 0:
+            return np.histogram(np.array([]), bins=bins)
+        low, high = float(low), float(high)
+        if low == high:
+            # Same widening np.histogram applies to a constant column
+            low, high = low - 0.5, high + 0.5
+        edges = np.histogram_bin_edges([], bins=bins, range=(low, high))
+        # np.histogram's uniform-bin index computation, including its one-ulp edge corrections
+        binned = self._query(
+            f"""
+            WITH raw AS (
+                SELECT v, LEAST(CAST(TRUNC((v - $low) / $width * $bins) AS BIGINT), $bins - 1) AS i
+                FROM (SELECT CAST({c} AS DOUBLE) AS v FROM {self.relation} WHERE {c} IS NOT NULL)
+            ), corrected AS (
+                SELECT v, CASE WHEN v < $edges[i + 1] THEN i - 1 ELSE i END AS i FROM raw
+            )
+            SELECT CASE WHEN v >= $edges[i + 2] AND i <> $bins - 1 THEN i + 1 ELSE i END AS bin,
+                   COUNT(*) AS n
+            FROM corrected GROUP BY 1
+            """,
+            {'low': low, 'width': high - low, 'bins': bins, 'edges': edges.tolist()}
+        )
+        counts = np.bincount(binned['bin'].to_numpy(np.int64), weights=binned['n'].to_numpy(),
+                             minlength=bins).astype(np.int64)
+        return counts, edges
+
+    def filtered(self, row_filter):
+        """View of the rows matching a RowFilter; shares this connection and its caches"""
+        view = copy.copy(self)
+        view.relation = f"(SELECT * FROM dataset WHERE {row_filter.sql()}) AS dataset"
+        view.row_count = view._scalar(f"SELECT COUNT(*) FROM {view.relation}")
+        return view
+
+    def filter_values(self, col):
+        """Sorted distinct values of a categorical column, or None above FILTER_MAX_VALUES"""
+        if col not in self._filter_values:
+            c = quote_identifier(col)
+            values = self._query(
+                f"SELECT DISTINCT {c} AS value FROM dataset WHERE {c} IS NOT NULL ORDER BY 1 LIMIT {FILTER_MAX_VALUES + 1}"
+            )['value'].tolist()
+            self._filter_values[col] = values if len(values) <= FILTER_MAX_VALUES else None
+        return self._filter_values[col]
+
+    def date_bounds(self, col):
+        c = quote_identifier(col)
+        low, high = self._query(f"SELECT MIN({c}), MAX({c}) FROM dataset").iloc[0]
+        return (None, None) if pd.isna(low) else (pd.Timestamp(low), pd.Timestamp(high))
+
+    def iter_chunks(self, rows):
+        # One scan in record batches; holds the connection until the scan is done
+        with self.lock:
+            reader = self.connection.execute(f"SELECT * FROM {self.relation}").fetch_record_batch(rows)
+            for batch in reader:
+                yield batch.to_pandas()
+
+    def nbytes(self):
+        # The data stays on disk; only the connection's bookkeeping lives here
+        return 1024 * 1024
+
+def snapshot_column_types(path):
+    """Column classification of a current snapshot file without reading its data, or None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with pa.memory_map(path, 'r') as source:
+            return table_column_types(pa.ipc.open_file(source))
+    except (pa.ArrowException, OSError) as e:
+        logger.warning("Ignoring unreadable snapshot %s: %s", path, e)
+        return None
+
+def load_duckdb_aggregates(loader, data, file_hash, filename, sheet=None, prepared=None):
+    """DuckDB engine over the dataset's Arrow snapshot, writing the snapshot on first use
+
+    `prepared` is a (df, col_types) already in memory (a batch, which has no
+    upload bytes to parse again); it is queried when there is no snapshot.
+    """
+    cache = get_ingestion_cache()
+    key = (file_hash, sheet, 'duckdb')
+    aggregates = cache.get(key)
+    if aggregates is not None:
+        return aggregates
+    
+    import pyarrow.dataset as pads
+    path = snapshot_path(file_hash, sheet)
+    col_types = snapshot_column_types(path)
+    if col_types is not None:
+        source = pads.dataset(path, format='arrow')
+    else:
+        if prepared is not None:
+            df, col_types = prepared
+        else:
+            df, col_types = load_prepared_dataset(loader, data, file_hash, filename, sheet)
+        if snapshot_column_types(path) is None:
+            # Parquet/Arrow uploads get a snapshot too so DuckDB can scan them from disk
+            save_snapshot(df, col_types, file_hash, sheet)
+        if snapshot_column_types(path) is not None:
+            source = pads.dataset(path, format='arrow')
+        else:
+            # No snapshot could be written (e.g. mixed-type columns); query the frame in memory,
+            # with mixed columns as strings
+            source = pa.Table.from_pandas(arrow_safe_frame(df), preserve_index=False)
+    
+    aggregates = DuckDBAggregates(source, col_types)
+    cache.put(key, aggregates, aggregates.nbytes())
+    return aggregates
+
+# ============================================
+# APPEND DATASETS
+# ============================================
+DATASET_MANIFEST = 'manifest.json'
+# Bump when a summary class changes shape: summaries saved by older code are then rebuilt
+SEGMENT_SUMMARY_VERSION = 1
+
+def read_upload_frame(loader, uploaded_file, data, file_hash, sheet=None):
+    """Raw (unprepared) rows of an upload of any supported format"""
+    name = uploaded_file.name
+    if is_streaming_file(name):
+        uploaded_file.seek(0)
+        return pd.read_csv(uploaded_file, compression='gzip' if name.lower().endswith('.gz') else None)
+    if is_columnar_file(name):
+        return read_columnar_upload(data, name).to_pandas()
+    return loader.load(data, file_hash, sheet)
+
+def conform_to_schema(raw, columns, col_types):
+    """Apply a dataset's column types to a new upload; returns (frame, schema problems)"""
+    # Columns with no values at all are dropped by prepare_dataframe, so they may be missing
+    present = [c for c in raw.columns if raw[c].notna().any()]
+    problems = []
+    missing = [c for c in columns if c not in raw.columns]
+    extra = [c for c in present if c not in columns]
+    if missing:
+        problems.append(t('schema_missing', columns=', '.join(map(str, missing))))
+    if extra:
+        problems.append(t('schema_extra', columns=', '.join(map(str, extra))))
+    if problems:
+        return None, problems
+    
+    df = raw.reindex(columns=columns)
+    date_formats = col_types.get('date_formats', {})
+    for col in columns:
+        series = df[col]
+        filled = int(series.notna().sum())
+        if col in col_types['numeric']:
+            converted = pd.to_numeric(series, errors='coerce')
+            kind, min_ratio = t('numeric'), NUMERIC_MIN_VALID_RATIO
+        elif col in col_types['datetime']:
+            converted = (parse_dates_cached(series, date_formats.get(col)) if is_text_column(series)
+                         else pd.to_datetime(series, errors='coerce'))
+            kind, min_ratio = t('date'), DATE_MIN_VALID_RATIO
+        else:
+            continue
+        if filled and converted.notna().sum() < filled * min_ratio:
+            problems.append(t('schema_type', column=col, kind=kind))
+        df[col] = converted
+    return (None, problems) if problems else (df, [])
+
+def row_key_hashes(df, key_cols):
+    """64-bit hash of each row's dedupe key, independent of how the columns are stored"""
+    keys = {}
+    for col in key_cols:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            keys[col] = series.astype('datetime64[ns]')
+        elif pd.api.types.is_numeric_dtype(series.dtype):
+            keys[col] = series.astype(np.float64)
+        else:
+            keys[col] = series.astype('string')
+    return pd.util.hash_pandas_object(pd.DataFrame(keys), index=False).to_numpy()
+
+def concat_frames(frames):
+    """Stack frames with identical columns, keeping categorical columns categorical"""
+    frames = [frame.copy(deep=False) for frame in frames]
+    for col in frames[0].columns:
+        if all(isinstance(frame[col].dtype, pd.CategoricalDtype) for frame in frames):
+            categories = frames[0][col].cat.categories
+            for frame in frames[1:]:
+                categories = categories.union(frame[col].cat.categories, sort=False)
+            for frame in frames:
+                frame[col] = frame[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+class AppendDataset:
+    """A dataset grown by repeated uploads: one Arrow segment per upload plus a JSON manifest
+
+    Every segment stores only rows whose dedupe key was not seen before, next to
+    the sorted key hashes of those rows, so an append reads the new upload and
+    the key hashes but never the history itself.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.directory = os.path.join(DATASET_DIR, hash_bytes(name.encode('utf-8'))[:16])
+        self.lock = threading.Lock()
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        path = os.path.join(self.directory, DATASET_MANIFEST)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        path = os.path.join(self.directory, DATASET_MANIFEST)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+        self.manifest = manifest
+
+    @property
+    def exists(self):
+        return self.manifest is not None and bool(self.manifest['segments'])
+
+    @property
+    def version(self):
+        return len(self.manifest['segments']) if self.manifest else 0
+
+    @property
+    def fingerprint(self):
+        return (f"dataset:{self.name}", self.version)
+
+    @property
+    def columns(self):
+        return self.manifest['columns']
+
+    @property
+    def col_types(self):
+        return dict(self.manifest['col_types'])
+
+    @property
+    def key(self):
+        return self.manifest['key']
+
+    @property
+    def rows(self):
+        return sum(segment['rows'] for segment in self.manifest['segments']) if self.manifest else 0
+
+    def has_source(self, source):
+        return self.manifest is not None and source in self.manifest['sources']
+
+    def segment_paths(self):
+        return [os.path.join(self.directory, segment['file']) for segment in self.manifest['segments']]
+
+    def segment_fingerprint(self, index):
+        """Cache key prefix of one segment; a segment never changes once written"""
+        return (f"dataset:{self.name}", 'segment', index, self.manifest['segments'][index]['source'])
+
+    def read_segment(self, index):
+        path = self.segment_paths()[index]
+        return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all().to_pandas(split_blocks=True)
+
+    def summary_path(self, index, part):
+        return os.path.join(self.directory, f"summary-{index:05d}-{part}-v{SEGMENT_SUMMARY_VERSION}.pkl")
+
+    def read_summary(self, index, part):
+        """A segment's saved summary (cube, statistics, filter index or sketches), or None"""
+        path = self.summary_path(index, part)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+            logger.warning("Ignoring unreadable segment summary %s: %s", path, e)
+            return None
+
+    def write_summary(self, index, part, summary):
+        """Save a segment's summary next to the segment; like the segment, it never changes"""
+        path = self.summary_path(index, part)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(summary, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def conform(self, raw):
+        """Type an upload like the dataset; returns (frame, col_types, schema problems)"""
+        if self.manifest is None:
+            df, col_types = prepare_dataframe(raw)
+            return optimize_memory(df, col_types), col_types, []
+        col_types = self.col_types
+        df, problems = conform_to_schema(raw, self.columns, col_types)
+        if problems:
+            return None, col_types, problems
+        return optimize_memory(df, dict(col_types)), col_types, []
+
+    def append(self, df, col_types, source, key_cols=None):
+        """Store the rows of `df` whose key is new; returns (added rows, duplicate count)"""
+        with self.lock:
+            manifest = self.manifest or {
+                'columns': list(df.columns),
+                'col_types': {k: v for k, v in col_types.items() if k != 'memory'},
+                'key': list(key_cols or df.columns),
+                'segments': [],
+                'sources': [],
+            }
+            hashes = row_key_hashes(df, manifest['key'])
+            fresh = ~pd.Series(hashes).duplicated().to_numpy()
+            for segment in manifest['segments']:
+                seen = np.load(os.path.join(self.directory, segment['keys']), mmap_mode='r')
+                if len(seen):
+                    positions = np.minimum(np.searchsorted(seen, hashes), len(seen) - 1)
+                    fresh &= seen[positions] != hashes
+            
+            # Arrow cannot store a column mixing Python types (a store column holding 'S1' and 7)
+            added = arrow_safe_frame(df[fresh].reset_index(drop=True))
+            if len(added):
+                index = len(manifest['segments'])
+                segment = {'file': f"segment-{index:05d}.arrow", 'keys': f"keys-{index:05d}.npy",
+                           'rows': len(added), 'source': source}
+                write_arrow_file(pa.Table.from_pandas(added, preserve_index=False),
+                                 os.path.join(self.directory, segment['file']))
+                np.save(os.path.join(self.directory, segment['keys']), np.sort(hashes[fresh]))
+                manifest['segments'].append(segment)
+            manifest['sources'].append(source)
+            os.makedirs(self.directory, exist_ok=True)
+            self._write_manifest(manifest)
+            return added, int((~fresh).sum())
+
+@st.cache_resource
+def get_append_dataset(name):
+    """One AppendDataset object per name, shared by all sessions"""
+    return AppendDataset(name)
+
+def load_conformed_upload(dataset, source, read_raw):
+    """An upload typed like the dataset, read and conformed once per dataset version rather than per rerun"""
+    cache = get_ingestion_cache()
+    # Schema problems are translated messages
+    key = (*dataset.fingerprint, 'conformed', source, st.session_state.get('language', 'en'))
+    conformed = cache.get(key)
+    if conformed is None:
+        conformed = dataset.conform(read_raw())
+        cache.put(key, conformed, frame_nbytes(conformed[0]) if conformed[0] is not None else 0)
+    return conformed
+
+class SegmentedFrame:
+    """The rows of an append dataset as its per-upload segments, never concatenated as a whole
+
+    Supports the slice of the DataFrame API that filtered views use: column
+    selection, len() and take() by dataset-wide row position.
+    """
+
+    def __init__(self, segments):
+        self.segments = list(segments)
+        self.offsets = np.cumsum([0, *map(len, self.segments)])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, cols):
+        return SegmentedFrame([segment[cols] for segment in self.segments])
+
+    @property
+    def columns(self):
+        return self.segments[0].columns
+
+    def take(self, rows):
+        """Rows at sorted dataset-wide positions, as one DataFrame"""
+        bounds = np.searchsorted(rows, self.offsets)
+        parts = [segment.take(rows[low:high] - offset)
+                 for segment, offset, low, high in zip(self.segments, self.offsets, bounds[:-1], bounds[1:])
+                 if high > low]
+        return concat_frames(parts) if parts else self.segments[0].iloc[:0]
+
+def load_dataset_segment(dataset, index):
+    """One segment of an append dataset, read once and kept in the ingestion cache"""
+    cache = get_ingestion_cache()
+    key = (*dataset.segment_fingerprint(index), 'prepared')
+    segment = cache.get(key)
+    if segment is None:
+        segment = dataset.read_segment(index)
+        cache.put(key, segment, frame_nbytes(segment))
+    return segment
+
+def load_dataset_frame(dataset):
+    """Segments of an append dataset, each read once and kept in the ingestion cache"""
+    segments = [load_dataset_segment(dataset, index) for index in range(dataset.version)]
+    return SegmentedFrame(segments), dataset.col_types
+
+class SegmentedAggregates:
+    """KPI and chart aggregates of an append dataset, combined from per-segment results"""
+
+    def __init__(self, frame, col_types, stats):
+        self.frame = frame
+        self.col_types = col_types
+        self._stats = stats
+
+    @property
+    def row_count(self):
+        return len(self.frame)
+
+    @property
+    def columns(self):
+        return list(self.frame.columns)
+
+    def preview(self, n=100):
+        return self.frame.take(np.arange(min(n, len(self.frame))))
+
+    def summary_stats(self):
+        return self._stats
+
+    def numeric_total(self, cols):
+        return self._stats.total(cols)
+
+    def numeric_average(self, cols):
+        return self._stats.average(cols)
+
+    def unique_count(self, cols):
+        return sum(len(pd.unique(np.concatenate([np.asarray(segment[c].dropna().unique(), dtype=object)
+                                                 for segment in self.frame.segments])))
+                   for c in cols)
+
+    def time_series(self, date_col, value_col, freq='D'):
+        sums, counts = [], []
+        for segment in self.frame.segments:
+            ts_data = widen_floats(segment[[date_col, value_col]].dropna())
+            values = pd.Series(ts_data[value_col].to_numpy(), index=pd.DatetimeIndex(ts_data[date_col]))
+            sums.append(values.resample(freq).sum())
+            counts.append(values.resample(freq).count())
+        totals = resample_totals(pd.concat(sums).groupby(level=0).sum(), pd.concat(counts).groupby(level=0).sum(), freq)
+        return series_frame(totals, date_col, value_col)
+
+    def category_totals(self, cat_col, value_col):
+        parts = [widen_floats(segment[value_col]).groupby(segment[cat_col], observed=True).sum()
+                 for segment in self.frame.segments]
+        sums = pd.concat(parts).groupby(level=0).sum()
+        cat_data = pd.DataFrame({cat_col: sums.index, value_col: sums.to_numpy()})
+        return cat_data.sort_values(value_col, ascending=False)
+
+    def histogram(self, col, bins=HISTOGRAM_BINS):
+        # Every segment is binned over the dataset-wide range, so the counts add up
+        if self._stats.count([col]).iloc[0] == 0:
+            return np.histogram(np.array([]), bins=bins)
+        low, high = float(self._stats.min([col]).iloc[0]), float(self._stats.max([col]).iloc[0])
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+        counts = sum(np.histogram(widen_floats(segment[col].dropna()), bins=bins, range=(low, high))[0]
+                     for segment in self.frame.segments)
+        return counts, np.histogram_bin_edges([], bins=bins, range=(low, high))
+
+    def value_counts(self, col):
+        counts = pd.concat([segment[col].value_counts() for segment in self.frame.segments]).groupby(level=0).sum()
+        return counts[counts > 0].rename('count').rename_axis(col).sort_values(ascending=False)
+
+    def iter_chunks(self, rows):
+        for segment in self.frame.segments:
+            for start in range(0, len(segment), rows):
+                yield segment.iloc[start:start + rows]
+
+def load_segment_summary(dataset, index, part, build):
+    """Summary of one segment: the one saved next to it, else built from its rows and saved"""
+    summary = dataset.read_summary(index, part)
+    if summary is None:
+        summary = build(load_dataset_segment(dataset, index))
+        dataset.write_summary(index, part, summary)
+    return summary
+
+def load_dataset_part(dataset, part, build):
+    """A mergeable summary of an append dataset, extending the previous version's with the newest segment
+
+    `build(segment)` summarizes one segment; summaries combine with their merge()
+    and report their size with nbytes(). Each segment's summary is saved with
+    it, so after an eviction or a restart the dataset's summary is merged from
+    those files and only segments without one are read.
+    """
+    cache = get_ingestion_cache()
+    name, version = dataset.fingerprint
+    key = (name, version, part)
+    merged = cache.get(key)
+    if merged is None:
+        previous = cache.get((name, version - 1, part)) if version > 1 else None
+        if previous is not None:
+            merged = previous.merge(load_segment_summary(dataset, version - 1, part, build))
+        else:
+            merged = load_segment_summary(dataset, 0, part, build)
+            for index in range(1, version):
+                merged = merged.merge(load_segment_summary(dataset, index, part, build))
+        cache.put(key, merged, merged.nbytes())
+    return merged
+
+def load_dataset_cube(dataset):
+    """Rollup cube of an append dataset"""
+    return load_dataset_part(dataset, 'cube', lambda segment: RollupCube.build(segment, dataset.col_types))
+
+def load_dataset_stats(dataset):
+    """Summary statistics of an append dataset"""
+    numeric_cols = dataset.col_types['numeric']
+    return load_dataset_part(dataset, 'stats', lambda segment: SummaryStats.from_frame(segment, numeric_cols))
+
+def load_dataset_filter_index(dataset):
+    """Filter index of an append dataset"""
+    return load_dataset_part(dataset, 'filter_index', lambda segment: FilterIndex(segment, dataset.col_types))
+
+def load_dataset_sketches(dataset):
+    """Approximate-mode sketches of an append dataset"""
+    col_types = dataset.col_types
+    return load_dataset_part(dataset, 'sketches', lambda segment: DatasetSketches.from_aggregates(
+        FrameAggregates(segment, col_types), col_types))
+
+def load_dataset_shared(dataset):
+    """Shared-memory copies of an append dataset's segments, one per segment"""
+    frame, col_types = load_dataset_frame(dataset)
+    return [load_shared_dataset(segment, col_types, dataset.segment_fingerprint(index))
+            for index, segment in enumerate(frame.segments)]
+
+def load_dataset_duckdb(dataset):
+    """DuckDB engine scanning every segment of an append dataset in place"""
+    cache = get_ingestion_cache()
+    key = (*dataset.fingerprint, 'duckdb')
+    aggregates = cache.get(key)
+    if aggregates is None:
+        import pyarrow.dataset as pads
+        paths = dataset.segment_paths()
+        # Segments may have been downcast differently; scan them under one widened schema
+        schemas = [pa.ipc.open_file(pa.memory_map(path, 'r')).schema for path in paths]
+        schema = pa.unify_schemas(schemas, promote_options='permissive')
+        aggregates = DuckDBAggregates(pads.dataset(paths, schema=schema, format='arrow'), dataset.col_types)
+        cache.put(key, aggregates, aggregates.nbytes())
+    return aggregates
+
+# ============================================
+# BATCH INGESTION
+# ============================================
+BATCH_EXTENSIONS = ('.xlsx', '.xls', '.csv', '.gz', '.parquet', '.arrow', '.feather')
+# Column holding the file each row of a batch dataset came from
+SOURCE_FILE_COLUMN = 'Source File'
+
+class BatchFile:
+    """One input of a batch: an uploaded file (bytes) or a file under BATCH_ROOT (path)"""
+
+    def __init__(self, name, file_id, path=None, data=None):
+        self.name = name
+        self.file_id = file_id
+        self.path = path
+        self.data = data
+
+def glob_batch_files(pattern):
+    """Supported files matching a folder or glob pattern relative to BATCH_ROOT"""
+    root = os.path.realpath(BATCH_ROOT)
+    target = os.path.join(root, pattern)
+    if os.path.isdir(target):
+        target = os.path.join(target, '*')
+    files = []
+    for path in sorted(glob.glob(target, recursive=True)):
+        real = os.path.realpath(path)
+        # Patterns (and symlinks) may not reach outside BATCH_ROOT
+        if os.path.commonpath([root, real]) != root or not os.path.isfile(real):
+            continue
+        if not real.lower().endswith(BATCH_EXTENSIONS):
+            continue
+        # Server-side files are identified by path, size and mtime instead of hashing their contents
+        info = os.stat(real)
+        file_id = hash_bytes(f"{real}:{info.st_size}:{info.st_mtime_ns}".encode('utf-8'))
+        files.append(BatchFile(os.path.relpath(real, root), file_id, path=real))
+    return files
+
+def collect_batch_files(uploaded_files, pattern):
+    files = []
+    for uploaded in uploaded_files or []:
+        data = uploaded.getvalue()
+        files.append(BatchFile(uploaded.name, hash_bytes(data), data=data))
+    if pattern:
+        files += glob_batch_files(pattern)
+    return files
+
+def union_frames(named_frames):
+    """Stack per-file frames into one, with a source-file column
+
+    Column names are matched ignoring case and surrounding spaces (the first
+    spelling wins), columns missing from a file are left empty, and a column
+    read as dates or numbers in some files is converted to that kind in the rest.
+    """
+    canonical = {}
+    frames = []
+    for _, df in named_frames:
+        df = df.rename(columns=lambda col: canonical.setdefault(str(col).strip().casefold(), str(col).strip()))
+        frames.append(df.loc[:, ~df.columns.duplicated()].copy(deep=False))
+    
+    columns = list(dict.fromkeys(col for df in frames for col in df.columns))
+    for col in columns:
+        parts = [df for df in frames if col in df.columns]
+        is_date = [pd.api.types.is_datetime64_any_dtype(df[col].dtype) for df in parts]
+        is_number = [pd.api.types.is_numeric_dtype(df[col].dtype) for df in parts]
+        if any(is_date) and not all(is_date):
+            for df, date in zip(parts, is_date):
+                if not date:
+                    df[col] = pd.to_datetime(df[col], errors='coerce', format='mixed')
+        elif any(is_number) and not all(is_number):
+            for df, number in zip(parts, is_number):
+                if number:
+                    continue
+                filled = df[col].notna().sum()
+                converted = pd.to_numeric(df[col], errors='coerce')
+                if converted.notna().sum() >= filled * NUMERIC_MIN_VALID_RATIO:
+                    df[col] = converted
+    
+    source_col = SOURCE_FILE_COLUMN
+    while source_col in columns:
+        source_col += '_'
+    # Files uploaded under the same name share a category
+    names = pd.Index([name for name, _ in named_frames])
+    categories = names.unique()
+    codes = np.repeat(categories.get_indexer(names), [len(df) for df in frames])
+    combined = pd.concat(frames, ignore_index=True, sort=False)
+    combined[source_col] = pd.Categorical.from_codes(codes, categories=categories)
+    return combined
+
+def load_batch(files, on_file=None):
+    """Parse a batch of files in the process pool and union them into one prepared dataset
+
+    Returns (batch hash, (df, col_types) or None, failures). Parsed files are
+    cached, so a rerun or a batch with a few new files only parses what changed.
+    A failing file is reported as (name, error) instead of aborting the batch.
+    """
+    cache = get_ingestion_cache()
+    batch_hash = hash_bytes('\n'.join(sorted(f"{f.name}\t{f.file_id}" for f in files)).encode('utf-8'))
+    key = (batch_hash, None, 'prepared')
+    prepared = cache.get(key)
+    failures = cache.get((batch_hash, 'batch_failures'))
+    if prepared is not None and failures is not None:
+        return batch_hash, prepared, failures
+    
+    results = [None] * len(files)
+    failures = []
+    done = 0
+    
+    def finished(i, frame, error):
+        nonlocal done
+        done += 1
+        results[i] = frame
+        if error is not None:
+            failures.append((files[i].name, error))
+        if on_file is not None:
+            on_file(done, len(files), files[i].name, None if frame is None else len(frame), error)
+    
+    pool = get_process_pool()
+    futures = {}
+    for i, file in enumerate(files):
+        parsed = cache.get((file.file_id, 'batch_file'))
+        if parsed is not None:
+            finished(i, parsed, None)
+        else:
+            futures[pool.submit(batch_ingestion.parse_file, file.name, file.path, file.data,
+                                       EXCEL_ENGINE, int(EXCEL_STREAM_MIN_MB * 1024 * 1024))] = i
+    for future in as_completed(futures):
+        i = futures[future]
+        try:
+            parsed = future.result()
+        except Exception as e:
+            finished(i, None, str(e))
+            continue
+        cache.put((files[i].file_id, 'batch_file'), parsed, frame_nbytes(parsed))
+        finished(i, parsed, None)
+    
+    named_frames = [(file.name, frame) for file, frame in zip(files, results) if frame is not None]
+    prepared = None
+    if named_frames:
+        df, col_types = prepare_dataframe(union_frames(named_frames))
+        df = optimize_memory(df, col_types)
+        # A snapshot lets the DuckDB engine scan the batch from disk
+        save_snapshot(df, col_types, batch_hash, None)
+        prepared = (df, col_types)
+        cache.put(key, prepared, frame_nbytes(df))
+    cache.put((batch_hash, 'batch_failures'), failures, 64 * (len(failures) + 1))
+    return batch_hash, prepared, failures
+
+# ============================================
+# ROW FILTERS
+# ============================================
+# Rows per bitmap container and the cardinality above which a container is a bitset
+BITMAP_CHUNK_BITS = 16
+BITMAP_ARRAY_MAX = 4096
+
+def _bitset(container):
+    """Container as a 1024-word bitset"""
+    if container.dtype == np.uint64:
+        return container
+    bits = np.zeros(1 << BITMAP_CHUNK_BITS, dtype=bool)
+    bits[container] = True
+    return np.packbits(bits, bitorder='little').view(np.uint64)
+
+def _positions(container):
+    """Container as a sorted array of in-chunk row positions"""
+    if container.dtype == np.uint16:
+        return container
+    return np.flatnonzero(np.unpackbits(container.view(np.uint8), bitorder='little')).astype(np.uint16)
+
+def _cardinality(container):
+    return len(container) if container.dtype == np.uint16 else int(np.bitwise_count(container).sum())
+
+def _compact(container):
+    """Sparse containers are stored as arrays, dense ones as bitsets"""
+    if _cardinality(container) <= BITMAP_ARRAY_MAX:
+        return _positions(container)
+    return _bitset(container)
+
+def _contains(bitset, positions):
+    words = bitset[positions >> 6]
+    return ((words >> (positions & 63).astype(np.uint64)) & np.uint64(1)).astype(bool)
+
+class RowBitmap:
+    """Roaring-style compressed set of row ids
+
+    Rows are split into chunks of 2**16; each non-empty chunk holds a sorted
+    uint16 array when it has at most BITMAP_ARRAY_MAX rows and a 1024-word
+    bitset otherwise. AND/OR work container by container.
+    """
+
+    def __init__(self, containers=None):
+        self.containers = containers or {}
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Bitmap of sorted, unique row ids"""
+        rows = np.asarray(rows, dtype=np.int64)
+        containers = {}
+        if len(rows):
+            chunks = rows >> BITMAP_CHUNK_BITS
+            for part in np.split(rows, np.flatnonzero(np.diff(chunks)) + 1):
+                positions = (part & ((1 << BITMAP_CHUNK_BITS) - 1)).astype(np.uint16)
+                containers[int(part[0] >> BITMAP_CHUNK_BITS)] = (
+                    positions if len(positions) <= BITMAP_ARRAY_MAX else _bitset(positions)
+                )
+        return cls(containers)
+
+    def __and__(self, other):
+        containers = {}
+        for chunk in self.containers.keys() & other.containers.keys():
+            a, b = self.containers[chunk], other.containers[chunk]
+            if a.dtype == np.uint16 and b.dtype == np.uint16:
+                result = np.intersect1d(a, b, assume_unique=True)
+            elif a.dtype == np.uint16:
+                result = a[_contains(b, a)]
+            elif b.dtype == np.uint16:
+                result = b[_contains(a, b)]
+            else:
+                result = _compact(a & b)
+            if _cardinality(result):
+                containers[chunk] = result
+        return RowBitmap(containers)
+
+    def __or__(self, other):
+        containers = dict(self.containers)
+        for chunk, b in other.containers.items():
+            a = containers.get(chunk)
+            if a is None:
+                containers[chunk] = b
+            elif a.dtype == np.uint16 and b.dtype == np.uint16 and len(a) + len(b) <= BITMAP_ARRAY_MAX:
+                containers[chunk] = np.union1d(a, b)
+            else:
+                containers[chunk] = _compact(_bitset(a) | _bitset(b))
+        return RowBitmap(containers)
+
+    def __len__(self):
+        return sum(_cardinality(c) for c in self.containers.values())
+
+    def shifted(self, offset):
+        """The same rows moved `offset` positions on, e.g. behind an earlier segment"""
+        if offset % (1 << BITMAP_CHUNK_BITS) == 0:
+            return RowBitmap({chunk + (offset >> BITMAP_CHUNK_BITS): container
+                              for chunk, container in self.containers.items()})
+        return RowBitmap.from_rows(self.to_rows() + offset)
+
+    def to_rows(self):
+        """Sorted row ids"""
+        parts = [(np.int64(chunk) << BITMAP_CHUNK_BITS) + _positions(self.containers[chunk]).astype(np.int64)
+                 for chunk in sorted(self.containers)]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def nbytes(self):
+        return sum(c.nbytes for c in self.containers.values())
+
+class RowFilter:
+    """Selected values per categorical column (OR) and date ranges per datetime column, combined with AND
+
+    Date ranges are half-open: start <= date < end.
+    """
+
+    def __init__(self, values=None, dates=None):
+        self.values = {col: tuple(selected) for col, selected in (values or {}).items() if selected}
+        self.dates = dict(dates or {})
+
+    def __bool__(self):
+        return bool(self.values or self.dates)
+
+    def key(self):
+        """Hashable description used in cache keys"""
+        values = tuple((col, tuple(sorted(map(str, selected)))) for col, selected in sorted(self.values.items()))
+        dates = tuple((col, start.value, end.value) for col, (start, end) in sorted(self.dates.items()))
+        return values, dates
+
+    def sql(self):
+        clauses = [
+            f"{quote_identifier(col)} IN ({', '.join(typed_literal(v) for v in selected)})"
+            for col, selected in self.values.items()
+        ]
+        clauses += [
+            f"{quote_identifier(col)} >= TIMESTAMP {quote_literal(start)} AND {quote_identifier(col)} < TIMESTAMP {quote_literal(end)}"
+            for col, (start, end) in self.dates.items()
+        ]
+        return ' AND '.join(clauses)
+
+class FilterIndex:
+    """Per-value row bitmaps of categorical columns and sorted date indexes, built once per dataset
+
+    Categorical columns with more than FILTER_MAX_VALUES distinct values are not indexed.
+    """
+
+    def __init__(self, df, col_types):
+        start = time.perf_counter()
+        self.rows = len(df)
+        self.bitmaps = {}
+        for col in col_types['categorical']:
+            codes, uniques = pd.factorize(df[col], sort=True)
+            if len(uniques) > FILTER_MAX_VALUES:
+                continue
+            # A stable sort keeps each value's rows in ascending order
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            self.bitmaps[col] = {
+                value: RowBitmap.from_rows(order[bounds[i]:bounds[i + 1]])
+                for i, value in enumerate(uniques.tolist())
+            }
+        self.dates = {}
+        for col in col_types['datetime']:
+            stamps = pd.DatetimeIndex(df[col]).as_unit('ns')
+            present = np.flatnonzero(stamps.notna())
+            values = stamps.asi8[present]
+            order = np.argsort(values, kind='stable')
+            self.dates[col] = (present[order], values[order])
+        self.build_seconds = time.perf_counter() - start
+
+    def merge(self, other):
+        """Index of this index's rows followed by another's (e.g. an appended upload)"""
+        start = time.perf_counter()
+        merged = copy.copy(self)
+        merged.rows = self.rows + other.rows
+        merged.bitmaps = {}
+        for col, bitmaps in self.bitmaps.items():
+            theirs = other.bitmaps.get(col)
+            # A column not indexed on either side, or growing past the limit, is not indexed
+            if theirs is None:
+                continue
+            _, values = pd.factorize(pd.Index([*bitmaps, *theirs]), sort=True)
+            if len(values) > FILTER_MAX_VALUES:
+                continue
+            merged.bitmaps[col] = {
+                value: bitmaps.get(value, RowBitmap()) | theirs.get(value, RowBitmap()).shifted(self.rows)
+                for value in values.tolist()
+            }
+        merged.dates = {}
+        for col, (rows, values) in self.dates.items():
+            other_rows, other_values = other.dates[col]
+            values = np.concatenate([values, other_values])
+            order = np.argsort(values, kind='stable')
+            merged.dates[col] = (np.concatenate([rows, other_rows + self.rows])[order], values[order])
+        merged.build_seconds = time.perf_counter() - start
+        return merged
+
+    def filter_values(self, col):
+        """Sorted distinct values of a categorical column, or None when it is not indexed"""
+        bitmaps = self.bitmaps.get(col)
+        return None if bitmaps is None else list(bitmaps)
+
+    def date_bounds(self, col):
+        values = self.dates[col][1]
+        return (None, None) if not len(values) else (pd.Timestamp(values[0]), pd.Timestamp(values[-1]))
+
+    def select(self, row_filter):
+        """RowBitmap of the rows matching a RowFilter"""
+        selection = None
+        for col, selected in row_filter.values.items():
+            bitmap = RowBitmap()
+            for value in selected:
+                bitmap = bitmap | self.bitmaps[col].get(value, RowBitmap())
+            selection = bitmap if selection is None else selection & bitmap
+        for col, (start, end) in row_filter.dates.items():
+            rows, values = self.dates[col]
+            low, high = np.searchsorted(values, [start.value, end.value])
+            bitmap = RowBitmap.from_rows(np.sort(rows[low:high]))
+            selection = bitmap if selection is None else selection & bitmap
+        return RowBitmap.from_rows(np.arange(self.rows)) if selection is None else selection
+
+    def nbytes(self):
+        bitmaps = sum(b.nbytes() for values in self.bitmaps.values() for b in values.values())
+        return bitmaps + sum(rows.nbytes + values.nbytes for rows, values in self.dates.values())
+
+def load_filter_index(df, col_types, fingerprint):
+    """Filter index of a dataset, built on first use and kept in the ingestion cache"""
+    cache = get_ingestion_cache()
+    key = (*fingerprint, 'filter_index')
+    index = cache.get(key)
+    if index is None:
+        index = FilterIndex(df, col_types)
+        cache.put(key, index, index.nbytes())
+    return index
+
+class FilteredAggregates:
+    """Aggregates of the rows matching a RowFilter
+
+    KPIs, daily time series, Top-N and shares are read off the rollup cube's
+    cells that match the filter. Histograms, correlations and whatever the cells
+    cannot answer read the selected rows, which are taken per query and never cached.
+    """
+
+    def __init__(self, df, col_types, index, row_filter, cube=None):
+        self.df = df
+        self.col_types = col_types
+        self.index = index
+        self.row_filter = row_filter
+        self.cells = cube.filter_cells(row_filter) if cube is not None else None
+        self._selection = None
+        self._stats = None
+
+    @property
+    def row_count(self):
+        return int(self.cells.rows.sum()) if self.cells is not None else len(self._rows())
+
+    @property
+    def columns(self):
+        return list(self.df.columns)
+
+    def _rows(self):
+        """Sorted ids of the selected rows, looked up on first use"""
+        if self._selection is None:
+            self._selection = self.index.select(self.row_filter).to_rows()
+        return self._selection
+
+    def _frame(self, cols):
+        """FrameAggregates over the selected rows of a few columns"""
+        return FrameAggregates(self.df[cols].take(self._rows()).reset_index(drop=True), self.col_types)
+
+    def _in_cells(self, col):
+        return self.cells is not None and col in self.cells.stats.index.names
+
+    def preview(self, n=100):
+        return self.df.take(self._rows()[:n])
+
+    def summary_stats(self):
+        if self._stats is None:
+            self._stats = self._frame(self.col_types['numeric']).summary_stats()
+        return self._stats
+
+    def numeric_total(self, cols):
+        return self.cells.total(cols) if self.cells is not None else self.summary_stats().total(cols)
+
+    def numeric_average(self, cols):
+        return self.cells.average(cols) if self.cells is not None else self.summary_stats().average(cols)
+
+    def unique_count(self, cols):
+        return sum(self.cells.rows.index.get_level_values(c).nunique() if self._in_cells(c)
+                   else self._frame([c]).unique_count([c]) for c in cols)
+
+    def time_series(self, date_col, value_col, freq='D'):
+        if freq == 'h' or not self._in_cells(date_col):
+            # Cells hold whole days
+            return self._frame([date_col, value_col]).time_series(date_col, value_col, freq)
+        stats = self.cells.stats
+        sums = stats[('sum', value_col)].groupby(level=date_col).sum()
+        counts = stats[('count', value_col)].groupby(level=date_col).sum()
+        return series_frame(resample_totals(sums, counts, freq), date_col, value_col)
+
+    def category_totals(self, cat_col, value_col):
+        if not self._in_cells(cat_col):
+            return self._frame([cat_col, value_col]).category_totals(cat_col, value_col)
+        sums = self.cells.stats[('sum', value_col)].groupby(level=cat_col, observed=True).sum()
+        cat_data = pd.DataFrame({cat_col: sums.index, value_col: sums.to_numpy()})
+        return cat_data.sort_values(value_col, ascending=False)
+
+    def histogram(self, col, bins=HISTOGRAM_BINS):
+        return self._frame([col]).histogram(col, bins)
+
+    def value_counts(self, col):
+        if not self._in_cells(col):
+            return self._frame([col]).value_counts(col)
+        rows = self.cells.rows.groupby(level=col, observed=True).sum()
+        return rows[rows > 0].rename('count').rename_axis(col).sort_values(ascending=False)
+
+    def iter_chunks(self, rows):
+        selection = self._rows()
+        for start in range(0, len(selection), rows):
+            yield self.df.take(selection[start:start + rows])
+
+# ============================================
+# APPROXIMATE MODE
+# ============================================
+SKETCH_HLL_PRECISION = 14       # 16384 registers: ±0.8% standard error
+SKETCH_HEAVY_HITTERS = 1024     # keys kept per heavy-hitter summary
+SKETCH_TDIGEST_COMPRESSION = 400
+# Error bounds shown on screen cover about 95% of HyperLogLog estimates
+SKETCH_CONFIDENCE_SIGMAS = 2
+
+class DatasetSketches:
+    """HyperLogLog, heavy-hitter and t-digest sketches of a dataset, built in one pass over its chunks"""
+
+    def __init__(self, col_types, weighted_cols):
+        categorical_cols = col_types['categorical']
+        self.distinct = {col: sketches.HyperLogLog(SKETCH_HLL_PRECISION) for col in categorical_cols}
+        self.counts = {col: sketches.HeavyHitters(SKETCH_HEAVY_HITTERS) for col in categorical_cols}
+        # Misra-Gries needs non-negative weights; other value columns stay exact
+        self.totals = {(cat_col, value_col): sketches.HeavyHitters(SKETCH_HEAVY_HITTERS)
+                       for cat_col in categorical_cols for value_col in weighted_cols}
+        self.digests = {col: sketches.TDigest(SKETCH_TDIGEST_COMPRESSION) for col in col_types['numeric']}
+        self.build_seconds = 0.0
+
+    def update(self, chunk):
+        for col, sketch in self.distinct.items():
+            sketch.update(chunk[col])
+        for col, sketch in self.counts.items():
+            sketch.update(chunk[col])
+        for (cat_col, value_col), sketch in self.totals.items():
+            sketch.update(chunk[cat_col], chunk[value_col].fillna(0).to_numpy(np.float64))
+        for col, sketch in self.digests.items():
+            sketch.update(chunk[col].to_numpy(np.float64, na_value=np.nan))
+
+    @classmethod
+    def from_aggregates(cls, aggregates, col_types):
+        """Sketches of every chunk of an aggregates object"""
+        start = time.perf_counter()
+        minimums = aggregates.summary_stats().min(col_types['numeric'])
+        bundle = cls(col_types, [col for col, low in minimums.items() if not low < 0])
+        for chunk in aggregates.iter_chunks(STREAM_CHUNK_ROWS):
+            bundle.update(chunk)
+        bundle.build_seconds = time.perf_counter() - start
+        return bundle
+
+    def merge(self, other):
+        """Sketches of both bundles' rows; a value column negative on either side keeps no weighted sketch"""
+        start = time.perf_counter()
+        merged = copy.copy(self)
+        merged.distinct = {col: sketch.merge(other.distinct[col]) for col, sketch in self.distinct.items()}
+        merged.counts = {col: sketch.merge(other.counts[col]) for col, sketch in self.counts.items()}
+        merged.totals = {key: sketch.merge(other.totals[key]) for key, sketch in self.totals.items()
+                         if key in other.totals}
+        merged.digests = {col: sketch.merge(other.digests[col]) for col, sketch in self.digests.items()}
+        merged.build_seconds = time.perf_counter() - start
+        return merged
+
+    def nbytes(self):
+        all_sketches = [*self.distinct.values(), *self.counts.values(), *self.totals.values(), *self.digests.values()]
+        return sum(sketch.nbytes() for sketch in all_sketches)
+
+def load_sketches(aggregates, col_types, fingerprint):
+    """Sketches of a dataset, built on first use and kept in the ingestion cache"""
+    cache = get_ingestion_cache()
+    key = (*fingerprint, 'sketches')
+    bundle = cache.get(key)
+    if bundle is None:
+        bundle = DatasetSketches.from_aggregates(aggregates, col_types)
+        cache.put(key, bundle, bundle.nbytes())
+    return bundle
+
+class SketchAggregates:
+    """Answers distinct counts, Top-N, shares and histograms from sketches; the rest is exact
+
+    The *_error methods give the on-screen error bound of the matching answer.
+    """
+
+    def __init__(self, bundle, inner):
+        self.sketches = bundle
+        self.inner = inner
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def unique_count(self, cols):
+        return int(round(sum(self.sketches.distinct[c].estimate() for c in cols)))
+
+    def unique_count_error(self, cols):
+        return sum(SKETCH_CONFIDENCE_SIGMAS * self.sketches.distinct[c].relative_error
+                   * self.sketches.distinct[c].estimate() for c in cols)
+
+    def category_totals(self, cat_col, value_col):
+        sketch = self.sketches.totals.get((cat_col, value_col))
+        if sketch is None:
+            return self.inner.category_totals(cat_col, value_col)
+        top = sketch.top()
+        return pd.DataFrame({cat_col: top.index, value_col: top.to_numpy()})
+
+    def category_totals_error(self, cat_col, value_col):
+        sketch = self.sketches.totals.get((cat_col, value_col))
+        return 0.0 if sketch is None else sketch.error
+
+    def value_counts(self, col):
+        top = self.sketches.counts[col].top()
+        return pd.Series(top.to_numpy().round().astype(np.int64), index=pd.Index(top.index, name=col), name='count')
+
+    def value_counts_error(self, col):
+        return self.sketches.counts[col].error
+
+    def histogram(self, col, bins=HISTOGRAM_BINS):
+        counts, edges, _ = self.sketches.digests[col].histogram(bins)
+        return counts, edges
+
+    def histogram_error(self, col):
+        # No bin can be off by more than the heaviest centroid
+        return float(self.sketches.digests[col].weights.max(initial=0))
+
+    def quantiles(self, col, qs):
+        """Quantile estimates and their rank error (fraction of rows)"""
+        digest = self.sketches.digests[col]
+        return [digest.quantile(q) for q in qs], max(digest.rank_error(q) for q in qs)
+
+# ============================================
+# AGGREGATION CACHE
+# ============================================
+def result_nbytes(result):
+    """Approximate memory held by a cached aggregate"""
+    if isinstance(result, pd.DataFrame):
+        return frame_nbytes(result)
+    if isinstance(result, pd.Series):
+        return int(result.memory_usage(index=True, deep=True))
+    if isinstance(result, np.ndarray):
+        return result.nbytes
+    if isinstance(result, tuple):
+        return sum(result_nbytes(part) for part in result)
+    if isinstance(result, SummaryStats):
+        return result.nbytes()
+    return 64
+
+@st.cache_resource
+def get_aggregation_cache():
+    """Process-wide cache of chart/KPI aggregates shared between all sessions"""
+    return MemoryLRUCache(AGGREGATION_CACHE_MB * 1024 * 1024)
+
+class CachedAggregates:
+    """Memoizes another aggregates object, keyed by (dataset fingerprint, operation, columns, parameters)"""
+
+    def __init__(self, inner, fingerprint, cache):
+        self.inner = inner
+        self.fingerprint = fingerprint
+        self.cache = cache
+
+    def __getattr__(self, name):
+        # row_count, columns, preview, col_types, ... come straight from the wrapped object
+        return getattr(self.inner, name)
+
+    def _memo(self, op, columns, params, compute):
+        key = (self.fingerprint, op, tuple(columns), params)
+        result = self.cache.get(key)
+        if result is None:
+            result = compute()
+            self.cache.put(key, result, result_nbytes(result))
+        return result
+
+    def summary_stats(self):
+        # KPIs and correlations are read off these statistics of all numeric
+        # columns, so a different column selection never rescans the rows
+        return self._memo('summary_stats', (), (), self.inner.summary_stats)
+
+    def numeric_total(self, cols):
+        return self._memo('numeric_total', cols, (), lambda: self.inner.numeric_total(cols))
+
+    def numeric_average(self, cols):
+        return self._memo('numeric_average', cols, (), lambda: self.inner.numeric_average(cols))
+
+    def unique_count(self, cols):
+        return self._memo('unique_count', cols, (), lambda: self.inner.unique_count(cols))
+
+    def time_series(self, date_col, value_col, freq='D'):
+        return self._memo('time_series', (date_col, value_col), (freq,),
+                          lambda: self.inner.time_series(date_col, value_col, freq))
+
+    def category_totals(self, cat_col, value_col):
+        # Cached fully sorted, so changing Top N only re-slices
+        return self._memo('category_totals', (cat_col, value_col), (),
+                          lambda: self.inner.category_totals(cat_col, value_col))
+
+    def histogram(self, col, bins=HISTOGRAM_BINS):
+        return self._memo('histogram', (col,), (bins,), lambda: self.inner.histogram(col, bins))
+
+    def correlation(self, cols):
+        return self.summary_stats().correlation(cols)
+
+    def value_counts(self, col):
+        return self._memo('value_counts', (col,), (), lambda: self.inner.value_counts(col))
+
+def render_cache_stats():
+    """Sidebar expander with hit/miss counters of the shared caches"""
+    with st.sidebar.expander(t('cache_stats')):
+        for label_key, cache in (('cache_ingestion', get_ingestion_cache()),
+                                 ('cache_aggregation', get_aggregation_cache())):
+            st.markdown(f"**{t(label_key)}**")
+            st.caption(t('cache_summary', hits=cache.hits, misses=cache.misses,
+                         entries=len(cache), size=format_bytes(cache.total_bytes)))
+
+# ============================================
+# INSTRUMENTATION
+# ============================================
+# Upper bounds (seconds) of the stage wall-time histogram buckets
+STAGE_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def read_memory_status():
+    """Current and peak resident set size in bytes from /proc (Linux), else None"""
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(fields['VmRSS'].split()[0]) * 1024, int(fields['VmHWM'].split()[0]) * 1024
+    except (OSError, KeyError, ValueError):
+        return None
+
+def reset_peak_memory():
+    """Restart peak-RSS tracking at the current RSS (Linux); False where unsupported"""
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='ascii') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+class StageRecorder:
+    """Wall time, CPU time, peak RSS delta and cache hits/misses of the stages of one script run
+
+    Stages nest; a parent's figures include its children. Nesting is tracked per
+    thread, so panels computed concurrently each get their own top-level stages.
+    CPU time, RSS and the cache counters are process-wide, so concurrent panels
+    and sessions show up in each other's stages.
+    """
+
+    def __init__(self, session, caches, metrics):
+        self.session = session
+        self.caches = caches
+        self.metrics = metrics
+        self.records = []
+        self._local = threading.local()
+
+    @property
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _cache_counts(self):
+        return (sum(cache.hits for cache in self.caches), sum(cache.misses for cache in self.caches))
+
+    def save_peak(self, memory):
+        """Fold the peak so far into the innermost open stage before peak tracking restarts"""
+        if self._stack and memory is not None:
+            self._stack[-1]['peak'] = max(self._stack[-1]['peak'], memory[1])
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        memory = read_memory_status()
+        # Keep the parent's peak so far; the reset below restarts tracking for this stage
+        self.save_peak(memory)
+        tracked = memory is not None and reset_peak_memory()
+        frame = {'peak': 0}
+        self._stack.append(frame)
+        hits, misses = self._cache_counts()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            end_hits, end_misses = self._cache_counts()
+            record = {
+                'stage': name,
+                'depth': len(self._stack) - 1,
+                'wall_seconds': time.perf_counter() - wall,
+                'cpu_seconds': time.process_time() - cpu,
+                'peak_rss_delta_bytes': None,
+                'cache_hits': end_hits - hits,
+                'cache_misses': end_misses - misses,
+            }
+            self._stack.pop()
+            if tracked:
+                frame['peak'] = max(frame['peak'], read_memory_status()[1])
+                record['peak_rss_delta_bytes'] = max(frame['peak'] - memory[0], 0)
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'], frame['peak'])
+            self.records.append(record)
+            self.metrics.observe(self.session, record)
+
+class StageMetrics:
+    """Stage records of every session: a Prometheus text exposition and an optional JSON-lines log"""
+
+    def __init__(self, log_path, metrics_path):
+        self.log_path = log_path
+        self.metrics_path = metrics_path
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, session, record):
+        with self._lock:
+            stats = self.stages.setdefault(record['stage'], {
+                'buckets': [0] * len(STAGE_SECONDS_BUCKETS), 'count': 0, 'wall': 0.0, 'cpu': 0.0,
+                'peak_rss': 0, 'hits': 0, 'misses': 0,
+            })
+            for i, bound in enumerate(STAGE_SECONDS_BUCKETS):
+                if record['wall_seconds'] <= bound:
+                    stats['buckets'][i] += 1
+            stats['count'] += 1
+            stats['wall'] += record['wall_seconds']
+            stats['cpu'] += record['cpu_seconds']
+            stats['peak_rss'] = max(stats['peak_rss'], record['peak_rss_delta_bytes'] or 0)
+            stats['hits'] += record['cache_hits']
+            stats['misses'] += record['cache_misses']
+            if self.log_path:
+                line = json.dumps({'time': time.time(), 'session': session, **record})
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+
+    def prometheus_text(self):
+        """Metrics in the Prometheus text exposition format"""
+        lines = [
+            '# HELP dashboard_stage_wall_seconds Wall time of dashboard stages.',
+            '# TYPE dashboard_stage_wall_seconds histogram',
+        ]
+        with self._lock:
+            stages = {name: dict(stats, buckets=list(stats['buckets'])) for name, stats in self.stages.items()}
+        for name, stats in sorted(stages.items()):
+            label = f'stage="{name}"'
+            for bound, count in zip(STAGE_SECONDS_BUCKETS, stats['buckets']):
+                lines.append(f'dashboard_stage_wall_seconds_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'dashboard_stage_wall_seconds_bucket{{{label},le="+Inf"}} {stats["count"]}')
+            lines.append(f'dashboard_stage_wall_seconds_sum{{{label}}} {stats["wall"]:.6f}')
+            lines.append(f'dashboard_stage_wall_seconds_count{{{label}}} {stats["count"]}')
+        for metric, kind, key, help_text in (
+            ('dashboard_stage_cpu_seconds_total', 'counter', 'cpu', 'Process CPU time during dashboard stages.'),
+            ('dashboard_stage_peak_rss_delta_bytes', 'gauge', 'peak_rss', 'Largest peak RSS increase seen in a stage.'),
+            ('dashboard_stage_cache_hits_total', 'counter', 'hits', 'Shared cache hits during dashboard stages.'),
+            ('dashboard_stage_cache_misses_total', 'counter', 'misses', 'Shared cache misses during dashboard stages.'),
+        ):
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for name, stats in sorted(stages.items()):
+                value = f'{stats[key]:.6f}' if key == 'cpu' else stats[key]
+                lines.append(f'{metric}{{stage="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_metrics_file(self):
+        """Publish the metrics for a node_exporter textfile collector (atomic replace)"""
+        if not self.metrics_path:
+            return
+        tmp_path = f"{self.metrics_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, self.metrics_path)
+
+class PeakMemory:
+    """Peak RSS increase over a `with` block in bytes; `delta` stays None where unsupported
+
+    Resetting the peak is process-wide, so by default it is only done in an
+    instrumented run (reset=None), where stages reset it anyway. Otherwise the
+    delta is the new peak if the block set one, else the RSS growth over the block.
+    """
+
+    def __init__(self, reset=None):
+        self.reset = reset
+
+    def __enter__(self):
+        self.delta = None
+        self._start = read_memory_status()
+        recorder = _active_recorder.get()
+        reset = recorder is not None if self.reset is None else self.reset
+        if reset and recorder is not None:
+            recorder.save_peak(self._start)
+        self._reset = self._start is not None and reset and reset_peak_memory()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = read_memory_status() if self._start is not None else None
+        if end is None:
+            return False
+        if self._reset or end[1] > self._start[1]:
+            self.delta = max(end[1] - self._start[0], 0)
+        else:
+            self.delta = max(end[0] - self._start[0], 0)
+        return False
+
+@st.cache_resource
+def get_stage_metrics():
+    """Process-wide stage metrics shared by all instrumented sessions"""
+    return StageMetrics(INSTRUMENTATION_LOG, METRICS_FILE)
+
+_active_recorder = contextvars.ContextVar('dashboard_stage_recorder', default=None)
+
+def start_instrumentation():
+    """Recorder for this script run when instrumentation is on (env or ?debug=1), else None"""
+    enabled = INSTRUMENTATION or st.query_params.get('debug') == '1'
+    recorder = None
+    if enabled:
+        session = st.session_state.setdefault('instrumentation_session', uuid.uuid4().hex[:12])
+        recorder = StageRecorder(session, (get_ingestion_cache(), get_aggregation_cache(), get_image_cache()),
+                                 get_stage_metrics())
+    _active_recorder.set(recorder)
+    return recorder
+
+def stage(name):
+    """Context manager timing a named stage of the current run; a no-op unless instrumented"""
+    recorder = _active_recorder.get()
+    return contextlib.nullcontext() if recorder is None else recorder.stage(name)
+
+def render_debug_panel(recorder):
+    """Collapsible table of this run's stages plus the process-wide Prometheus metrics"""
+    metrics = get_stage_metrics()
+    metrics.write_metrics_file()
+    with st.expander(t('debug_panel')):
+        st.dataframe(pd.DataFrame({
+            t('debug_stage'): [' ' * r['depth'] + r['stage'] for r in recorder.records],
+            t('debug_wall'): [round(r['wall_seconds'] * 1000, 1) for r in recorder.records],
+            t('debug_cpu'): [round(r['cpu_seconds'] * 1000, 1) for r in recorder.records],
+            t('debug_rss'): [format_bytes(r['peak_rss_delta_bytes']) if r['peak_rss_delta_bytes'] is not None
+                             else t('na') for r in recorder.records],
+            t('debug_hits'): [r['cache_hits'] for r in recorder.records],
+            t('debug_misses'): [r['cache_misses'] for r in recorder.records],
+        }), hide_index=True, use_container_width=True)
+        st.caption(t('debug_metrics'))
+        st.code(metrics.prometheus_text(), language='text')
+
+# ============================================
+# CHART RENDERING
+# ============================================
+def aggregate_digest(*parts):
+    """Stable hash of chart inputs (aggregates plus parameters) used as the image cache key"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            digest.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+            names = part.columns if isinstance(part, pd.DataFrame) else [part.name]
+            digest.update(repr(list(names)).encode('utf-8'))
+        elif isinstance(part, np.ndarray):
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(repr(part).encode('utf-8'))
+    return digest.hexdigest()
+
+def lttb_indices(x, y, max_points=MAX_PLOT_POINTS):
+    """Largest-Triangle-Three-Buckets: indices of the points that best preserve a series' shape"""
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+    xs = np.asarray(x, dtype=np.float64)
+    ys = np.asarray(y, dtype=np.float64)
+    # The first and last points are always kept; inner points are split into equal buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    keep = np.empty(max_points, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    selected = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = xs[end:next_end].mean(), ys[end:next_end].mean()
+        # Pick the point forming the largest triangle with the previous pick and the next bucket's mean
+        area = np.abs((xs[selected] - avg_x) * (ys[start:end] - ys[selected])
+                      - (xs[selected] - xs[start:end]) * (avg_y - ys[selected]))
+        selected = start + int(np.argmax(area))
+        keep[i + 1] = selected
+    return keep
+
+def downsample_series(ts_data, date_col, value_col, max_points=MAX_PLOT_POINTS):
+    """Shape-preserving subset of a time series for plotting; statistics use the full series"""
+    if len(ts_data) <= max_points:
+        return ts_data
+    x = pd.DatetimeIndex(ts_data[date_col]).asi8
+    return ts_data.iloc[lttb_indices(x, ts_data[value_col].to_numpy(), max_points)]
+
+def draw_time_series(ts_data, date_col, value_col):
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    ax.plot(ts_data[date_col], ts_data[value_col], 
+           marker='o', linewidth=2, markersize=6, color='#2E86AB')
+    ax.set_title(f"Trend {value_col} over Time", fontsize=16, fontweight='bold')
+    ax.set_xlabel(date_col, fontsize=12)
+    ax.set_ylabel(value_col, fontsize=12)
+    ax.grid(True, alpha=0.3)
+    ax.fill_between(ts_data[date_col], ts_data[value_col], alpha=0.2, color='#2E86AB')
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+    return fig
+
+def draw_top_categories(cat_data, cat_col, value_col, top_n):
+    import matplotlib
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    colors = matplotlib.colormaps['Set3'](np.linspace(0, 1, len(cat_data)))
+    bars = ax.barh(range(len(cat_data)), cat_data[value_col], color=colors)
+    ax.set_yticks(range(len(cat_data)))
+    ax.set_yticklabels(cat_data[cat_col])
+    ax.set_xlabel(value_col)
+    ax.set_title(f"Top {top_n} {cat_col} by {value_col}", fontsize=14)
+    ax.invert_yaxis()
+    
+    # Add value labels
+    for bar, val in zip(bars, cat_data[value_col]):
+        ax.text(val + val*0.01, bar.get_y() + bar.get_height()/2, 
+               f'{val:,.0f}', va='center', fontsize=10)
+    
+    fig.tight_layout()
+    return fig
+
+def draw_histogram(counts, edges, col):
+    from matplotlib.figure import Figure
+    # Pre-binned counts: weights reproduce the histogram without the raw values
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    ax.hist(edges[:-1], bins=edges, weights=counts, edgecolor='black', 
+           alpha=0.7, color='#A23B72')
+    ax.set_title(f"Distribution of {col}", fontsize=14)
+    ax.set_xlabel(col)
+    ax.set_ylabel("Frequency")
+    ax.grid(True, alpha=0.3)
+    return fig
+
+def draw_correlation(corr_matrix):
+    from matplotlib.figure import Figure
+    corr_cols = list(corr_matrix.columns)
+    fig = Figure(figsize=(10, 8))
+    ax = fig.subplots()
+    im = ax.imshow(corr_matrix, cmap='coolwarm', aspect='auto', vmin=-1, vmax=1)
+    
+    # Add labels
+    ax.set_xticks(range(len(corr_cols)))
+    ax.set_yticks(range(len(corr_cols)))
+    ax.set_xticklabels(corr_cols, rotation=45, ha='right')
+    ax.set_yticklabels(corr_cols)
+    
+    # Add colorbar
+    cbar = fig.colorbar(im, ax=ax)
+    cbar.set_label('Correlation Coefficient')
+    
+    # Add correlation values
+    for i in range(len(corr_cols)):
+        for j in range(len(corr_cols)):
+            text_color = 'white' if abs(corr_matrix.iloc[i, j]) > 0.5 else 'black'
+            ax.text(j, i, f'{corr_matrix.iloc[i, j]:.2f}',
+                   ha='center', va='center', color=text_color,
+                   fontsize=9, fontweight='bold')
+    
+    ax.set_title("Correlation Heatmap", fontsize=14, fontweight='bold')
+    fig.tight_layout()
+    return fig
+
+def draw_category_share(share_data, share_cat):
+    import matplotlib
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    
+    if len(share_data) <= 8:
+        # Pie chart for few categories
+        colors = matplotlib.colormaps['Pastel1'](range(len(share_data)))
+        wedges, texts, autotexts = ax.pie(
+            share_data['Count'], 
+            labels=share_data['Category'],
+            autopct='%1.1f%%',
+            colors=colors,
+            startangle=90
+        )
+        ax.set_title(f"Share of {share_cat}", fontsize=14)
+        
+        # Improve readability
+        for autotext in autotexts:
+            autotext.set_color('black')
+            autotext.set_fontweight('bold')
+    else:
+        # Bar chart for many categories
+        y_pos = range(len(share_data))
+        ax.barh(y_pos, share_data['Count'])
+        ax.set_yticks(y_pos)
+        ax.set_yticklabels(share_data['Category'])
+        ax.set_xlabel('Count')
+        ax.set_title(f"Distribution of {share_cat}", fontsize=14)
+        ax.invert_yaxis()
+    
+    fig.tight_layout()
+    return fig
+
+def figure_to_png(fig, dpi=200):
+    """Rasterize a figure
+
+    Figures are created without pyplot, so nothing global tracks them: panels
+    can draw concurrently and a dropped figure is simply garbage-collected.
+    """
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+@st.cache_resource
+def get_image_cache():
+    """Process-wide cache of rendered chart images keyed by aggregate hash"""
+    return MemoryLRUCache(IMAGE_CACHE_MB * 1024 * 1024)
+
+class MatplotlibBackend:
+    """Static charts rendered once per distinct aggregate and served from an image cache"""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def _show(self, draw, *inputs):
+        key = aggregate_digest(draw.__name__, *inputs)
+        png = self.cache.get(key)
+        if png is None:
+            png = figure_to_png(draw(*inputs))
+            self.cache.put(key, png, len(png))
+        st.image(png, use_container_width=True)
+
+    def time_series(self, ts_data, date_col, value_col):
+        self._show(draw_time_series, ts_data, date_col, value_col)
+
+    def top_categories(self, cat_data, cat_col, value_col, top_n):
+        self._show(draw_top_categories, cat_data, cat_col, value_col, top_n)
+
+    def histogram(self, counts, edges, col):
+        self._show(draw_histogram, counts, edges, col)
+
+    def correlation(self, corr_matrix):
+        self._show(draw_correlation, corr_matrix)
+
+    def category_share(self, share_data, share_cat):
+        self._show(draw_category_share, share_data, share_cat)
+
+class PlotlyBackend:
+    """Interactive charts drawn client-side; the time series uses WebGL"""
+
+    def _show(self, fig, title):
+        fig.update_layout(title=title, margin=dict(l=10, r=10, t=50, b=10))
+        st.plotly_chart(fig, use_container_width=True)
+
+    def time_series(self, ts_data, date_col, value_col):
+        fig = go.Figure(go.Scattergl(
+            x=ts_data[date_col], y=ts_data[value_col], mode='lines+markers', fill='tozeroy',
+            line=dict(color='#2E86AB', width=2), marker=dict(size=6), name=value_col
+        ))
+        fig.update_xaxes(title_text=date_col)
+        fig.update_yaxes(title_text=value_col)
+        self._show(fig, f"Trend {value_col} over Time")
+
+    def top_categories(self, cat_data, cat_col, value_col, top_n):
+        fig = go.Figure(go.Bar(
+            x=cat_data[value_col], y=cat_data[cat_col].astype(str), orientation='h',
+            text=[f'{val:,.0f}' for val in cat_data[value_col]], textposition='outside'
+        ))
+        fig.update_yaxes(autorange='reversed')
+        fig.update_xaxes(title_text=value_col)
+        self._show(fig, f"Top {top_n} {cat_col} by {value_col}")
+
+    def histogram(self, counts, edges, col):
+        fig = go.Figure(go.Bar(
+            x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges),
+            marker=dict(color='#A23B72', line=dict(color='black', width=1)), opacity=0.7
+        ))
+        fig.update_xaxes(title_text=col)
+        fig.update_yaxes(title_text="Frequency")
+        self._show(fig, f"Distribution of {col}")
+
+    def correlation(self, corr_matrix):
+        labels = [str(c) for c in corr_matrix.columns]
+        fig = go.Figure(go.Heatmap(
+            z=corr_matrix.to_numpy(), x=labels, y=labels, zmin=-1, zmax=1,
+            colorscale='RdBu_r', text=np.round(corr_matrix.to_numpy(), 2),
+            texttemplate='%{text:.2f}', colorbar=dict(title='Correlation Coefficient')
+        ))
+        fig.update_yaxes(autorange='reversed')
+        self._show(fig, "Correlation Heatmap")
+
+    def category_share(self, share_data, share_cat):
+        fig = go.Figure(go.Pie(
+            labels=share_data['Category'].astype(str), values=share_data['Count'],
+            textinfo='percent+label', sort=False, direction='clockwise', rotation=90
+        ))
+        self._show(fig, f"Share of {share_cat}")
+
+CHART_BACKENDS = ('matplotlib', 'plotly')
+
+def get_chart_backend(name):
+    """Chart renderer selected in the sidebar"""
+    if name == 'plotly':
+        return PlotlyBackend()
+    return MatplotlibBackend(get_image_cache())
+
+# ============================================
+# COLD START
+# ============================================
+# A new server process only imports what the upload page needs. Matplotlib and
+# the Excel readers load on first use, which prewarm() can move off the first
+# user's request: in a background thread of the server (DASHBOARD_PREWARM=1),
+# and at container start through `python supermarket_multilingual.py warmup`,
+# which also leaves the font cache and compiled modules on disk.
+def prewarm():
+    """Import and exercise the deferred libraries once; seconds per step"""
+    timings = {}
+
+    def step(name, work):
+        start = time.perf_counter()
+        work()
+        timings[name] = time.perf_counter() - start
+
+    def load_matplotlib():
+        # Importing the font manager reads the font cache, building it on a fresh install
+        font_manager = importlib.import_module('matplotlib.font_manager')
+        importlib.import_module('matplotlib.figure')
+        font_manager.fontManager
+
+    def first_chart():
+        # Text layout and the Agg renderer are set up by the first rasterized figure
+        figure_to_png(draw_histogram(np.array([1, 2, 1]), np.arange(4.0), 'x'), dpi=50)
+
+    def load_excel():
+        importlib.import_module('openpyxl')
+        if excel_engines.HAS_CALAMINE:
+            importlib.import_module('python_calamine')
+
+    step('matplotlib', load_matplotlib)
+    step('first_chart', first_chart)
+    step('excel', load_excel)
+    return timings
+
+@st.cache_resource
+def start_prewarm():
+    """Pre-warm once per server process, without holding up the first page"""
+    thread = threading.Thread(target=prewarm, name='dashboard-prewarm', daemon=True)
+    thread.start()
+    return thread
+
+def warmup_main(argv):
+    """`warmup` command: fill the on-disk caches and print the cost of each first use"""
+    import compileall
+    parser = argparse.ArgumentParser(
+        prog='supermarket_multilingual.py warmup',
+        description="Pre-warm the dashboard at container start: compile its modules, build the "
+                    "Matplotlib font cache and import the chart and Excel libraries once")
+    parser.parse_args(argv)
+    start = time.perf_counter()
+    compileall.compile_dir(os.path.dirname(os.path.abspath(__file__)), maxlevels=0, quiet=1)
+    timings = {'compile': time.perf_counter() - start}
+    timings.update(prewarm())
+    print(' '.join(f"{name}={seconds:.3f}s" for name, seconds in timings.items()), file=sys.stderr)
+    return 0
+
+# ============================================
+# DATA EXPORT
+# ============================================
+# Format: (MIME type of a single file, extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', '.csv'),
+    'parquet': ('application/vnd.apache.parquet', '.parquet'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', '.xlsx'),
+}
+
+def export_schema(frame):
+    """Arrow schema of an export, taken from the column dtypes rather than the first chunk's values
+
+    Categoricals are written as their values, since categories may differ between
+    chunks. Integers and floats are widened so chunks downcast differently (the
+    segments of an append dataset) fit the same schema.
+    """
+    fields = []
+    for field in pa.Schema.from_pandas(frame.iloc[:0], preserve_index=False):
+        kind = field.type.value_type if pa.types.is_dictionary(field.type) else field.type
+        if pa.types.is_signed_integer(kind):
+            kind = pa.int64()
+        elif pa.types.is_unsigned_integer(kind):
+            kind = pa.uint64()
+        elif pa.types.is_floating(kind):
+            kind = pa.float64()
+        fields.append(field.with_type(kind))
+    return pa.schema(fields)
+
+def arrow_chunks(frames):
+    """Arrow tables with one stable schema from DataFrame chunks
+
+    Object and mixed-type columns become strings first (arrow_safe_frame), so a
+    column that is empty in the first chunk is not typed as null.
+    """
+    schema = None
+    for frame in frames:
+        frame = arrow_safe_frame(frame)
+        if schema is None:
+            schema = export_schema(frame)
+        yield pa.Table.from_pandas(frame, preserve_index=False).cast(schema)
+
+def write_csv(frames, sink):
+    writer = None
+    for table in arrow_chunks(frames):
+        if writer is None:
+            writer = pacsv.CSVWriter(sink, table.schema)
+        writer.write_table(table)
+    if writer is not None:
+        writer.close()
+
+def write_parquet(frames, sink):
+    writer = None
+    for table in arrow_chunks(frames):
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema, compression='zstd')
+        # One row group per chunk
+        writer.write_table(table)
+    if writer is not None:
+        writer.close()
+
+# Data rows per worksheet (Excel's limit minus the header row)
+EXCEL_MAX_ROWS = 1048575
+EXCEL_SHEET_NAME_CHARS = 31
+# Day zero of Excel's 1900 date system (1900-02-29 that never was included)
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+SPREADSHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+RELATIONSHIP_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PACKAGE_RELATIONSHIP_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml'
+# Cell style 1 shows date serials as dates
+XLSX_STYLES = (
+    f'<styleSheet xmlns="{SPREADSHEET_NS}">'
+    '<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm:ss"/></numFmts>'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+EMPTY_CELL = '<c/>'
+
+def xml_escape(text):
+    """Escape strings (a Series) for XML text and attributes, dropping characters XML cannot hold"""
+    return (text.str.replace('&', '&amp;', regex=False)
+                .str.replace('<', '&lt;', regex=False)
+                .str.replace('>', '&gt;', regex=False)
+                .str.replace('"', '&quot;', regex=False)
+                .str.replace('[\x00-\x08\x0b\x0c\x0e-\x1f]', '', regex=True))
+
+def text_cells(text):
+    """Inline-string cells of a string Series (missing values become empty cells)"""
+    present = text.notna().to_numpy()
+    escaped = xml_escape(text.fillna('').astype(str)).to_numpy(dtype=object)
+    return np.where(present, '<c t="inlineStr"><is><t xml:space="preserve">' + escaped + '</t></is></c>', EMPTY_CELL)
+
+def column_cells(column):
+    """SpreadsheetML of one column's cells, built for the whole column at once"""
+    dtype = column.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        # Escape each category once and look the cells up by code
+        cells = text_cells(pd.Series(dtype.categories.astype(str)))
+        codes = column.cat.codes.to_numpy()
+        return np.where(codes >= 0, cells[codes], EMPTY_CELL)
+    if pd.api.types.is_bool_dtype(dtype):
+        values = column.to_numpy(dtype=object, na_value=None)
+        return np.where(pd.isna(values), EMPTY_CELL,
+                        np.where(values == True, '<c t="b"><v>1</v></c>', '<c t="b"><v>0</v></c>'))
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        if getattr(dtype, 'tz', None) is not None:
+            column = column.dt.tz_localize(None)
+        values = ((column - EXCEL_EPOCH) / pd.Timedelta(days=1)).to_numpy(dtype=np.float64, na_value=np.nan)
+        return np.where(np.isnan(values), EMPTY_CELL, '<c s="1"><v>' + values.astype(str).astype(object) + '</v></c>')
+    if pd.api.types.is_integer_dtype(dtype) and not column.hasnans:
+        return '<c><v>' + column.to_numpy().astype(str).astype(object) + '</v></c>'
+    if pd.api.types.is_numeric_dtype(dtype):
+        # Keep float32 at its own precision so 0.1 is written as 0.1
+        values = column.to_numpy(dtype=np.float32 if dtype == np.float32 else np.float64, na_value=np.nan)
+        return np.where(np.isfinite(values), '<c><v>' + values.astype(str).astype(object) + '</v></c>', EMPTY_CELL)
+    return text_cells(column)
+
+def sheet_rows(frame):
+    """One <row> element per row of a DataFrame"""
+    rows = np.full(len(frame), '<row>', dtype=object)
+    for col in frame.columns:
+        rows = rows + column_cells(frame[col])
+    return ''.join(rows + '</row>')
+
+def excel_sheet_name(name, used):
+    """A valid, unique worksheet name"""
+    name = ''.join('_' if c in '[]:*?/\\' else c for c in str(name))[:EXCEL_SHEET_NAME_CHARS] or 'Sheet'
+    candidate, n = name, 2
+    while candidate.lower() in used:
+        suffix = f" ({n})"
+        candidate, n = name[:EXCEL_SHEET_NAME_CHARS - len(suffix)] + suffix, n + 1
+    used.add(candidate.lower())
+    return candidate
+
+def write_excel(sheets, sink):
+    """Stream (name, frames) pairs into a workbook, one worksheet each
+
+    Worksheet XML is generated a column at a time and streamed into the zip, so
+    memory is bounded by one chunk. A table longer than a worksheet continues
+    on further worksheets with the same header.
+    """
+    names = []
+    used = set()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, frames in sheets:
+            part, rows, header = None, 0, None
+            for frame in frames:
+                header = sheet_rows(pd.DataFrame([[str(col) for col in frame.columns]], dtype=object))
+                start = 0
+                while start < len(frame) or part is None:
+                    if part is None or rows == EXCEL_MAX_ROWS:
+                        if part is not None:
+                            part.write(b'</sheetData></worksheet>')
+                            part.close()
+                        names.append(excel_sheet_name(name, used))
+                        part = archive.open(f'xl/worksheets/sheet{len(names)}.xml', 'w', force_zip64=True)
+                        part.write(f'{XML_DECLARATION}<worksheet xmlns="{SPREADSHEET_NS}"><sheetData>'.encode('utf-8'))
+                        part.write(header.encode('utf-8'))
+                        rows = 0
+                    chunk = frame.iloc[start:start + EXCEL_MAX_ROWS - rows]
+                    part.write(sheet_rows(chunk).encode('utf-8'))
+                    rows += len(chunk)
+                    start += len(chunk)
+            if part is None:
+                # A table without any chunks still gets its worksheet
+                names.append(excel_sheet_name(name, used))
+                part = archive.open(f'xl/worksheets/sheet{len(names)}.xml', 'w')
+                part.write(f'{XML_DECLARATION}<worksheet xmlns="{SPREADSHEET_NS}"><sheetData>'.encode('utf-8'))
+            part.write(b'</sheetData></worksheet>')
+            part.close()
+        
+        sheet_ids = range(1, len(names) + 1)
+        archive.writestr('[Content_Types].xml', XML_DECLARATION + (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            f'<Override PartName="/xl/workbook.xml" ContentType="{XLSX_CONTENT_TYPE}.sheet.main+xml"/>'
+            f'<Override PartName="/xl/styles.xml" ContentType="{XLSX_CONTENT_TYPE}.styles+xml"/>'
+            + ''.join(f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+                      f'ContentType="{XLSX_CONTENT_TYPE}.worksheet+xml"/>' for i in sheet_ids)
+            + '</Types>'))
+        archive.writestr('_rels/.rels', XML_DECLARATION + (
+            f'<Relationships xmlns="{PACKAGE_RELATIONSHIP_NS}">'
+            f'<Relationship Id="rId1" Type="{RELATIONSHIP_NS}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'))
+        escaped_names = xml_escape(pd.Series(names, dtype=object))
+        archive.writestr('xl/workbook.xml', XML_DECLARATION + (
+            f'<workbook xmlns="{SPREADSHEET_NS}" xmlns:r="{RELATIONSHIP_NS}"><sheets>'
+            + ''.join(f'<sheet name="{sheet_name}" sheetId="{i}" r:id="rId{i}"/>'
+                      for i, sheet_name in zip(sheet_ids, escaped_names))
+            + '</sheets></workbook>'))
+        archive.writestr('xl/_rels/workbook.xml.rels', XML_DECLARATION + (
+            f'<Relationships xmlns="{PACKAGE_RELATIONSHIP_NS}">'
+            + ''.join(f'<Relationship Id="rId{i}" Type="{RELATIONSHIP_NS}/worksheet" '
+                      f'Target="worksheets/sheet{i}.xml"/>' for i in sheet_ids)
+            + f'<Relationship Id="rId{len(names) + 1}" Type="{RELATIONSHIP_NS}/styles" Target="styles.xml"/>'
+            '</Relationships>'))
+        archive.writestr('xl/styles.xml', XML_DECLARATION + XLSX_STYLES)
+
+def spooled_export(write):
+    """Run write(sink) into an anonymous temporary file and return a reader of that file
+
+    The reader goes to st.download_button as is, so the export is never copied
+    into a bytes object here. The file is removed when the reader is closed.
+    """
+    with tempfile.TemporaryFile() as sink:
+        write(sink)
+        sink.flush()
+        reader = open(os.dup(sink.fileno()), 'rb')
+    reader.seek(0)
+    return reader
+
+def export_dataset(aggregates, fmt, chunk_rows=EXPORT_CHUNK_ROWS):
+    """The (filtered) cleaned dataset as one CSV, Parquet or Excel file, written chunk by chunk"""
+    frames = aggregates.iter_chunks(chunk_rows)
+    if fmt == 'xlsx':
+        return spooled_export(lambda sink: write_excel([('Data', frames)], sink))
+    if fmt == 'parquet':
+        return spooled_export(lambda sink: write_parquet(frames, sink))
+    return spooled_export(lambda sink: write_csv(frames, sink))
+
+def export_tables(tables, fmt):
+    """Aggregate tables as a multi-sheet workbook, or a zip of one CSV / Parquet file per table"""
+    if fmt == 'xlsx':
+        return spooled_export(lambda sink: write_excel([(name, [table]) for name, table in tables.items()], sink))
+    
+    def write_zip(sink):
+        extension = EXPORT_FORMATS[fmt][1]
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, table in tables.items():
+                buffer = io.BytesIO()
+                (write_parquet if fmt == 'parquet' else write_csv)([table], buffer)
+                archive.writestr(name.replace(' ', '_').lower() + extension, buffer.getvalue())
+    return spooled_export(write_zip)
+
+def deferred_export(build, name, recorder, failures):
+    """Download data built when the button is clicked, after the run that offered it has ended
+
+    Timed as stage `name` of that run when it is instrumented. A deferred download
+    cannot report an error itself, so failures are logged and queued in `failures`
+    (a session-state list) for the next run to show.
+    """
+    def data():
+        try:
+            with recorder.stage(name) if recorder is not None else contextlib.nullcontext():
+                return build()
+        except Exception as e:
+            logger.exception("Export %s failed", name)
+            failures.append(str(e))
+            raise
+    return data
+
+def export_file_name(upload_name, part, fmt):
+    """Download name derived from the upload, e.g. sales_data.parquet or sales_aggregates.zip"""
+    stem = os.path.basename(upload_name).split('.')[0] or 'dashboard'
+    stem = ''.join(c if c.isalnum() or c in '-_' else '_' for c in stem)
+    # Aggregate tables come as a workbook or, for CSV and Parquet, a zip of one file per table
+    extension = '.zip' if part == 'aggregates' and fmt != 'xlsx' else EXPORT_FORMATS[fmt][1]
+    return f"{stem}_{part}{extension}"
+
+# ============================================
+# LANGUAGE SWITCHER IN SIDEBAR
+# ============================================
+def create_language_switcher():
+    """Create language switcher in sidebar"""
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("🌍 Language / Bahasa")
+    
+    col1, col2 = st.sidebar.columns(2)
+    
+    with col1:
+        if st.button("🇺🇸 English", use_container_width=True, 
+                    type="primary" if st.session_state.language == 'en' else "secondary"):
+            st.session_state.language = 'en'
+            st.rerun()
+    
+    with col2:
+        if st.button("🇮🇩 Indonesia", use_container_width=True,
+                    type="primary" if st.session_state.language == 'id' else "secondary"):
+            st.session_state.language = 'id'
+            st.rerun()
+    
+    st.sidebar.markdown("---")
+
+# ============================================
+# DASHBOARD PANELS
+# ============================================
+# Every panel is a fragment: changing one of its own controls reruns only that
+# panel. Its parameters are its declared inputs, taken from the last full run
+# (the dataset's aggregates and column types); a full run is only needed when
+# those change. On a full run the panels compute concurrently in Streamlit's
+# fragment thread pool.
+CHART_TABLES = ('Time Series', 'Top Categories', 'Distribution', 'Correlation', 'Category Share')
+
+@st.fragment(parallel=True)
+def kpi_panel(aggregates, numeric_cols, categorical_cols, approximate):
+    with stage('kpi'):
+        kpi1, kpi2, kpi3, kpi4 = st.columns(4)
+    
+        with kpi1:
+            st.metric(t('total_rows'), f"{aggregates.row_count:,}")
+    
+        with kpi2:
+            if numeric_cols:
+                total_sum = aggregates.numeric_total(numeric_cols)
+                st.metric(t('total_numeric'), f"{total_sum:,.0f}")
+            else:
+                st.metric(t('total_numeric'), t('na'))
+    
+        with kpi3:
+            if numeric_cols:
+                avg_val = aggregates.numeric_average(numeric_cols)
+                st.metric(t('average_value'), f"{avg_val:,.2f}")
+            else:
+                st.metric(t('average_value'), t('na'))
+    
+        with kpi4:
+            if categorical_cols:
+                unique_vals = aggregates.unique_count(categorical_cols[:3])
+                st.metric(t('unique_values'), f"{unique_vals:,}")
+                if approximate:
+                    st.caption(t('approx_unique', bound=aggregates.unique_count_error(categorical_cols[:3])))
+            else:
+                st.metric(t('unique_values'), t('na'))
+
+@st.fragment(parallel=True)
+def time_series_panel(aggregates, backend, datetime_cols, numeric_cols, chart_tables):
+    st.subheader(t('chart1_title'))
+    control1, control2, control3 = st.columns(3)
+    date_col = control1.selectbox(t('select_date'), [None] + datetime_cols)
+    ts_value_col = control2.selectbox(t('select_value'), [None] + numeric_cols)
+    granularity = control3.select_slider(
+        t('granularity'),
+        list(TIME_GRANULARITIES),
+        value='day',
+        format_func=lambda name: t(f'granularity_{name}')
+    )
+    
+    if date_col and ts_value_col:
+        with stage('chart1_aggregate'):
+            # Prepare time series data
+            ts_data = aggregates.time_series(date_col, ts_value_col, TIME_GRANULARITIES[granularity])
+            # Plot a shape-preserving subset; Max/Min/Avg below use the full-resolution series
+            plot_data = downsample_series(ts_data, date_col, ts_value_col)
+            # Summary stats (one pass over the period totals)
+            period_stats = SummaryStats.from_frame(ts_data, [ts_value_col])
+            chart_tables['Time Series'] = ts_data
+        
+        with stage('chart1_render'):
+            backend.time_series(plot_data, date_col, ts_value_col)
+        if len(plot_data) < len(ts_data):
+            st.caption(t('downsampled', shown=len(plot_data), total=len(ts_data)))
+        
+        col1a, col1b, col1c = st.columns(3)
+        with col1a:
+            st.metric("Max", f"{period_stats.max([ts_value_col]).iloc[0]:,.0f}")
+        with col1b:
+            st.metric("Min", f"{period_stats.min([ts_value_col]).iloc[0]:,.0f}")
+        with col1c:
+            st.metric("Avg", f"{period_stats.mean([ts_value_col]).iloc[0]:,.0f}")
+    else:
+        chart_tables.pop('Time Series', None)
+        st.info(t('ts_info'))
+
+@st.fragment(parallel=True)
+def top_categories_panel(aggregates, backend, categorical_cols, numeric_cols, approximate, chart_tables):
+    # The title shows the chosen N, so it is filled in after the controls
+    title = st.empty()
+    cat_col = st.selectbox(t('category_column'), [None] + categorical_cols)
+    cat_value = st.selectbox(t('value_for_category'), [None] + numeric_cols)
+    top_n = st.slider(t('top_n_items'), 3, 20, 10)
+    title.subheader(t('chart2_title', top_n=top_n))
+    
+    if cat_col and cat_value:
+        with stage('chart2_aggregate'):
+            # Prepare category data
+            category_totals = aggregates.category_totals(cat_col, cat_value)
+            cat_data = category_totals.head(top_n)
+            chart_tables['Top Categories'] = category_totals
+        
+        with stage('chart2_render'):
+            backend.top_categories(cat_data, cat_col, cat_value, top_n)
+        if approximate:
+            st.caption(t('approx_top', bound=aggregates.category_totals_error(cat_col, cat_value)))
+    else:
+        chart_tables.pop('Top Categories', None)
+        st.info(t('cat_info'))
+
+@st.fragment(parallel=True)
+def distribution_panel(aggregates, backend, numeric_cols, approximate, chart_tables):
+    st.subheader(t('chart3_title'))
+    dist_col = st.selectbox(t('column_for_histogram'), [None] + numeric_cols)
+    
+    if dist_col:
+        with stage('chart3_aggregate'):
+            counts, edges = aggregates.histogram(dist_col)
+            chart_tables['Distribution'] = pd.DataFrame(
+                {'Bin Start': edges[:-1], 'Bin End': edges[1:], 'Count': counts})
+        with stage('chart3_render'):
+            backend.histogram(counts, edges, dist_col)
+        if approximate:
+            (p5, p50, p95), rank = aggregates.quantiles(dist_col, [0.05, 0.5, 0.95])
+            st.caption(t('approx_hist', bound=aggregates.histogram_error(dist_col),
+                         p5=p5, p50=p50, p95=p95, rank=rank))
+    else:
+        chart_tables.pop('Distribution', None)
+        st.info(t('dist_info'))
+
+@st.fragment(parallel=True)
+def correlation_panel(aggregates, backend, numeric_cols, chart_tables):
+    st.subheader(t('chart4_title'))
+    if len(numeric_cols) > 1:
+        default_corr = numeric_cols[:min(6, len(numeric_cols))]
+        corr_cols = st.multiselect(
+            t('select_numeric_columns'), 
+            numeric_cols, 
+            default=default_corr
+        )
+    else:
+        corr_cols = []
+        st.warning(t('correlation_warning'))
+    
+    if len(corr_cols) >= 2:
+        with stage('chart4_aggregate'):
+            corr_matrix = aggregates.correlation(corr_cols)
+            chart_tables['Correlation'] = corr_matrix.rename_axis('Column').reset_index()
+        with stage('chart4_render'):
+            backend.correlation(corr_matrix)
+    else:
+        chart_tables.pop('Correlation', None)
+        st.info(t('corr_info'))
+
+@st.fragment(parallel=True)
+def category_share_panel(aggregates, backend, categorical_cols, approximate, chart_tables):
+    st.subheader(t('chart5_title'))
+    share_cat = st.selectbox(t('column_for_pie'), [None] + categorical_cols)
+    
+    if share_cat:
+        with stage('chart5_aggregate'):
+            share_counts = aggregates.value_counts(share_cat)
+            share_data = share_counts.reset_index()
+            share_data.columns = ['Category', 'Count']
+            chart_tables['Category Share'] = share_data
+            # In approximate mode value_counts keeps only the largest categories,
+            # so the total comes from the distinct count
+            n_categories = aggregates.unique_count([share_cat])
+        
+        # Limit to top categories for readability
+        if len(share_data) > 8:
+            share_data = share_data.head(8)
+            st.caption(f"Showing top 8 of {n_categories:,} categories")
+        
+        with stage('chart5_render'):
+            backend.category_share(share_data, share_cat)
+        if approximate:
+            st.caption(t('approx_share', bound=aggregates.value_counts_error(share_cat)))
+    else:
+        chart_tables.pop('Category Share', None)
+        st.info(t('share_info'))
+
+# ============================================
+# MAIN DASHBOARD UI
+# ============================================
+def main():
+    # Opt-in per-stage timings (DASHBOARD_INSTRUMENTATION=1 or ?debug=1)
+    recorder = start_instrumentation()
+    if PREWARM:
+        start_prewarm()
+    
+    # Title and subtitle
+    st.title(t('title'))
+    st.markdown(t('subtitle'))
+    
+    # Language switcher in sidebar
+    create_language_switcher()
+    
+    # File uploader; batch mode takes many files (and folders under DASHBOARD_BATCH_ROOT) as one dataset
+    upload_types = ["xlsx", "xls", "parquet", "arrow", "feather", "csv", "gz"]
+    batch_mode = st.toggle(t('batch_mode'), help=t('batch_mode_help'))
+    if batch_mode:
+        uploaded_file = None
+        uploaded_files = st.file_uploader(
+            t('batch_upload_label'),
+            type=upload_types,
+            accept_multiple_files=True,
+            help=t('batch_upload_help')
+        )
+        batch_pattern = ''
+        if BATCH_ROOT:
+            batch_pattern = st.text_input(t('batch_pattern'), help=t('batch_pattern_help', root=BATCH_ROOT)).strip()
+    else:
+        uploaded_file = st.file_uploader(
+            t('upload_label'), 
+            type=upload_types, 
+            help=t('upload_help')
+        )
+    
+    # Append mode merges each upload into a persisted dataset
+    append_mode = st.toggle(t('append_mode'), help=t('append_mode_help'))
+    if append_mode:
+        dataset_name = st.text_input(t('dataset_name'), value=APPEND_DATASET).strip() or APPEND_DATASET
+    
+    # Parse every file of a batch concurrently, reporting progress per file
+    batch = None
+    if batch_mode and (uploaded_files or batch_pattern):
+        files = collect_batch_files(uploaded_files, batch_pattern)
+        if not files:
+            st.warning(t('batch_no_files'))
+            st.stop()
+        status = st.status(t('batch_parsing', files=len(files)))
+        progress_bar = status.progress(0.0)
+        
+        def on_file(done, total, name, rows, error):
+            progress_bar.progress(done / total, text=t('batch_progress', done=done, total=total))
+            status.write(t('batch_file_ok', name=name, rows=rows) if error is None
+                         else t('batch_file_failed', name=name, error=error))
+        
+        with stage('batch_ingest'):
+            batch_hash, batch, batch_failures = load_batch(files, on_file)
+        batch_files = len(files) - len(batch_failures)
+        status.update(label=t('batch_done', files=batch_files, rows=0 if batch is None else len(batch[0])),
+                      state='error' if batch_failures else 'complete', expanded=False)
+        if batch_failures:
+            st.warning(t('batch_failures', count=len(batch_failures)) + '\n' + '\n'.join(
+                f"- {name}: {error}" for name, error in batch_failures))
+        if batch is None:
+            st.error(t('batch_all_failed'))
+            st.stop()
+    
+    if uploaded_file is not None or batch is not None:
+        loader = get_sheet_loader()
+        upload_name = uploaded_file.name if batch is None else t('batch_name', files=batch_files)
+        streaming = batch is None and is_streaming_file(upload_name)
+        with stage('upload_read'):
+            if batch is not None:
+                # The batch was read above; its hash covers every file
+                data = None
+                file_hash = batch_hash
+            elif streaming:
+                # CSV uploads are hashed in blocks and never read into one buffer
+                data = None
+                file_hash = hash_file(uploaded_file)
+            else:
+                data = uploaded_file.getvalue()
+                file_hash = hash_bytes(data)
+        
+        if batch is not None or streaming or is_columnar_file(upload_name):
+            # Batches, CSV and Parquet/Arrow uploads have no sheets
+            sheet = t('na')
+            sheet_key = None
+        else:
+            with stage('sheet_selection'):
+                # List sheets from workbook metadata (no cells are parsed here)
+                try:
+                    sheets = list_sheets(data, upload_name)
+                except Exception as e:
+                    st.error(t('error_reading', error=str(e)))
+                    st.stop()
+            
+                # Sheet selection
+                sheet_dims = dict(sheets)
+                sheet_names = list(sheet_dims)
+                if len(sheet_names) > 1:
+                    sheet = st.selectbox(
+                        t('select_sheet'), 
+                        sheet_names, 
+                        format_func=lambda name: format_sheet_label(name, sheet_dims[name]),
+                        help=t('select_sheet_help')
+                    )
+                else:
+                    sheet = sheet_names[0]
+                sheet_key = sheet
+        
+        # Append the upload's new rows (once), then analyze the whole dataset
+        dataset = None
+        if append_mode:
+            dataset = get_append_dataset(dataset_name)
+            source = f"{file_hash}:{sheet_key}"
+            if dataset.has_source(source):
+                st.info(t('append_already', dataset=dataset_name))
+            else:
+                try:
+                    # Read and conformed once, not on every rerun until Append is clicked
+                    new_rows, new_types, problems = load_conformed_upload(
+                        dataset, source,
+                        lambda: batch[0] if batch is not None
+                        else read_upload_frame(loader, uploaded_file, data, file_hash, sheet_key))
+                except Exception as e:
+                    st.error(t('error_reading', error=str(e)))
+                    st.stop()
+                if problems:
+                    st.error(t('append_schema_mismatch', problems='; '.join(problems)))
+                    st.stop()
+                key_cols = None
+                if dataset.manifest is None:
+                    # The dedupe key is fixed when the dataset is created
+                    key_cols = st.multiselect(
+                        t('dedupe_key'),
+                        list(new_rows.columns),
+                        default=[c for c in APPEND_KEY if c in new_rows.columns],
+                        help=t('dedupe_key_help')
+                    )
+                notice = st.empty()
+                notice.info(t('append_ready', rows=len(new_rows), dataset=dataset_name))
+                if st.button(t('append_button'), type='primary'):
+                    added, duplicates = dataset.append(new_rows, new_types, source, key_cols)
+                    notice.success(t('append_done', added=len(added), duplicates=duplicates))
+            if not dataset.exists:
+                st.info(t('append_pending'))
+                st.stop()
+        # Streamed CSVs are aggregated while reading; everything else is held as rows
+        streamed = streaming and dataset is None
+        
+        st.sidebar.header(t('sidebar_title'))
+        
+        # Query engine for in-memory datasets; streamed CSVs are already aggregated
+        engines = available_query_engines()
+        engine = 'pandas'
+        if not streamed and len(engines) > 1:
+            engine = st.sidebar.selectbox(
+                t('query_engine'),
+                engines,
+                index=engines.index(QUERY_ENGINE) if QUERY_ENGINE in engines else 0,
+                format_func=lambda name: t(f'engine_{name}'),
+                help=t('query_engine_help')
+            )
+        
+        # Load the cleaned dataset (memory cache, Arrow snapshot, or parse of the selected sheet only)
+        with stage('load'):
+            try:
+                if dataset is not None and engine == 'duckdb':
+                    aggregates = load_dataset_duckdb(dataset)
+                elif dataset is not None:
+                    # One cached frame per upload; statistics extend the previous version's
+                    df, col_types = load_dataset_frame(dataset)
+                    aggregates = SegmentedAggregates(df, col_types, load_dataset_stats(dataset))
+                elif batch is not None and engine != 'duckdb':
+                    df, col_types = batch
+                    aggregates = FrameAggregates(df, col_types)
+                elif streaming:
+                    progress_bar = st.progress(0.0)
+                    aggregates = stream_csv_aggregates(uploaded_file, file_hash, progress_bar.progress)
+                    progress_bar.empty()
+                elif engine == 'duckdb':
+                    # Queries the snapshot on disk; the DataFrame is never loaded once a snapshot exists.
+                    # A batch whose snapshot could not be written is queried from its frame
+                    aggregates = load_duckdb_aggregates(loader, data, file_hash, upload_name, sheet_key, batch)
+                else:
+                    df, col_types = load_prepared_dataset(loader, data, file_hash, upload_name, sheet_key)
+                    aggregates = FrameAggregates(df, col_types)
+                col_types = aggregates.col_types
+            except Exception as e:
+                st.error(t('error_reading', error=str(e)))
+                st.stop()
+        
+        # Warm the next sheet in the background unless it already has a snapshot
+        if sheet_key is not None and dataset is None and PREFETCH_NEXT_SHEET:
+            next_index = sheet_names.index(sheet) + 1
+            if next_index < len(sheet_names):
+                next_sheet = sheet_names[next_index]
+                if not os.path.exists(snapshot_path(file_hash, next_sheet)):
+                    loader.prefetch(data, file_hash, next_sheet)
+        
+        # Show file info
+        st.success(t('success_upload', filename=upload_name, sheet=sheet))
+        parse = loader.parse_stats.get((file_hash, sheet_key))
+        if parse is not None:
+            peak = parse['peak_rss_delta_bytes']
+            st.caption(t('parse_info', engine=t(f"excel_engine_{parse['engine']}"), rows=parse['rows'],
+                         seconds=parse['seconds'], rate=parse['rows'] / max(parse['seconds'], 1e-9),
+                         peak=format_bytes(peak) if peak is not None else t('na')))
+        if dataset is not None:
+            st.caption(t('dataset_info', dataset=dataset_name, rows=dataset.rows,
+                         uploads=len(dataset.manifest['sources'])))
+        
+        # Data preview (Streamlit cannot serialize categoricals whose categories mix types)
+        with st.expander(t('preview')):
+            st.dataframe(arrow_safe_frame(aggregates.preview(100)), use_container_width=True)
+        
+        numeric_cols = col_types['numeric']
+        datetime_cols = col_types['datetime']
+        categorical_cols = col_types['categorical']
+        
+        # ============================================
+        # SIDEBAR CONTROLS
+        # ============================================
+        memory = col_types.get('memory')
+        memory_info = (
+            f"- {t('memory')}: {format_bytes(memory['before'])} → {format_bytes(memory['after'])}"
+            if memory else ""
+        )
+        st.sidebar.info(f"""
+        {t('data_info')}
+        - {t('rows')}: {aggregates.row_count:,}
+        - {t('columns')}: {len(aggregates.columns):,}
+        - {t('numeric')}: {len(numeric_cols)}
+        - {t('categorical')}: {len(categorical_cols)}
+        - {t('date')}: {len(datetime_cols)}
+        {memory_info}
+        """)
+        
+        fingerprint = dataset.fingerprint if dataset is not None else (file_hash, sheet_key)
+        
+        # Row filters: bitmap indexes answer the pandas engine, a WHERE clause the DuckDB engine
+        row_filter = RowFilter()
+        if not streamed:
+            if engine == 'duckdb':
+                filter_source = aggregates
+            elif dataset is not None:
+                filter_source = load_dataset_filter_index(dataset)
+            else:
+                filter_source = load_filter_index(df, col_types, fingerprint)
+            with st.sidebar.expander(t('filters')):
+                filter_values = {}
+                for col in categorical_cols:
+                    options = filter_source.filter_values(col)
+                    if options is not None:
+                        filter_values[col] = st.multiselect(col, options, placeholder=t('filter_all'))
+                filter_dates = {}
+                for col in datetime_cols:
+                    low, high = filter_source.date_bounds(col)
+                    if low is None:
+                        continue
+                    picked = st.date_input(col, value=(low.date(), high.date()),
+                                           min_value=low.date(), max_value=high.date())
+                    # Applied once both ends of the range are picked
+                    if len(picked) == 2 and tuple(picked) != (low.date(), high.date()):
+                        filter_dates[col] = (pd.Timestamp(picked[0]), pd.Timestamp(picked[1]) + pd.Timedelta(days=1))
+                row_filter = RowFilter(filter_values, filter_dates)
+        total_rows = aggregates.row_count
+        if row_filter and engine == 'duckdb':
+            aggregates = aggregates.filtered(row_filter)
+        
+        # Aggregation strategy for the pandas engine: process pool or rollup cube.
+        # Filtered views are answered from the cube's cells and read the selected
+        # rows only for what the cells cannot answer
+        if not streamed and engine == 'pandas':
+            use_parallel = st.sidebar.toggle(
+                t('parallel_aggregation', workers=PARALLEL_WORKERS),
+                value=PARALLEL_AGGREGATION == '1' or (
+                    PARALLEL_AGGREGATION == 'auto' and aggregates.row_count >= PARALLEL_MIN_ROWS
+                ),
+                help=t('parallel_aggregation_help')
+            )
+            cube = None
+            if ROLLUP_CUBE and (row_filter or not use_parallel):
+                # Append datasets merge the newest segment into the previous cube
+                cube = (load_dataset_cube(dataset) if dataset is not None
+                        else load_rollup_cube(df, col_types, fingerprint))
+                st.sidebar.caption(t('cube_info', seconds=cube.build_seconds, size=format_bytes(cube.nbytes())))
+            if row_filter:
+                aggregates = FilteredAggregates(df, col_types, filter_source, row_filter, cube)
+            elif use_parallel:
+                shareds = (load_dataset_shared(dataset) if dataset is not None
+                           else [load_shared_dataset(df, col_types, fingerprint)])
+                aggregates = ParallelAggregates(shareds, get_process_pool(), aggregates)
+            elif cube is not None:
+                aggregates = CubeAggregates(cube, aggregates)
+        
+        if row_filter:
+            fingerprint = (*fingerprint, 'filter', row_filter.key())
+            st.sidebar.caption(t('filter_info', rows=aggregates.row_count, total=total_rows))
+            if not aggregates.row_count:
+                st.warning(t('filter_empty'))
+                st.stop()
+        
+        # Approximate mode: fixed-size sketches, built once per dataset, answer
+        # distinct counts, Top-N, shares and histograms with an error bound
+        approximate = False
+        if not streamed:
+            approximate = st.sidebar.toggle(t('approximate_mode'), value=APPROXIMATE_MODE,
+                                            help=t('approximate_mode_help'))
+        if approximate:
+            bundle = (load_dataset_sketches(dataset) if dataset is not None and not row_filter
+                      else load_sketches(aggregates, col_types, fingerprint))
+            aggregates = SketchAggregates(bundle, aggregates)
+            st.sidebar.caption(t('sketch_info', seconds=bundle.build_seconds, size=format_bytes(bundle.nbytes())))
+            fingerprint = (*fingerprint, 'approx')
+        
+        # Every KPI and chart aggregate is memoized per dataset; widget and
+        # language changes reuse them
+        aggregates = CachedAggregates(aggregates, fingerprint, get_aggregation_cache())
+        
+        # Chart renderer
+        backend_name = st.sidebar.radio(
+            t('chart_backend'),
+            CHART_BACKENDS,
+            index=CHART_BACKENDS.index(CHART_BACKEND) if CHART_BACKEND in CHART_BACKENDS else 0,
+            format_func=lambda name: t(f'backend_{name}'),
+            horizontal=True
+        )
+        backend = get_chart_backend(backend_name)
+        
+        # Full-resolution aggregate of every configured chart, for the export;
+        # panels update their entry when they rerun
+        chart_tables = {}
+        
+        # ============================================
+        # KPI SECTION
+        # ============================================
+        st.markdown(f"## {t('kpi_title')}")
+        kpi_panel(aggregates, numeric_cols, categorical_cols, approximate)
         
         st.markdown("---")
         
         # ============================================
         # CHARTS SECTION
         # ============================================
+        # Each panel owns its controls and reruns alone when they change
         # Row 1: Time Series + Top Categories
         col1, col2 = st.columns([2, 1])
         
         with col1:
-            st.subheader(t('chart1_title'))
-            if date_col and ts_value_col:
-                # Prepare time series data
-                ts_data = df[[date_col, ts_value_col]].copy()
-                ts_data = ts_data.dropna()
-                ts_data[date_col] = pd.to_datetime(ts_data[date_col])
-                ts_data = ts_data.groupby(ts_data[date_col].dt.date)[ts_value_col].sum().reset_index()
-                
-                # Create plot
-                fig, ax = plt.subplots(figsize=(12, 6))
-                ax.plot(ts_data[date_col], ts_data[ts_value_col], 
-                       marker='o', linewidth=2, markersize=6, color='#2E86AB')
-                ax.set_title(f"Trend {ts_value_col} over Time", fontsize=16, fontweight='bold')
-                ax.set_xlabel(date_col, fontsize=12)
-                ax.set_ylabel(ts_value_col, fontsize=12)
-                ax.grid(True, alpha=0.3)
-                ax.fill_between(ts_data[date_col], ts_data[ts_value_col], alpha=0.2, color='#2E86AB')
-                plt.xticks(rotation=45)
-                plt.tight_layout()
-                st.pyplot(fig)
-                
-                # Show summary stats
-                col1a, col1b, col1c = st.columns(3)
-                with col1a:
-                    st.metric("Max", f"{ts_data[ts_value_col].max():,.0f}")
-                with col1b:
-                    st.metric("Min", f"{ts_data[ts_value_col].min():,.0f}")
-                with col1c:
-                    st.metric("Avg", f"{ts_data[ts_value_col].mean():,.0f}")
-            else:
-                st.info(t('ts_info'))
+            time_series_panel(aggregates, backend, datetime_cols, numeric_cols, chart_tables)
         
         with col2:
-            st.subheader(t('chart2_title', top_n=top_n))
-            if cat_col and cat_value:
-                # Prepare category data
-                cat_data = df.groupby(cat_col)[cat_value].sum().reset_index()
-                cat_data = cat_data.sort_values(cat_value, ascending=False).head(top_n)
-                
-                # Create horizontal bar chart
-                fig, ax = plt.subplots(figsize=(10, 6))
-                colors = plt.cm.Set3(np.linspace(0, 1, len(cat_data)))
-                bars = ax.barh(range(len(cat_data)), cat_data[cat_value], color=colors)
-                ax.set_yticks(range(len(cat_data)))
-                ax.set_yticklabels(cat_data[cat_col])
-                ax.set_xlabel(cat_value)
-                ax.set_title(f"Top {top_n} {cat_col} by {cat_value}", fontsize=14)
-                ax.invert_yaxis()
-                
-                # Add value labels
-                for i, (bar, val) in enumerate(zip(bars, cat_data[cat_value])):
-                    ax.text(val + val*0.01, bar.get_y() + bar.get_height()/2, 
-                           f'{val:,.0f}', va='center', fontsize=10)
-                
-                plt.tight_layout()
-                st.pyplot(fig)
-            else:
-                st.info(t('cat_info'))
+            top_categories_panel(aggregates, backend, categorical_cols, numeric_cols, approximate, chart_tables)
         
         st.markdown("---")
         
@@ -485,94 +4463,13 @@ def main():
         col3, col4, col5 = st.columns(3)
         
         with col3:
-            st.subheader(t('chart3_title'))
-            if dist_col:
-                fig, ax = plt.subplots(figsize=(10, 6))
-                ax.hist(df[dist_col].dropna(), bins=30, edgecolor='black', 
-                       alpha=0.7, color='#A23B72')
-                ax.set_title(f"Distribution of {dist_col}", fontsize=14)
-                ax.set_xlabel(dist_col)
-                ax.set_ylabel("Frequency")
-                ax.grid(True, alpha=0.3)
-                st.pyplot(fig)
-            else:
-                st.info(t('dist_info'))
+            distribution_panel(aggregates, backend, numeric_cols, approximate, chart_tables)
         
         with col4:
-            st.subheader(t('chart4_title'))
-            if len(corr_cols) >= 2:
-                corr_matrix = df[corr_cols].corr()
-                
-                fig, ax = plt.subplots(figsize=(10, 8))
-                im = ax.imshow(corr_matrix, cmap='coolwarm', aspect='auto', vmin=-1, vmax=1)
-                
-                # Add labels
-                ax.set_xticks(range(len(corr_cols)))
-                ax.set_yticks(range(len(corr_cols)))
-                ax.set_xticklabels(corr_cols, rotation=45, ha='right')
-                ax.set_yticklabels(corr_cols)
-                
-                # Add colorbar
-                cbar = plt.colorbar(im, ax=ax)
-                cbar.set_label('Correlation Coefficient')
-                
-                # Add correlation values
-                for i in range(len(corr_cols)):
-                    for j in range(len(corr_cols)):
-                        text_color = 'white' if abs(corr_matrix.iloc[i, j]) > 0.5 else 'black'
-                        ax.text(j, i, f'{corr_matrix.iloc[i, j]:.2f}',
-                               ha='center', va='center', color=text_color,
-                               fontsize=9, fontweight='bold')
-                
-                ax.set_title("Correlation Heatmap", fontsize=14, fontweight='bold')
-                plt.tight_layout()
-                st.pyplot(fig)
-            else:
-                st.info(t('corr_info'))
+            correlation_panel(aggregates, backend, numeric_cols, chart_tables)
         
         with col5:
-            st.subheader(t('chart5_title'))
-            if share_cat:
-                share_data = df[share_cat].value_counts().reset_index()
-                share_data.columns = ['Category', 'Count']
-                
-                # Limit to top categories for readability
-                if len(share_data) > 8:
-                    share_data = share_data.head(8)
-                    st.caption(f"Showing top 8 of {len(df[share_cat].value_counts())} categories")
-                
-                fig, ax = plt.subplots(figsize=(10, 6))
-                
-                if len(share_data) <= 8:
-                    # Pie chart for few categories
-                    colors = plt.cm.Pastel1(range(len(share_data)))
-                    wedges, texts, autotexts = ax.pie(
-                        share_data['Count'], 
-                        labels=share_data['Category'],
-                        autopct='%1.1f%%',
-                        colors=colors,
-                        startangle=90
-                    )
-                    ax.set_title(f"Share of {share_cat}", fontsize=14)
-                    
-                    # Improve readability
-                    for autotext in autotexts:
-                        autotext.set_color('black')
-                        autotext.set_fontweight('bold')
-                else:
-                    # Bar chart for many categories
-                    y_pos = range(len(share_data))
-                    ax.barh(y_pos, share_data['Count'])
-                    ax.set_yticks(y_pos)
-                    ax.set_yticklabels(share_data['Category'])
-                    ax.set_xlabel('Count')
-                    ax.set_title(f"Distribution of {share_cat}", fontsize=14)
-                    ax.invert_yaxis()
-                
-                plt.tight_layout()
-                st.pyplot(fig)
-            else:
-                st.info(t('share_info'))
+            category_share_panel(aggregates, backend, categorical_cols, approximate, chart_tables)
         
         # ============================================
         # DATA EXPORT SECTION
@@ -580,34 +4477,66 @@ def main():
         st.markdown("---")
         st.subheader(t('export_title'))
         
-        export_col1, export_col2 = st.columns(2)
+        export_format = st.radio(
+            t('export_format'),
+            list(EXPORT_FORMATS),
+            format_func=lambda fmt: t(f'export_{fmt}'),
+            horizontal=True
+        )
+        
+        # Files are written when a button is clicked (deferred data), so there is
+        # no extra rerun and unused formats are never built
+        export_failures = st.session_state.setdefault('export_failures', [])
+        while export_failures:
+            st.error(t('export_failed', error=export_failures.pop(0)))
+        export_col1, export_col2, export_col3 = st.columns(3)
         
         with export_col1:
-            if st.button(t('download_report'), use_container_width=True):
-                # Create summary dataframe
-                summary_data = {
-                    'Metric': ['Total Rows', 'Total Columns', 'Numeric Columns', 
-                              'Categorical Columns', 'Date Columns', 'File Name', 'Sheet Name'],
-                    'Value': [len(df), len(df.columns), len(numeric_cols), 
-                             len(categorical_cols), len(datetime_cols), 
-                             uploaded_file.name, sheet]
-                }
-                summary_df = pd.DataFrame(summary_data)
-                
-                # Convert to CSV
-                csv = summary_df.to_csv(index=False)
+            if hasattr(aggregates, 'iter_chunks'):
                 st.download_button(
-                    label=t('download_csv'),
-                    data=csv,
-                    file_name="dashboard_summary.csv",
-                    mime="text/csv",
+                    label=t('download_dataset', rows=aggregates.row_count),
+                    data=deferred_export(lambda: export_dataset(aggregates, export_format),
+                                         'export_dataset', recorder, export_failures),
+                    file_name=export_file_name(upload_name, 'data', export_format),
+                    mime=EXPORT_FORMATS[export_format][0],
+                    help=t('download_dataset_help'),
+                    on_click='ignore',
                     use_container_width=True
                 )
+            else:
+                st.caption(t('export_streamed'))
         
         with export_col2:
+            summary_df = pd.DataFrame({
+                'Metric': ['Total Rows', 'Total Columns', 'Numeric Columns', 
+                          'Categorical Columns', 'Date Columns', 'File Name', 'Sheet Name'],
+                'Value': [str(value) for value in (
+                    aggregates.row_count, len(aggregates.columns), len(numeric_cols),
+                    len(categorical_cols), len(datetime_cols), upload_name, sheet)]
+            })
+            st.download_button(
+                label=t('download_aggregates'),
+                # Read the chart tables at click time: panels may have rerun since
+                data=deferred_export(lambda: export_tables({'Summary': summary_df, **{
+                    name: chart_tables[name] for name in CHART_TABLES if name in chart_tables
+                }}, export_format), 'export_aggregates', recorder, export_failures),
+                file_name=export_file_name(upload_name, 'aggregates', export_format),
+                mime=EXPORT_FORMATS[export_format][0] if export_format == 'xlsx' else 'application/zip',
+                help=t('download_aggregates_help'),
+                on_click='ignore',
+                use_container_width=True
+            )
+        
+        with export_col3:
             if st.button(t('refresh'), use_container_width=True):
                 st.rerun()
         
+        # Cache hit/miss counters and stage timings; panels still computing in the
+        # fragment thread pool show up on the next run
+        render_cache_stats()
+        if recorder is not None:
+            render_debug_panel(recorder)
+        
         # ============================================
         # FOOTER
         # ============================================
@@ -635,8 +4564,314 @@ def main():
             })
             st.dataframe(example_data)
 
+# ============================================
+# HEADLESS REPORTS
+# ============================================
+# `python supermarket_multilingual.py report <directory>` runs the dashboard's
+# load, type detection, KPI and chart pipeline over every file in a directory,
+# without Streamlit, and writes a static report per file, language and format.
+REPORT_FORMATS = ('html', 'pdf')
+# Bump when the report layout changes so existing reports are rebuilt
+REPORT_LAYOUT_VERSION = 1
+# Content hash and settings each report was built from, kept next to the reports
+REPORT_MANIFEST = '.report_manifest.json'
+REPORT_TOP_N = 10
+REPORT_SHARE_CATEGORIES = 8
+REPORT_DPI = 110
+REPORT_CSS = (
+    "body{font-family:sans-serif;max-width:1100px;margin:2em auto;padding:0 1em;color:#222}"
+    ".kpis{display:flex;gap:1em}.kpi{flex:1;border:1px solid #ddd;border-radius:6px;padding:.8em}"
+    ".kpi b{display:block;font-size:1.5em;margin-top:.3em}img{max-width:100%}.note{color:#666}"
+)
+# Emoji have no glyph in Matplotlib's default font, so PDF pages drop them
+EMOJI_PATTERN = re.compile('[\u2600-\u27bf\ufe0f\U0001f000-\U0001faff]')
+
+def report_text(lang, key, **kwargs):
+    """Translation for a report: the language is an argument, not session state"""
+    text = get_translation(key, lang)
+    if kwargs:
+        return text.format(**kwargs)
+    return text
+
+def pdf_text(text):
+    return EMOJI_PATTERN.sub('', text).strip()
+
+def report_columns(col_types, date_col=None, value_col=None, cat_col=None):
+    """Chart columns of one file: the requested ones where the file has them, else the first
+    date, the last numeric (Total in the example structure) and the first categorical column"""
+    def pick(requested, candidates, default):
+        return requested if requested in candidates else default
+    dates, numbers, categories = col_types['datetime'], col_types['numeric'], col_types['categorical']
+    return (pick(date_col, dates, dates[0] if dates else None),
+            pick(value_col, numbers, numbers[-1] if numbers else None),
+            pick(cat_col, categories, categories[0] if categories else None))
+
+def report_content(aggregates, col_types, date_col, value_col, cat_col, top_n=REPORT_TOP_N):
+    """KPIs and chart inputs of one dataset, computed once for every language and format
+
+    Each chart is a dict of its title key and arguments, `draw` (the draw
+    function followed by its inputs, or None when the file lacks the columns)
+    and an optional note.
+    """
+    numeric_cols = col_types['numeric']
+    categorical_cols = col_types['categorical']
+    kpis = [
+        ('total_rows', f"{aggregates.row_count:,}"),
+        ('total_numeric', f"{aggregates.numeric_total(numeric_cols):,.0f}" if numeric_cols else None),
+        ('average_value', f"{aggregates.numeric_average(numeric_cols):,.2f}" if numeric_cols else None),
+        ('unique_values', f"{aggregates.unique_count(categorical_cols[:3]):,}" if categorical_cols else None),
+    ]
+    charts = []
+    
+    chart = {'title': 'chart1_title', 'title_args': {}, 'draw': None, 'note': None}
+    if date_col and value_col:
+        ts_data = aggregates.time_series(date_col, value_col, TIME_GRANULARITIES['day'])
+        period_stats = SummaryStats.from_frame(ts_data, [value_col])
+        chart['draw'] = (draw_time_series, downsample_series(ts_data, date_col, value_col), date_col, value_col)
+        chart['note'] = ' · '.join(f"{label} {stat([value_col]).iloc[0]:,.0f}" for label, stat in (
+            ('Max', period_stats.max), ('Min', period_stats.min), ('Avg', period_stats.mean)))
+    charts.append(chart)
+    
+    chart = {'title': 'chart2_title', 'title_args': {'top_n': top_n}, 'draw': None, 'note': None}
+    if cat_col and value_col:
+        cat_data = aggregates.category_totals(cat_col, value_col).head(top_n)
+        chart['draw'] = (draw_top_categories, cat_data, cat_col, value_col, top_n)
+    charts.append(chart)
+    
+    chart = {'title': 'chart3_title', 'title_args': {}, 'draw': None, 'note': None}
+    if value_col:
+        counts, edges = aggregates.histogram(value_col)
+        chart['draw'] = (draw_histogram, counts, edges, value_col)
+    charts.append(chart)
+    
+    chart = {'title': 'chart4_title', 'title_args': {}, 'draw': None, 'note': None}
+    if len(numeric_cols) > 1:
+        chart['draw'] = (draw_correlation, aggregates.correlation(numeric_cols[:6]))
+    charts.append(chart)
+    
+    chart = {'title': 'chart5_title', 'title_args': {}, 'draw': None, 'note': None}
+    if cat_col:
+        share_data = aggregates.value_counts(cat_col).reset_index()
+        share_data.columns = ['Category', 'Count']
+        if len(share_data) > REPORT_SHARE_CATEGORIES:
+            chart['note'] = f"Showing top {REPORT_SHARE_CATEGORIES} of {len(share_data):,} categories"
+            share_data = share_data.head(REPORT_SHARE_CATEGORIES)
+        chart['draw'] = (draw_category_share, share_data, cat_col)
+    charts.append(chart)
+    return {'kpis': kpis, 'charts': charts}
+
+def chart_figure(chart):
+    """Figure of a report chart, drawn and laid out once for every language and format"""
+    if 'figure' not in chart:
+        draw, *inputs = chart['draw']
+        fig = draw(*inputs)
+        # Room for a PDF page's title and note (PNGs are cropped to their content)
+        fig.tight_layout(rect=(0, 0.04, 1, 0.94))
+        chart['figure'] = fig
+    return chart['figure']
+
+def chart_png(chart):
+    """PNG of a report chart, rendered once and shared by every language"""
+    if 'png' not in chart:
+        chart['png'] = figure_to_png(chart_figure(chart), dpi=REPORT_DPI)
+    return chart['png']
+
+def write_html_report(content, lang, sink):
+    """Self-contained HTML report (charts inlined as PNG), fit for e-mail or a file share"""
+    esc = html.escape
+    title = report_text(lang, 'title')
+    source = report_text(lang, 'report_source', filename=content['filename'], rows=content['rows'],
+                         timestamp=content['generated'])
+    lines = [
+        f'<!DOCTYPE html><html lang="{lang}"><head><meta charset="utf-8">',
+        f'<title>{esc(title)} · {esc(content["filename"])}</title><style>{REPORT_CSS}</style></head><body>',
+        f'<h1>{esc(title)}</h1><p class="note">{esc(source)}</p>',
+        f'<h2>{esc(report_text(lang, "kpi_title"))}</h2><div class="kpis">',
+    ]
+    for key, value in content['kpis']:
+        lines.append(f'<div class="kpi">{esc(report_text(lang, key))}'
+                     f'<b>{esc(value if value is not None else report_text(lang, "na"))}</b></div>')
+    lines.append('</div>')
+    for chart in content['charts']:
+        lines.append(f"<h2>{esc(report_text(lang, chart['title'], **chart['title_args']))}</h2>")
+        if chart['draw'] is None:
+            lines.append(f'<p class="note">{esc(report_text(lang, "report_chart_skipped"))}</p>')
+            continue
+        png = base64.b64encode(chart_png(chart)).decode('ascii')
+        lines.append(f'<img alt="" src="data:image/png;base64,{png}">')
+        if chart['note']:
+            lines.append(f'<p class="note">{esc(chart["note"])}</p>')
+    lines.append('</body></html>')
+    sink.write('\n'.join(lines).encode('utf-8'))
+
+def write_pdf_report(content, lang, sink):
+    """PDF report: a KPI cover page, then one page per chart drawn as vectors"""
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+    title = pdf_text(report_text(lang, 'title'))
+    with PdfPages(sink, metadata={'Title': f"{title} - {content['filename']}"}) as pdf:
+        # A4 landscape
+        cover = Figure(figsize=(11.69, 8.27))
+        cover.text(0.06, 0.9, title, fontsize=24, fontweight='bold')
+        cover.text(0.06, 0.85, report_text(lang, 'report_source', filename=content['filename'],
+                                           rows=content['rows'], timestamp=content['generated']),
+                   fontsize=11, color='#666666')
+        cover.text(0.06, 0.74, pdf_text(report_text(lang, 'kpi_title')), fontsize=16, fontweight='bold')
+        for i, (key, value) in enumerate(content['kpis']):
+            y = 0.66 - i * 0.08
+            cover.text(0.08, y, report_text(lang, key), fontsize=13)
+            cover.text(0.5, y, value if value is not None else report_text(lang, 'na'),
+                       fontsize=13, fontweight='bold')
+        pdf.savefig(cover)
+        for chart in content['charts']:
+            chart_title = pdf_text(report_text(lang, chart['title'], **chart['title_args']))
+            if chart['draw'] is None:
+                fig = Figure(figsize=(11.69, 8.27))
+                fig.text(0.06, 0.5, report_text(lang, 'report_chart_skipped'), fontsize=13, color='#666666')
+                extras = []
+            else:
+                fig = chart_figure(chart)
+                extras = []
+                if chart['note']:
+                    extras.append(fig.text(0.01, 0.01, chart['note'], fontsize=10, color='#666666'))
+            # The page title is the only language-specific part of a shared chart figure
+            extras.append(fig.text(0.5, 0.98, chart_title, ha='center', va='top', fontsize=16, fontweight='bold'))
+            pdf.savefig(fig)
+            for artist in extras:
+                artist.remove()
+
+REPORT_WRITERS = {'html': write_html_report, 'pdf': write_pdf_report}
+
+def build_report(path, output_dir, settings):
+    """Load, type and chart one file (a workbook's first sheet), then write its reports; runs in a report worker"""
+    start = time.perf_counter()
+    name = os.path.basename(path)
+    raw = batch_ingestion.parse_file(name, path=path, excel_engine=EXCEL_ENGINE,
+                                     stream_min_bytes=int(EXCEL_STREAM_MIN_MB * 1024 * 1024))
+    df, col_types = prepare_dataframe(raw)
+    df = optimize_memory(df, col_types)
+    # KPIs and correlations are read off the summary statistics the cache layer keeps
+    aggregates = CachedAggregates(FrameAggregates(df, col_types), (name,),
+                                  MemoryLRUCache(AGGREGATION_CACHE_MB * 1024 * 1024))
+    columns = report_columns(col_types, settings['date_column'], settings['value_column'],
+                             settings['category_column'])
+    content = report_content(aggregates, col_types, *columns, settings['top_n'])
+    content.update(filename=name, rows=aggregates.row_count,
+                   generated=pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"))
+    outputs = []
+    for lang in settings['languages']:
+        for fmt in settings['formats']:
+            output = f"{name}.{lang}.{fmt}"
+            out_path = os.path.join(output_dir, output)
+            # Readers (and the next run) never see a half-written report
+            tmp_path = f"{out_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                REPORT_WRITERS[fmt](content, lang, f)
+            os.replace(tmp_path, out_path)
+            outputs.append(output)
+    return {'rows': aggregates.row_count, 'outputs': outputs, 'seconds': time.perf_counter() - start}
+
+def read_report_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, REPORT_MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_report_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, REPORT_MANIFEST)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, path)
+
+def run_reports(input_dir, output_dir, settings, jobs, force=False):
+    """Report every file of a directory whose content or report settings changed since the last run
+
+    Returns the number of reported files, the number skipped as unchanged and
+    the (name, error) of each failure. Failed files keep their previous
+    manifest entry, so the next run retries them.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = read_report_manifest(output_dir)
+    todo, skipped = [], 0
+    for name in sorted(os.listdir(input_dir)):
+        path = os.path.join(input_dir, name)
+        if not (os.path.isfile(path) and name.lower().endswith(BATCH_EXTENSIONS)):
+            continue
+        with open(path, 'rb') as f:
+            file_hash = hash_file(f)
+        entry = manifest.get(name)
+        if (not force and entry is not None and entry['hash'] == file_hash and entry['settings'] == settings
+                and all(os.path.exists(os.path.join(output_dir, output)) for output in entry['outputs'])):
+            print(f"{name}: unchanged, skipped", file=sys.stderr)
+            skipped += 1
+            continue
+        todo.append((name, path, file_hash))
+    
+    failures = []
+    # A single file is built in this process: no worker start-up to pay for
+    executor = (ProcessPoolExecutor(max_workers=min(jobs, len(todo)), mp_context=multiprocessing.get_context('spawn'))
+                if jobs > 1 and len(todo) > 1 else ThreadPoolExecutor(max_workers=1))
+    with executor:
+        futures = {executor.submit(build_report, path, output_dir, settings): (name, file_hash)
+                   for name, path, file_hash in todo}
+        for future in as_completed(futures):
+            name, file_hash = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failures.append((name, str(e)))
+                print(f"{name}: failed: {e}", file=sys.stderr)
+                continue
+            manifest[name] = {'hash': file_hash, 'settings': settings, 'outputs': result['outputs'],
+                              'rows': result['rows'], 'generated_at': pd.Timestamp.now(tz='UTC').isoformat()}
+            # Saved after every file so an interrupted run keeps what it finished
+            write_report_manifest(output_dir, manifest)
+            print(f"{name}: {result['rows']:,} rows in {result['seconds']:.1f}s -> {', '.join(result['outputs'])}",
+                  file=sys.stderr)
+    return len(todo) - len(failures), skipped, failures
+
+def report_main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='supermarket_multilingual.py report',
+        description="Render the dashboard's KPIs and five charts for every workbook in a directory as static reports. "
+                    "A workbook is reported from its first sheet only, as in batch uploads."
+    )
+    parser.add_argument('input_dir', help="directory of workbooks (.xlsx/.xls, first sheet only; "
+                                          "CSV and Parquet/Arrow files too)")
+    parser.add_argument('--output-dir', help="where reports and the manifest go (default: INPUT_DIR/reports)")
+    parser.add_argument('--lang', nargs='+', choices=list(translations), default=['en'], help="report languages")
+    parser.add_argument('--format', nargs='+', choices=REPORT_FORMATS, default=['html'], help="report formats")
+    parser.add_argument('--jobs', type=int, default=PARALLEL_WORKERS,
+                        help="files processed at once, each in its own worker process (default: DASHBOARD_PARALLEL_WORKERS)")
+    parser.add_argument('--date-column', help="date column of the time series (default: the first date column)")
+    parser.add_argument('--value-column', help="value column of the charts (default: the last numeric column)")
+    parser.add_argument('--category-column', help="category column of the charts (default: the first categorical column)")
+    parser.add_argument('--top-n', type=int, default=REPORT_TOP_N, help="categories in the Top-N chart")
+    parser.add_argument('--force', action='store_true', help="rebuild reports of unchanged files too")
+    args = parser.parse_args(argv)
+    
+    settings = {
+        'layout': REPORT_LAYOUT_VERSION,
+        'languages': args.lang,
+        'formats': args.format,
+        'date_column': args.date_column,
+        'value_column': args.value_column,
+        'category_column': args.category_column,
+        'top_n': args.top_n,
+    }
+    output_dir = args.output_dir or os.path.join(args.input_dir, 'reports')
+    built, skipped, failures = run_reports(args.input_dir, output_dir, settings, args.jobs, args.force)
+    print(f"{built} reported, {skipped} unchanged, {len(failures)} failed -> {output_dir}", file=sys.stderr)
+    return 1 if failures else 0
+
 # ============================================
 # RUN THE APP
 # ============================================
 if __name__ == "__main__":
+    if HEADLESS_COMMAND == 'report':
+        sys.exit(report_main(sys.argv[2:]))
+    if HEADLESS_COMMAND == 'warmup':
+        sys.exit(warmup_main(sys.argv[2:]))
     main()
\ No newline at end of file
@@ -0,0 +1,19 @@
+# conftest.py - Make the root modules importable and keep the dashboard's files out of the checkout
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import streamlit as st
+
+# Bare-mode warnings (no ScriptRunContext) would bury the test output
+st.logger.set_log_level('error')
+
+@pytest.fixture(autouse=True)
+def work_dir(tmp_path, monkeypatch):
+    """Run every test in its own directory: snapshots and datasets go under ./.dashboard_cache"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
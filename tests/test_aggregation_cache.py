@@ -0,0 +1,86 @@
+# test_aggregation_cache.py - Memoized aggregates: keyed by dataset and options, computed once per key
+
+import io
+
+import numpy as np
+import pandas as pd
+
+import supermarket_multilingual as app
+
+class CountingAggregates:
+    """Wraps FrameAggregates and counts the calls that reach it"""
+
+    def __init__(self, df):
+        self.inner = app.FrameAggregates(df, {'numeric': ['Total'], 'datetime': [], 'categorical': ['Store']})
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self.inner, name)
+
+        def call(*args):
+            self.calls.append((name, args))
+            return method(*args)
+        return call
+
+def workbook(totals):
+    """xlsx bytes of one sheet, as uploaded"""
+    sink = io.BytesIO()
+    pd.DataFrame({'Store': ['North', 'South', 'North'], 'Total': totals}).to_excel(sink, index=False)
+    return sink.getvalue()
+
+def cached(data, sheet='Sheet1', cache=None):
+    """Aggregates of an upload behind the cache, keyed like the dashboard keys them"""
+    inner = CountingAggregates(pd.read_excel(io.BytesIO(data), sheet_name=sheet))
+    cache = cache if cache is not None else app.MemoryLRUCache(1024 * 1024)
+    return app.CachedAggregates(inner, (app.hash_bytes(data), sheet), cache), inner, cache
+
+def test_second_call_is_a_hit():
+    aggregates, inner, cache = cached(workbook([1.0, 2.0, 4.0]))
+    first = aggregates.category_totals('Store', 'Total')
+    second = aggregates.category_totals('Store', 'Total')
+    assert second is first
+    assert inner.calls == [('category_totals', ('Store', 'Total'))]
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert first.set_index('Store')['Total'].to_dict() == {'North': 5.0, 'South': 2.0}
+
+def test_options_are_part_of_the_key():
+    aggregates, inner, cache = cached(workbook([1.0, 2.0, 4.0]))
+    counts_10, _ = aggregates.histogram('Total', 10)
+    counts_3, _ = aggregates.histogram('Total', 3)
+    aggregates.histogram('Total', 10)
+    assert len(counts_10) == 10 and len(counts_3) == 3
+    assert [args for name, args in inner.calls if name == 'histogram'] == [('Total', 10), ('Total', 3)]
+    aggregates.unique_count(['Store'])
+    aggregates.numeric_total(['Total'])
+    assert len(cache) == 4
+
+def test_new_data_gets_new_keys():
+    cache = app.MemoryLRUCache(1024 * 1024)
+    before, _, _ = cached(workbook([1.0, 2.0, 4.0]), cache=cache)
+    after, inner, _ = cached(workbook([1.0, 2.0, 40.0]), cache=cache)
+    assert before.fingerprint != after.fingerprint
+    assert before.numeric_total(['Total']) == 7.0
+    # Same columns and operation, other content: computed, not served from the first upload
+    assert after.numeric_total(['Total']) == 43.0
+    assert inner.calls == [('numeric_total', (['Total'],))]
+
+def test_same_bytes_share_entries_across_sessions():
+    data = workbook([3.0, 3.0, 3.0])
+    cache = app.MemoryLRUCache(1024 * 1024)
+    one, _, _ = cached(data, cache=cache)
+    other, inner, _ = cached(data, cache=cache)
+    one.value_counts('Store')
+    assert other.value_counts('Store').to_dict() == {'North': 2, 'South': 1}
+    assert inner.calls == []
+    # Another sheet of the same workbook is another dataset
+    assert app.CachedAggregates(inner, (app.hash_bytes(data), 'Sheet2'), cache).fingerprint != one.fingerprint
+
+def test_budget_evicts_least_recently_used():
+    cache = app.MemoryLRUCache(3 * 8 * 1000)
+    for i in range(3):
+        cache.put(('frame', i), np.zeros(1000), 8 * 1000)
+    cache.get(('frame', 0))
+    cache.put(('frame', 3), np.zeros(1000), 8 * 1000)
+    assert ('frame', 1) not in cache and ('frame', 0) in cache
+    cache.put(('huge',), np.zeros(10_000), 8 * 10_000)
+    assert ('huge',) not in cache and len(cache) == 3
@@ -0,0 +1,195 @@
+# test_append_dataset.py - Appended uploads keep only new rows, and per-segment summaries merge to the whole
+# and are saved with their segments
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import supermarket_multilingual as app
+
+def upload(days, stores=('North', 'South'), total=10.0):
+    """One row per (day, store), like a daily export from the tills"""
+    rows = [(pd.Timestamp('2024-06-01') + pd.Timedelta(days=d), store, d * 10 + i, total + d)
+            for d in days for i, store in enumerate(stores)]
+    return pd.DataFrame(rows, columns=['Date', 'Store', 'Receipt', 'Total'])
+
+def append(dataset, raw, source, key_cols=None):
+    df, col_types, problems = dataset.conform(raw)
+    assert problems == []
+    return dataset.append(df, col_types, source, key_cols)
+
+@pytest.fixture
+def dataset(request):
+    # Loaded versions are cached process-wide by dataset name
+    return app.AppendDataset(request.node.name)
+
+def test_first_upload_defines_schema(dataset):
+    added, duplicates = append(dataset, upload(range(3)), 'day1.xlsx')
+    assert (len(added), duplicates) == (6, 0)
+    assert dataset.columns == ['Date', 'Store', 'Receipt', 'Total']
+    assert dataset.col_types['datetime'] == ['Date'] and dataset.col_types['numeric'] == ['Receipt', 'Total']
+    assert dataset.key == dataset.columns
+    assert dataset.version == 1 and dataset.rows == 6 and dataset.has_source('day1.xlsx')
+
+def test_known_and_repeated_rows_are_skipped(dataset):
+    append(dataset, upload(range(3)), 'day1.xlsx')
+    # Days 1-2 again, day 3 new and listed twice
+    raw = pd.concat([upload(range(1, 4)), upload([3])], ignore_index=True)
+    added, duplicates = append(dataset, raw, 'day2.xlsx')
+    assert (len(added), duplicates) == (2, 6)
+    assert added['Date'].dt.day.unique().tolist() == [4]
+    assert dataset.version == 2 and dataset.rows == 8
+
+def test_dedupe_on_chosen_key_columns(dataset):
+    append(dataset, upload(range(2)), 'day1.xlsx', key_cols=['Receipt'])
+    # Corrected totals for known receipts are not appended again
+    added, duplicates = append(dataset, upload(range(3), total=99.0), 'day2.xlsx')
+    assert (len(added), duplicates) == (2, 4)
+
+def test_upload_with_nothing_new_adds_no_segment(dataset):
+    append(dataset, upload(range(2)), 'day1.xlsx')
+    added, duplicates = append(dataset, upload(range(2)), 'copy.xlsx')
+    assert (len(added), duplicates) == (0, 4)
+    assert dataset.version == 1 and dataset.has_source('copy.xlsx')
+
+def test_schema_problems(dataset):
+    append(dataset, upload(range(2)), 'day1.xlsx')
+    df, _, problems = dataset.conform(upload([5]).drop(columns='Receipt'))
+    assert df is None and len(problems) == 1 and 'Receipt' in problems[0]
+    raw = upload([5]).assign(Total='n/a')
+    df, _, problems = dataset.conform(raw)
+    assert df is None and len(problems) == 1 and 'Total' in problems[0]
+
+def test_reopened_dataset_reads_its_segments(dataset):
+    append(dataset, upload(range(2)), 'day1.xlsx')
+    append(dataset, upload(range(2, 5)), 'day2.xlsx')
+    reopened = app.AppendDataset(dataset.name)
+    assert reopened.version == 2 and reopened.rows == 10 and reopened.has_source('day2.xlsx')
+    assert reopened.col_types == dataset.col_types
+    rows = pd.concat([reopened.read_segment(0), reopened.read_segment(1)], ignore_index=True)
+    assert rows['Total'].sum() == upload(range(5))['Total'].sum()
+    assert rows['Date'].tolist() == upload(range(5))['Date'].tolist()
+    # The next upload is still checked against the stored keys
+    added, duplicates = append(reopened, upload(range(4, 6)), 'day3.xlsx')
+    assert (len(added), duplicates) == (2, 2)
+
+def grown(dataset):
+    """Three uploads, loaded after each one as the app does; returns the rows of all of them"""
+    rng = np.random.default_rng(6)
+    for index, days in enumerate([range(0, 20), range(15, 40), range(40, 45)]):
+        raw = upload(days, stores=('North', 'South', 'East'))
+        raw['Total'] = rng.gamma(2.0, 30.0, size=len(raw)).round(2)
+        raw.loc[rng.random(len(raw)) < 0.1, 'Total'] = np.nan
+        append(dataset, raw, f'day{index}.csv', key_cols=['Date', 'Store'])
+        app.load_dataset_stats(dataset)
+        app.load_dataset_cube(dataset)
+        app.load_dataset_filter_index(dataset)
+    segments = [dataset.read_segment(i) for i in range(dataset.version)]
+    return pd.concat(segments, ignore_index=True).astype({'Store': object})
+
+def test_segmented_frame_takes_rows_across_segments(dataset):
+    df = grown(dataset)
+    frame, col_types = app.load_dataset_frame(dataset)
+    assert len(frame) == len(df) == 135 and list(frame.columns) == dataset.columns
+    rows = np.array([0, 59, 60, 61, 119, 134])
+    taken = frame.take(rows)
+    pd.testing.assert_series_equal(taken['Total'].reset_index(drop=True), df['Total'].take(rows).reset_index(drop=True))
+    assert taken['Store'].astype(object).tolist() == df['Store'].take(rows).tolist()
+
+def test_merged_statistics_match_the_whole(dataset):
+    df = grown(dataset)
+    stats = app.load_dataset_stats(dataset)
+    assert stats.count(['Total']).iloc[0] == df['Total'].count()
+    assert stats.total(['Receipt', 'Total']) == pytest.approx(df[['Receipt', 'Total']].sum().sum())
+    assert stats.variance(['Total']).iloc[0] == pytest.approx(df['Total'].var())
+    assert stats.max(['Total']).iloc[0] == df['Total'].max()
+
+def test_merged_cube_and_filter_index_match_the_whole(dataset):
+    df = grown(dataset)
+    cube = app.load_dataset_cube(dataset)
+    by_store = cube.by_category['Store'].stats[('sum', 'Total')]
+    expected = df.groupby('Store')['Total'].sum()
+    np.testing.assert_allclose(by_store[expected.index].to_numpy(), expected.to_numpy())
+    by_day = cube.by_day['Date'].stats[('count', 'Total')]
+    assert by_day.to_dict() == df.groupby('Date')['Total'].count().to_dict()
+    row_filter = app.RowFilter({'Store': ['East']}, {'Date': (pd.Timestamp('2024-06-10'), pd.Timestamp('2024-07-01'))})
+    rows = app.load_dataset_filter_index(dataset).select(row_filter).to_rows()
+    mask = (df['Store'] == 'East') & (df['Date'] >= '2024-06-10') & (df['Date'] < '2024-07-01')
+    assert np.array_equal(rows, np.flatnonzero(mask))
+
+def test_segmented_aggregates_match_frame_aggregates(dataset):
+    df = grown(dataset)
+    frame, col_types = app.load_dataset_frame(dataset)
+    segmented = app.SegmentedAggregates(frame, col_types, app.load_dataset_stats(dataset))
+    whole = app.FrameAggregates(df, col_types)
+    assert segmented.row_count == whole.row_count
+    assert segmented.numeric_average(['Total']) == pytest.approx(whole.numeric_average(['Total']))
+    assert segmented.unique_count(['Store']) == 3
+    for freq in ('D', 'W'):
+        pd.testing.assert_frame_equal(segmented.time_series('Date', 'Total', freq),
+                                      whole.time_series('Date', 'Total', freq), check_dtype=False)
+    totals = segmented.category_totals('Store', 'Total').set_index('Store')['Total']
+    expected = whole.category_totals('Store', 'Total').set_index('Store')['Total']
+    np.testing.assert_allclose(totals[expected.index].to_numpy(), expected.to_numpy())
+    counts, edges = segmented.histogram('Total')
+    expected_counts, expected_edges = whole.histogram('Total')
+    np.testing.assert_array_equal(counts, expected_counts)
+    np.testing.assert_allclose(edges, expected_edges)
+
+def test_mixed_type_column_is_stored_as_text(dataset):
+    raw = upload(range(2))
+    raw['Store'] = ['S1', 7, 'S1', 7]
+    added, _ = append(dataset, raw, 'day1.xlsx')
+    assert added['Store'].tolist() == ['S1', '7', 'S1', '7']
+    assert dataset.read_segment(0)['Store'].tolist() == ['S1', '7', 'S1', '7']
+    # Stored keys match the next upload's, whichever type the value arrives as
+    raw = upload(range(3))
+    raw['Store'] = ['S1', '7', 'S1', 7, 'S1', 7]
+    added, duplicates = append(dataset, raw, 'day2.xlsx')
+    assert (len(added), duplicates) == (2, 4)
+
+@pytest.fixture
+def restart(monkeypatch):
+    """Start over with an empty ingestion cache and fresh dataset objects, as after a server restart"""
+    def restart(dataset):
+        monkeypatch.setattr(app, 'get_ingestion_cache', lambda cache=app.MemoryLRUCache(1 << 30): cache)
+        return app.AppendDataset(dataset.name)
+    return restart
+
+def summaries(dataset):
+    return app.load_dataset_stats(dataset), app.load_dataset_cube(dataset), app.load_dataset_filter_index(dataset)
+
+def test_reload_merges_saved_summaries_without_reading_rows(dataset, restart, monkeypatch):
+    df = grown(dataset)
+    stats, cube, index = summaries(dataset)
+    reopened = restart(dataset)
+    monkeypatch.setattr(app.AppendDataset, 'read_segment', lambda self, index: pytest.fail('read rows'))
+    reloaded_stats, reloaded_cube, reloaded_index = summaries(reopened)
+    assert reloaded_stats.total(['Total']) == pytest.approx(stats.total(['Total']))
+    assert reloaded_stats.count(['Total']).iloc[0] == df['Total'].count()
+    pd.testing.assert_frame_equal(reloaded_cube.by_day['Date'].stats, cube.by_day['Date'].stats)
+    row_filter = app.RowFilter({'Store': ['North']}, {})
+    assert np.array_equal(reloaded_index.select(row_filter).to_rows(), index.select(row_filter).to_rows())
+
+def test_append_after_restart_summarizes_only_the_new_segment(dataset, restart, monkeypatch):
+    grown(dataset)
+    reopened = restart(dataset)
+    append(reopened, upload(range(60, 62), stores=('North', 'South', 'East')), 'day3.csv', key_cols=['Date', 'Store'])
+    read = []
+    original = app.AppendDataset.read_segment
+    monkeypatch.setattr(app.AppendDataset, 'read_segment', lambda self, index: read.append(index) or original(self, index))
+    stats, cube, _ = summaries(reopened)
+    assert read == [3]
+    df = pd.concat([reopened.read_segment(i) for i in range(reopened.version)], ignore_index=True)
+    assert stats.total(['Total']) == pytest.approx(df['Total'].sum())
+    assert cube.grand.rows.sum() == len(df) == 141
+
+def test_unreadable_summary_is_rebuilt(dataset, restart):
+    grown(dataset)
+    with open(dataset.summary_path(1, 'stats'), 'wb') as f:
+        f.write(b'truncated')
+    reopened = restart(dataset)
+    stats = app.load_dataset_stats(reopened)
+    df = pd.concat([reopened.read_segment(i) for i in range(reopened.version)], ignore_index=True)
+    assert stats.total(['Total']) == pytest.approx(df['Total'].sum())
+    assert reopened.read_summary(1, 'stats') is not None
@@ -0,0 +1,93 @@
+# test_batch_ingestion.py - Many files combine into one dataset with one schema; bad files are skipped
+
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+import supermarket_multilingual as app
+
+def csv_file(name, df):
+    data = df.to_csv(index=False).encode('utf-8')
+    return app.BatchFile(name, app.hash_bytes(data), data=data)
+
+def excel_file(name, df):
+    sink = io.BytesIO()
+    df.to_excel(sink, index=False)
+    data = sink.getvalue()
+    return app.BatchFile(name, app.hash_bytes(data), data=data)
+
+def store_sales(store, days):
+    return pd.DataFrame({
+        'Date': pd.date_range('2024-01-01', periods=days, freq='D'),
+        'Store': store,
+        'Total': np.arange(days, dtype=float) + 1,
+    })
+
+def test_union_matches_columns_and_converts_kinds():
+    north = pd.DataFrame({'Date': pd.to_datetime(['2024-01-01', '2024-01-02']), 'Total': [1.5, 2.0]})
+    # Other spellings, dates and numbers still as text, and a column of its own
+    south = pd.DataFrame({' date ': ['2024-02-01', 'not a date'], 'TOTAL': ['3', '4.5'], 'Note': ['x', None]})
+    combined = app.union_frames([('north.csv', north), ('south.xlsx', south)])
+    assert list(combined.columns) == ['Date', 'Total', 'Note', 'Source File']
+    assert combined['Date'].tolist()[:3] == [pd.Timestamp('2024-01-01'), pd.Timestamp('2024-01-02'),
+                                             pd.Timestamp('2024-02-01')]
+    assert pd.isna(combined['Date'][3])
+    assert combined['Total'].tolist() == [1.5, 2.0, 3.0, 4.5]
+    assert combined['Note'].isna().tolist() == [True, True, False, True]
+    assert combined['Source File'].tolist() == ['north.csv'] * 2 + ['south.xlsx'] * 2
+
+def test_union_keeps_text_that_is_not_numeric():
+    first = pd.DataFrame({'Code': [1, 2]})
+    second = pd.DataFrame({'Code': ['A7', 'B8']})
+    combined = app.union_frames([('a.csv', first), ('b.csv', second)])
+    assert combined['Code'].tolist() == [1, 2, 'A7', 'B8']
+
+def test_union_source_column_does_not_overwrite_data():
+    df = pd.DataFrame({'Source File': ['till 1'], 'Total': [1.0]})
+    combined = app.union_frames([('a.csv', df), ('a.csv', df)])
+    assert combined['Source File'].tolist() == ['till 1', 'till 1']
+    # Two uploads with one name share a category
+    assert combined['Source File_'].tolist() == ['a.csv', 'a.csv']
+    assert list(combined['Source File_'].cat.categories) == ['a.csv']
+
+def test_load_batch_reports_failures_and_keeps_the_rest():
+    files = [csv_file('north.csv', store_sales('North', 10)), excel_file('south.xlsx', store_sales('South', 5)),
+             app.BatchFile('broken.xlsx', app.hash_bytes(b'not a workbook'), data=b'not a workbook')]
+    progress = []
+    batch_hash, prepared, failures = app.load_batch(files, lambda *args: progress.append(args))
+    df, col_types = prepared
+    assert len(df) == 15
+    assert df.groupby('Source File', observed=True)['Total'].sum().to_dict() == {'north.csv': 55.0,
+                                                                                 'south.xlsx': 15.0}
+    assert col_types['datetime'] == ['Date'] and 'Total' in col_types['numeric']
+    assert [name for name, _ in failures] == ['broken.xlsx']
+    assert sorted(done for done, *_ in progress) == [1, 2, 3]
+    assert {name: rows for _, _, name, rows, _ in progress} == {'north.csv': 10, 'south.xlsx': 5,
+                                                                 'broken.xlsx': None}
+
+def test_batch_hash_identifies_the_set_of_files():
+    north, south = csv_file('north.csv', store_sales('North', 3)), csv_file('south.csv', store_sales('South', 3))
+    first, prepared, _ = app.load_batch([north, south])
+    # Order does not matter, and the parsed union is reused
+    again, cached, _ = app.load_batch([south, north])
+    assert again == first and cached is prepared
+    changed, _, _ = app.load_batch([north, csv_file('south.csv', store_sales('South', 4))])
+    renamed, _, _ = app.load_batch([north, app.BatchFile('other.csv', south.file_id, data=south.data)])
+    assert len({first, changed, renamed}) == 3
+
+def test_batch_with_only_failures():
+    bad = app.BatchFile('bad.parquet', app.hash_bytes(b'junk'), data=b'junk')
+    _, prepared, failures = app.load_batch([bad])
+    assert prepared is None and [name for name, _ in failures] == ['bad.parquet']
+
+def test_duckdb_engine_without_batch_snapshot(monkeypatch):
+    files = [csv_file('north.csv', store_sales('North', 10)), csv_file('south.csv', store_sales('South', 5))]
+    batch_hash, prepared, _ = app.load_batch(files)
+    # The snapshot could not be written and the cached union was evicted: there are no bytes to parse again
+    os.remove(app.snapshot_path(batch_hash, None))
+    monkeypatch.setattr(app, 'get_ingestion_cache', lambda cache=app.MemoryLRUCache(1 << 30): cache)
+    aggregates = app.load_duckdb_aggregates(app.get_sheet_loader(), None, batch_hash, 'batch', None, prepared)
+    assert aggregates.row_count == 15
+    assert aggregates.summary_stats().total(['Total']) == 70.0
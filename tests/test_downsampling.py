@@ -0,0 +1,61 @@
+# test_downsampling.py - LTTB downsampling against a plain reference implementation
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from supermarket_multilingual import downsample_series, lttb_indices
+
+def reference_lttb(x, y, threshold):
+    """Point-by-point LTTB (Steinarsson, 2013)"""
+    n = len(y)
+    every = (n - 2) / (threshold - 2)
+    keep, a = [0], 0
+    for i in range(threshold - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = np.mean(x[end:next_end]), np.mean(y[end:next_end])
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        keep.append(best)
+        a = best
+    keep.append(n - 1)
+    return np.array(keep)
+
+@pytest.mark.parametrize('n, threshold', [(1000, 100), (10_007, 250), (503, 3)])
+def test_matches_reference(n, threshold):
+    rng = np.random.default_rng(n)
+    x = np.cumsum(rng.uniform(0.5, 1.5, size=n))
+    y = np.cumsum(rng.normal(size=n))
+    assert np.array_equal(lttb_indices(x, y, threshold), reference_lttb(x, y, threshold))
+
+def test_shape_of_result():
+    x = np.arange(5000, dtype=float)
+    y = np.sin(x / 50)
+    keep = lttb_indices(x, y, 200)
+    assert len(keep) == 200
+    assert keep[0] == 0 and keep[-1] == len(x) - 1
+    assert (np.diff(keep) > 0).all()
+
+def test_keeps_spikes():
+    y = np.zeros(10_000)
+    y[[1234, 7777]] = [50.0, -80.0]
+    keep = lttb_indices(np.arange(len(y)), y, 100)
+    assert {1234, 7777} <= set(keep.tolist())
+
+def test_short_series_unchanged():
+    assert np.array_equal(lttb_indices(np.arange(50), np.ones(50), 100), np.arange(50))
+    assert np.array_equal(lttb_indices(np.arange(50), np.ones(50), 2), np.arange(50))
+
+def test_downsample_series_frame():
+    dates = pd.date_range('2020-01-01', periods=3000, freq='D')
+    ts_data = pd.DataFrame({'Date': dates, 'Total': np.arange(3000.0) % 97})
+    assert downsample_series(ts_data, 'Date', 'Total', 5000) is ts_data
+    sampled = downsample_series(ts_data, 'Date', 'Total', 300)
+    assert len(sampled) == 300
+    assert sampled['Date'].is_monotonic_increasing
+    assert sampled['Date'].iloc[0] == dates[0] and sampled['Date'].iloc[-1] == dates[-1]
+    pd.testing.assert_frame_equal(sampled, ts_data.loc[sampled.index])
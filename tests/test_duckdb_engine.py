@@ -0,0 +1,124 @@
+# test_duckdb_engine.py - SQL aggregates over the Arrow snapshot match FrameAggregates on the same frame
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as pads
+import pytest
+
+import supermarket_multilingual as app
+
+@pytest.fixture
+def engines():
+    """(DuckDBAggregates over the snapshot, FrameAggregates over the frame it was written from)"""
+    rng = np.random.default_rng(12)
+    rows = 3000
+    raw = pd.DataFrame({
+        'Date': (pd.Timestamp('2024-05-01') + pd.to_timedelta(rng.integers(0, 40 * 24, size=rows), unit='h')).astype(str),
+        'Store': rng.choice(['North', 'South', 'East', None], size=rows),
+        'Payment': rng.choice(['Cash', 'Card', 'Voucher'], size=rows),
+        'Quantity': rng.integers(1, 10, size=rows),
+        # Whole numbers from 0 to 100 put values exactly on the histogram edges
+        'Rating': rng.integers(0, 101, size=rows).astype(float),
+        'Total': rng.gamma(2.0, 35.0, size=rows).round(2),
+    })
+    raw.loc[rng.random(rows) < 0.1, 'Total'] = np.nan
+    raw.loc[rng.random(rows) < 0.03, 'Date'] = None
+    df, col_types = app.prepare_dataframe(raw)
+    df = app.optimize_memory(df, col_types)
+    app.save_snapshot(df, col_types, 'parity', None)
+    source = pads.dataset(app.snapshot_path('parity', None), format='arrow')
+    return app.DuckDBAggregates(source, col_types), app.FrameAggregates(df, col_types)
+
+def test_kpis(engines):
+    duck, frame = engines
+    assert duck.row_count == frame.row_count == 3000
+    cols = ['Quantity', 'Rating', 'Total']
+    # KPIs are read off the summary statistics
+    stats, expected = duck.summary_stats(), frame.summary_stats()
+    assert stats.total(cols) == pytest.approx(expected.total(cols), rel=1e-12)
+    assert stats.average(cols) == pytest.approx(expected.average(cols), rel=1e-12)
+    assert duck.unique_count(['Store', 'Payment']) == frame.unique_count(['Store', 'Payment']) == 6
+
+def test_summary_stats(engines):
+    duck, frame = engines
+    cols = ['Quantity', 'Rating', 'Total']
+    stats, expected = duck.summary_stats(), frame.summary_stats()
+    pd.testing.assert_series_equal(stats.count(cols), expected.count(cols))
+    pd.testing.assert_series_equal(stats.nulls(cols), expected.nulls(cols))
+    for name in ('sum', 'mean', 'variance', 'min', 'max'):
+        pd.testing.assert_series_equal(getattr(stats, name)(cols), getattr(expected, name)(cols), rtol=1e-10)
+    pd.testing.assert_frame_equal(stats.covariance(cols), expected.covariance(cols), rtol=1e-9)
+
+@pytest.mark.parametrize('bins', [10, 20, 30, 7])
+def test_histogram_edges_and_last_bin(engines, bins):
+    duck, frame = engines
+    counts, edges = duck.histogram('Rating', bins)
+    expected_counts, expected_edges = frame.histogram('Rating', bins)
+    np.testing.assert_array_equal(edges, expected_edges)
+    # Values on an inner edge go to the bin above; the maximum stays in the last bin
+    np.testing.assert_array_equal(counts, expected_counts)
+    assert counts[-1] >= 1
+
+def test_histogram_of_constant_and_empty_columns(engines):
+    duck, frame = engines
+    counts, edges = duck.histogram('Quantity', 1)
+    assert counts.tolist() == [3000]
+    df = pd.DataFrame({'Flat': [5.0, 5.0, np.nan], 'Missing': [np.nan] * 3})
+    col_types = {'numeric': ['Flat', 'Missing'], 'categorical': [], 'datetime': []}
+    app.save_snapshot(df, col_types, 'flat', None)
+    duck = app.DuckDBAggregates(pads.dataset(app.snapshot_path('flat', None), format='arrow'), col_types)
+    frame = app.FrameAggregates(df, col_types)
+    for col in ('Flat', 'Missing'):
+        counts, edges = duck.histogram(col, 4)
+        expected_counts, expected_edges = frame.histogram(col, 4)
+        np.testing.assert_array_equal(counts, expected_counts)
+        np.testing.assert_array_equal(edges, expected_edges)
+
+def test_category_totals_and_counts(engines):
+    duck, frame = engines
+    for col in ('Store', 'Payment'):
+        totals = duck.category_totals(col, 'Total').set_index(col)['Total']
+        expected = frame.category_totals(col, 'Total').set_index(col)['Total']
+        # Missing stores are left out, like groupby's default
+        assert sorted(totals.index) == sorted(expected.index)
+        np.testing.assert_allclose(totals[expected.index].to_numpy(), expected.to_numpy())
+        assert totals.is_monotonic_decreasing
+        assert duck.value_counts(col).to_dict() == frame.value_counts(col).to_dict()
+
+@pytest.mark.parametrize('freq', ['h', 'D', 'W', 'MS'])
+def test_time_series(engines, freq):
+    duck, frame = engines
+    series = duck.time_series('Date', 'Total', freq)
+    expected = frame.time_series('Date', 'Total', freq)
+    assert list(series['Date']) == list(expected['Date'])
+    np.testing.assert_allclose(series['Total'].to_numpy(), expected['Total'].to_numpy())
+
+def test_correlation(engines):
+    duck, frame = engines
+    cols = ['Quantity', 'Rating', 'Total']
+    np.testing.assert_allclose(duck.summary_stats().correlation(cols).to_numpy(),
+                               frame.summary_stats().correlation(cols).to_numpy(), atol=1e-12)
+
+class FrameLoader:
+    """Stands in for the workbook loader: hands back a parsed sheet"""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def load(self, data, file_hash, sheet=None):
+        return self.raw.copy()
+
+def test_mixed_type_column_queried_in_memory():
+    # A store column holding both 'S1' and 7 cannot be written as an Arrow snapshot
+    raw = pd.DataFrame({'Store': ['S1', 7, 'S1', None, 'S2', 'S2'] * 50,
+                        'Total': [10.0, 2.5, np.nan, 4.0, 1.5, 8.0] * 50})
+    duck = app.load_duckdb_aggregates(FrameLoader(raw), b'', 'mixed', 'sales.xlsx')
+    df, col_types = app.load_prepared_dataset(FrameLoader(raw), b'', 'mixed', 'sales.xlsx')
+    frame = app.FrameAggregates(df, col_types)
+    totals = duck.category_totals('Store', 'Total').set_index('Store')['Total']
+    expected = frame.category_totals('Store', 'Total').set_index('Store')['Total']
+    # Values come back as their strings; the missing store stays missing
+    assert totals.to_dict() == {str(store): total for store, total in expected.items()} == {
+        'S1': 500.0, 'S2': 475.0, '7': 125.0}
+    assert duck.value_counts('Store').sum() == 250
+    assert duck.summary_stats().total(['Total']) == frame.summary_stats().total(['Total'])
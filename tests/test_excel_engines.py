@@ -0,0 +1,129 @@
+# test_excel_engines.py - The streaming openpyxl reader types columns the way pandas.read_excel does
+
+import datetime
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from excel_engines import ColumnBuilder, choose_engine, read_openpyxl_stream, workbook_format
+
+def workbook(rows):
+    """xlsx bytes of one sheet holding `rows` (lists of cell values, header first)"""
+    book = Workbook()
+    sheet = book.active
+    for row in rows:
+        sheet.append(row)
+    sink = io.BytesIO()
+    book.save(sink)
+    return sink.getvalue()
+
+def built(*batches):
+    builder = ColumnBuilder()
+    for batch in batches:
+        builder.add(list(batch))
+    return builder.finish()
+
+def test_builder_int_batches_stay_int():
+    column = built([1, 2], [3])
+    assert column.dtype == np.int64 and column.tolist() == [1, 2, 3]
+
+def test_builder_blanks_and_floats_make_float():
+    assert built([1, 2], [None, 4]).dtype == np.float64
+    assert built([1, 2], [2.5]).tolist() == [1.0, 2.0, 2.5]
+    # An all-blank batch keeps its length
+    column = built([1, 2], [None, None, None])
+    assert column.dtype == np.float64 and len(column) == 5 and column.isna().sum() == 3
+
+def test_builder_na_strings_and_text():
+    column = built(['a', 'N/A'], ['b', ''])
+    assert column.tolist()[::2] == ['a', 'b'] and column.isna().tolist() == [False, True, False, True]
+
+def test_builder_mixed_batches_make_object():
+    column = built([1, 2], ['x'])
+    assert column.dtype == object and column.tolist() == [1, 2, 'x']
+
+def test_builder_dates():
+    column = built([datetime.datetime(2024, 1, 2, 3, 4)], [None])
+    assert pd.api.types.is_datetime64_any_dtype(column.dtype)
+    assert column[0] == pd.Timestamp('2024-01-02 03:04') and pd.isna(column[1])
+
+def test_builder_bools():
+    column = built([True, False], [True])
+    assert column.dtype == bool and column.tolist() == [True, False, True]
+    # With blanks pandas reads 1.0/0.0/NaN
+    column = built([True, None], [False])
+    assert column.dtype == np.float64 and column.isna().tolist() == [False, True, False]
+    assert built([True, False], [None, None]).dtype == np.float64
+    assert built([True], [2]).dtype == object
+
+@pytest.mark.parametrize('batch_rows', [1, 2, 1000])
+def test_stream_bool_columns_match_read_excel(batch_rows):
+    data = workbook([['Paid', 'Returned'], [True, False], [False, None], [True, True]])
+    streamed = read_openpyxl_stream(io.BytesIO(data), batch_rows=batch_rows)
+    expected = pd.read_excel(io.BytesIO(data))
+    pd.testing.assert_frame_equal(streamed, expected, check_column_type=False)
+
+@pytest.mark.parametrize('batch_rows', [1, 3, 7, 1000])
+def test_stream_matches_read_excel(batch_rows):
+    rows = [['Date', 'Store', 'Units', 'Price', None, 'Code', 'Store', 'Empty']]
+    for i in range(20):
+        rows.append([datetime.datetime(2024, 1, 1) + datetime.timedelta(hours=7 * i),
+                     ['North', 'South', 'N/A'][i % 3], i, None if i % 6 == 0 else i * 1.25,
+                     'note' if i == 4 else None,
+                     # Numbers first, text later: object
+                     i if i < 15 else f'C{i}', 'dup', None])
+    rows += [[None] * 8] * 3       # trailing blank rows are dropped
+    data = workbook(rows)
+    streamed = read_openpyxl_stream(io.BytesIO(data), batch_rows=batch_rows)
+    expected = pd.read_excel(io.BytesIO(data))
+    pd.testing.assert_frame_equal(streamed, expected, check_dtype=False, check_column_type=False)
+    assert streamed.dtypes.astype(str).tolist()[:4] == expected.dtypes.astype(str).tolist()[:4]
+    assert list(streamed.columns) == ['Date', 'Store', 'Units', 'Price', 'Unnamed: 4', 'Code', 'Store.1', 'Empty']
+
+@pytest.mark.parametrize('batch_rows', [1, 2, 1000])
+def test_blank_rows_inside_the_data_stay(batch_rows):
+    data = workbook([['Units', 'Store'], [1, 'North'], [None, None], [None, None], [4, 'East'], [None, None]])
+    streamed = read_openpyxl_stream(io.BytesIO(data), batch_rows=batch_rows)
+    pd.testing.assert_frame_equal(streamed, pd.read_excel(io.BytesIO(data)), check_column_type=False)
+    assert len(streamed) == 4
+
+def test_stream_reads_sheet_by_name_and_empty_sheets():
+    book = Workbook()
+    book.active.title = 'Empty'
+    book.create_sheet('Sales').append(['Total'])
+    book['Sales'].append([5])
+    sink = io.BytesIO()
+    book.save(sink)
+    assert read_openpyxl_stream(io.BytesIO(sink.getvalue()), 'Sales')['Total'].tolist() == [5]
+    assert read_openpyxl_stream(io.BytesIO(sink.getvalue()), 0).empty
+
+def test_engine_choice():
+    xlsx = workbook([['a'], [1]])
+    assert workbook_format(xlsx[:8]) == 'xlsx'
+    assert workbook_format(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1' + b'\0' * 8) == 'xls'
+    assert choose_engine('xlsx', 100, 'openpyxl_stream') == 'openpyxl_stream'
+    # The streaming reader cannot open legacy .xls files
+    assert choose_engine('xls', 10 ** 9, 'openpyxl_stream') != 'openpyxl_stream'
+
+@pytest.mark.parametrize('batch_rows', [1, 2, 3, 1000])
+def test_stream_mixed_columns_keep_pandas_cell_values(batch_rows):
+    # Blank rows inside the data, and blanks within batches of every kind
+    data = workbook([
+        ['Code', 'When', 'Note', 'Flag', 'Empty'],
+        [1, datetime.datetime(2024, 1, 1), 'a', True, None],
+        [None, None, None, None, None],
+        ['x', 'text', None, 'y', None],
+        [None, None, 'b', False, None],
+        [2.5, datetime.datetime(2024, 1, 3), 3, None, None],
+        ['y', None, 4.0, True, 1],
+    ])
+    streamed = read_openpyxl_stream(io.BytesIO(data), batch_rows=batch_rows)
+    expected = pd.read_excel(io.BytesIO(data))
+    pd.testing.assert_frame_equal(streamed, expected, check_column_type=False)
+    # Blanks are NaN (not None or NaT), whole numbers int, dates datetime, flags bool
+    for col in ['Code', 'When', 'Note', 'Flag']:
+        assert [type(v) for v in streamed[col]] == [type(v) for v in expected[col]]
+    assert built([None], [None, None]).dtype == np.float64
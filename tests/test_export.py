@@ -0,0 +1,110 @@
+# test_export.py - Exported workbooks and files read back to the data that was exported
+
+import io
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+import supermarket_multilingual as app
+
+def read_back(sheets):
+    sink = io.BytesIO()
+    app.write_excel(sheets, sink)
+    sink.seek(0)
+    return pd.read_excel(sink, sheet_name=None)
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        'Date': pd.to_datetime(['2024-01-01 08:30', None, '2024-03-05 17:00', '2024-12-31 00:00']),
+        'Quantity': np.array([1, 2, 3, 4], dtype=np.int32),
+        'Price': [0.1, np.nan, 2.5, -7.25],
+        'Ratio': np.array([0.1, 0.2, 0.3, 0.4], dtype=np.float32),
+        'Paid': [True, False, True, True],
+        'Category': pd.Categorical(['Food', None, 'Home & <Garden>', 'Food']),
+        'Note': ['a "quote"', None, 'tab\there', 'bell\x07gone'],
+    })
+
+# openpyxl warns about, and restyles, workbooks without a Normal cell style
+@pytest.mark.filterwarnings('error')
+def test_round_trip(frame):
+    chunks = [frame.iloc[:1], frame.iloc[1:3], frame.iloc[3:]]
+    back = read_back([('Data', chunks)])['Data']
+    assert list(back.columns) == list(frame.columns)
+    pd.testing.assert_series_equal(back['Date'].astype('datetime64[ns]'), frame['Date'].astype('datetime64[ns]'))
+    assert back['Quantity'].tolist() == [1, 2, 3, 4]
+    assert back['Price'].tolist()[::2] == [0.1, 2.5] and np.isnan(back['Price'][1])
+    assert back['Ratio'].tolist() == [0.1, 0.2, 0.3, 0.4]
+    assert back['Paid'].tolist() == [True, False, True, True]
+    assert back['Category'].tolist()[::2] == ['Food', 'Home & <Garden>'] and pd.isna(back['Category'][1])
+    assert back['Note'][0] == 'a "quote"' and pd.isna(back['Note'][1]) and back['Note'][2] == 'tab\there'
+    # Characters XML cannot hold are dropped
+    assert back['Note'][3] == 'bellgone'
+
+def test_sheet_names_and_empty_tables(frame):
+    back = read_back([('Top/5: [sales]', [frame]), ('top_5_ _sales_', [frame.iloc[:0]]), ('Empty', [])])
+    assert list(back) == ['Top_5_ _sales_', 'top_5_ _sales_ (2)', 'Empty']
+    assert list(back['top_5_ _sales_ (2)'].columns) == list(frame.columns)
+    assert back['Empty'].empty
+
+def test_long_table_continues_on_next_sheet(frame, monkeypatch):
+    monkeypatch.setattr(app, 'EXCEL_MAX_ROWS', 3)
+    long = pd.concat([frame] * 2, ignore_index=True)
+    back = read_back([('Data', [long.iloc[:5], long.iloc[5:]])])
+    assert list(back) == ['Data', 'Data (2)', 'Data (3)']
+    assert [len(sheet) for sheet in back.values()] == [3, 3, 2]
+    assert pd.concat(back.values(), ignore_index=True)['Quantity'].tolist() == long['Quantity'].tolist()
+
+def sparse_chunks():
+    """Chunks whose first one has an all-missing text column, mixed-type values and narrower ints"""
+    first = pd.DataFrame({'Store': pd.Series([None, None], dtype=object), 'Code': ['x', 1],
+                          'Units': np.array([1, 2], dtype=np.int8), 'Kind': pd.Categorical(['a', 'b'])})
+    second = pd.DataFrame({'Store': ['S1', None], 'Code': [2.5, 'y'],
+                           'Units': np.array([300, 4], dtype=np.int16), 'Kind': pd.Categorical(['c', 'a'])})
+    return [first, second]
+
+@pytest.mark.parametrize('fmt', ['csv', 'parquet'])
+def test_sparse_and_mixed_chunks(fmt):
+    sink = io.BytesIO()
+    (app.write_csv if fmt == 'csv' else app.write_parquet)(sparse_chunks(), sink)
+    sink.seek(0)
+    back = pd.read_csv(sink) if fmt == 'csv' else pq.read_table(sink).to_pandas()
+    assert back['Store'].tolist()[2] == 'S1' and back['Store'].isna().sum() == 3
+    assert back['Code'].tolist() == ['x', '1', '2.5', 'y']
+    assert back['Units'].tolist() == [1, 2, 300, 4]
+    assert back['Kind'].tolist() == ['a', 'b', 'c', 'a']
+
+DATASET_MAGIC = {'csv': b'"Date",', 'parquet': b'PAR1', 'xlsx': b'PK'}
+
+@pytest.mark.parametrize('fmt', ['csv', 'parquet', 'xlsx'])
+def test_exports_are_files_streamlit_can_serve(frame, fmt):
+    aggregates = app.FrameAggregates(frame, {'numeric': ['Quantity', 'Price', 'Ratio'], 'categorical': ['Category'],
+                                             'datetime': ['Date']})
+    # The dataset is one file; the aggregate tables a workbook or a zip
+    for export, magic in ((app.export_dataset(aggregates, fmt), DATASET_MAGIC[fmt]),
+                          (app.export_tables({'Summary': frame}, fmt), b'PK')):
+        with export:
+            data, _ = convert_data_to_bytes_and_infer_mime(export, unsupported_error=TypeError())
+        assert data.startswith(magic)
+
+def test_dataset_export_is_not_held_in_memory():
+    rng = np.random.default_rng(4)
+    rows = 400_000
+    df = pd.DataFrame({'Store': rng.choice(['North', 'South', 'East'], size=rows),
+                       'Total': rng.gamma(2.0, 35.0, size=rows)})
+    aggregates = app.FrameAggregates(df, {'numeric': ['Total'], 'categorical': ['Store'], 'datetime': []})
+    tracemalloc.start()
+    try:
+        export = app.export_dataset(aggregates, 'csv', chunk_rows=20_000)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    with export:
+        size = len(export.read())
+    # Only one chunk is formatted at a time, and the file is never read into bytes
+    assert size > 10_000_000
+    assert peak < size / 5
@@ -0,0 +1,127 @@
+# test_filter_index.py - Row bitmaps and the filter index give the same rows as numpy boolean masks
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as pads
+import pytest
+
+import supermarket_multilingual as app
+from supermarket_multilingual import BITMAP_ARRAY_MAX, FilterIndex, RowBitmap, RowFilter
+
+def bitmap_of(mask):
+    return RowBitmap.from_rows(np.flatnonzero(mask))
+
+@pytest.fixture
+def masks():
+    """Masks over several 2**16-row chunks, dense (bitset containers) and sparse (array containers)"""
+    rng = np.random.default_rng(11)
+    rows = 5 * (1 << 16) + 123
+    return {
+        'dense': rng.random(rows) < 0.4,
+        'sparse': rng.random(rows) < 0.01,
+        'blocks': (np.arange(rows) // 40_000) % 2 == 0,
+        'empty': np.zeros(rows, dtype=bool),
+    }
+
+def test_containers_switch_at_array_max(masks):
+    # The short last chunk of the dense mask stays an array
+    containers = bitmap_of(masks['dense']).containers
+    assert all(containers[chunk].dtype != np.uint16 for chunk in range(5))
+    assert containers[5].dtype == np.uint16
+    containers = bitmap_of(masks['sparse']).containers.values()
+    assert all(c.dtype == np.uint16 and len(c) <= BITMAP_ARRAY_MAX for c in containers)
+
+@pytest.mark.parametrize('a', ['dense', 'sparse', 'blocks', 'empty'])
+@pytest.mark.parametrize('b', ['dense', 'sparse', 'blocks', 'empty'])
+def test_and_or_match_masks(masks, a, b):
+    left, right = bitmap_of(masks[a]), bitmap_of(masks[b])
+    both = left & right
+    either = left | right
+    assert np.array_equal(both.to_rows(), np.flatnonzero(masks[a] & masks[b]))
+    assert np.array_equal(either.to_rows(), np.flatnonzero(masks[a] | masks[b]))
+    assert len(both) == int((masks[a] & masks[b]).sum())
+    assert len(either) == int((masks[a] | masks[b]).sum())
+
+@pytest.mark.parametrize('offset', [0, 1 << 16, 1000])
+def test_shifted(masks, offset):
+    rows = bitmap_of(masks['dense']).shifted(offset).to_rows()
+    assert np.array_equal(rows, np.flatnonzero(masks['dense']) + offset)
+
+def frame(rng, rows):
+    return pd.DataFrame({
+        'Store': pd.Categorical(rng.choice(['S1', 'S2', 'S3', None], size=rows)),
+        'Category': rng.choice(['Food', 'Home', 'Toys'], size=rows),
+        'Date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 90 * 24, size=rows), unit='h'),
+    })
+
+def expected_mask(df, values, dates):
+    mask = np.ones(len(df), dtype=bool)
+    for col, selected in values.items():
+        mask &= df[col].isin(selected).to_numpy()
+    for col, (start, end) in dates.items():
+        mask &= ((df[col] >= start) & (df[col] < end)).to_numpy()
+    return mask
+
+FILTERS = [
+    ({'Store': ['S1']}, {}),
+    ({'Store': ['S1', 'S3'], 'Category': ['Toys']}, {}),
+    ({}, {'Date': (pd.Timestamp('2024-02-01'), pd.Timestamp('2024-02-15'))}),
+    ({'Category': ['Food', 'Home']}, {'Date': (pd.Timestamp('2024-01-10'), pd.Timestamp('2024-03-01'))}),
+    ({'Store': ['missing']}, {}),
+]
+COL_TYPES = {'categorical': ['Store', 'Category'], 'datetime': ['Date'], 'numeric': []}
+
+@pytest.mark.parametrize('values, dates', FILTERS)
+def test_select_matches_masks(values, dates):
+    df = frame(np.random.default_rng(3), 150_000)
+    rows = FilterIndex(df, COL_TYPES).select(RowFilter(values, dates)).to_rows()
+    assert np.array_equal(rows, np.flatnonzero(expected_mask(df, values, dates)))
+
+@pytest.mark.parametrize('values, dates', FILTERS)
+def test_merged_index_matches_masks(values, dates):
+    rng = np.random.default_rng(5)
+    first, second = frame(rng, 70_001), frame(rng, 30_000)
+    index = FilterIndex(first, COL_TYPES).merge(FilterIndex(second, COL_TYPES))
+    df = pd.concat([first.astype({'Store': object}), second.astype({'Store': object})], ignore_index=True)
+    rows = index.select(RowFilter(values, dates)).to_rows()
+    assert np.array_equal(rows, np.flatnonzero(expected_mask(df, values, dates)))
+
+TYPED_FILTERS = [
+    {'Aisle': [1, 3]},
+    {'Promo': [True]},
+    {'Promo': [False], 'Weight': [0.5, 2.25]},
+    {'Aisle': [2], 'Store': ['S2']},
+]
+
+@pytest.mark.parametrize('values', TYPED_FILTERS)
+def test_duckdb_filter_matches_index_on_typed_columns(values):
+    # Numeric and boolean categoricals compare against typed literals, not strings
+    rng = np.random.default_rng(9)
+    rows = 5000
+    df = pd.DataFrame({
+        'Store': rng.choice(['S1', 'S2', 'S3'], size=rows),
+        'Aisle': rng.integers(1, 5, size=rows),
+        'Promo': rng.random(rows) < 0.3,
+        'Weight': rng.choice([0.5, 1.0, 2.25], size=rows),
+        'Total': rng.gamma(2.0, 10.0, size=rows),
+    })
+    col_types = {'categorical': ['Store', 'Aisle', 'Promo', 'Weight'], 'datetime': [], 'numeric': ['Total']}
+    df = app.optimize_memory(df, col_types)
+    app.save_snapshot(df, col_types, 'typed-filter', None)
+    source = pads.dataset(app.snapshot_path('typed-filter', None), format='arrow')
+    duck = app.DuckDBAggregates(source, col_types)
+    for col in values:
+        assert duck.filter_values(col) == FilterIndex(df, col_types).filter_values(col)
+    row_filter = RowFilter(values)
+    selected = FilterIndex(df, col_types).select(row_filter).to_rows()
+    assert np.array_equal(selected, np.flatnonzero(expected_mask(df, values, {})))
+    view = duck.filtered(row_filter)
+    assert view.row_count == len(selected) > 0
+    assert view.summary_stats().total(['Total']) == pytest.approx(df['Total'].iloc[selected].sum(), rel=1e-12)
+
+def test_sql_literals_typed_like_values():
+    sql = RowFilter({'Aisle': [np.int64(1), 3], 'Promo': [np.True_], 'Weight': [0.5], 'Store': ["O'Hara"]}).sql()
+    assert '"Aisle" IN (1, 3)' in sql
+    assert '"Promo" IN (TRUE)' in sql
+    assert '"Weight" IN (CAST(\'0.5\' AS DOUBLE))' in sql
+    assert '"Store" IN (\'O\'\'Hara\')' in sql
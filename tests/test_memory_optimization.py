@@ -0,0 +1,43 @@
+# test_memory_optimization.py - Category storage and numeric downcasting keep every value
+
+import numpy as np
+import pandas as pd
+
+import supermarket_multilingual as app
+
+def optimized(df):
+    df, col_types = app.prepare_dataframe(df)
+    original = df.copy()
+    return app.optimize_memory(df, col_types), original, col_types
+
+def test_integers_take_the_smallest_type_that_holds_them():
+    df, original, _ = optimized(pd.DataFrame({
+        'Small': np.arange(1000) % 100,
+        'Medium': np.arange(1000) * 40,
+        'Negative': -np.arange(1000) * 500_000,
+    }))
+    assert df.dtypes.to_dict() == {'Small': np.int8, 'Medium': np.int32, 'Negative': np.int32}
+    # Sums are taken in int64, so the narrow storage cannot overflow them
+    assert df['Small'].sum() == original['Small'].sum() == 49_500
+    assert (df.astype(np.int64) == original).all().all()
+
+def test_floats_narrowed_only_when_exact():
+    halves = np.arange(5000) * 0.5
+    tenths = np.arange(5000) * 0.1
+    df, original, _ = optimized(pd.DataFrame({'Halves': halves, 'Tenths': tenths, 'Gaps': np.where(halves > 100, np.nan, halves)}))
+    assert df['Halves'].dtype == np.float32 and df['Gaps'].dtype == np.float32
+    # 0.1 has no exact float32: the column keeps float64 and its full precision
+    assert df['Tenths'].dtype == np.float64
+    assert app.widen_floats(df['Halves']).sum() == original['Halves'].sum()
+    assert app.widen_floats(df['Gaps']).isna().sum() == original['Gaps'].isna().sum()
+    pd.testing.assert_frame_equal(app.widen_floats(df), original)
+
+def test_repeated_text_stored_as_category():
+    stores = np.array(['North', 'South', None, 'East'], dtype=object)[np.arange(4000) % 4]
+    df, original, col_types = optimized(pd.DataFrame({'Store': stores, 'Id': [f"order-{i}" for i in range(4000)]}))
+    assert isinstance(df['Store'].dtype, pd.CategoricalDtype)
+    assert not isinstance(df['Id'].dtype, pd.CategoricalDtype)
+    assert df['Store'].isna().sum() == 1000
+    assert df['Store'].astype(object).where(df['Store'].notna(), None).tolist() == \
+        original['Store'].astype(object).where(original['Store'].notna(), None).tolist()
+    assert col_types['memory']['after'] < col_types['memory']['before']
@@ -0,0 +1,57 @@
+# test_parallel_aggregation.py - Merged column statistics against numpy/pandas computed in one pass
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from parallel_aggregation import block_stats, column_stats, merge_column_stats
+
+def covariance(stats):
+    return stats['comoment'] / (stats['n'] - 1)
+
+def assert_cov_close(actual, expected):
+    """Within 1e-7 of each entry's scale sqrt(var_i * var_j): near-zero entries get an absolute bound"""
+    scale = np.sqrt(np.outer(np.diag(expected), np.diag(expected)))
+    assert (np.abs(actual - expected) <= 1e-7 * scale).all()
+
+@pytest.fixture
+def values():
+    rng = np.random.default_rng(2)
+    base = rng.normal(size=(20_000, 1))
+    # Correlated columns, one offset by 1e9: naive sums of squares would lose every digit there,
+    # the shifted sums keep about 8
+    return np.hstack([base * 3 + 1e9, base + rng.normal(size=(20_000, 1)), rng.exponential(5, size=(20_000, 2))])
+
+@pytest.mark.parametrize('splits', [[10_000], [1, 7, 13_000], list(range(1000, 20_000, 1000))])
+def test_merged_moments_match_numpy(values, splits):
+    stats = column_stats(values[:0])
+    for part in np.split(values, splits):
+        stats = merge_column_stats(stats, column_stats(part))
+    diagonal = np.diag(stats['n'])
+    assert stats['rows'] == len(values)
+    assert np.array_equal(diagonal, np.full(values.shape[1], len(values)))
+    np.testing.assert_allclose(stats['sum'], values.sum(axis=0))
+    np.testing.assert_allclose(np.diag(stats['mean']), values.mean(axis=0))
+    np.testing.assert_array_equal(stats['min'], values.min(axis=0))
+    np.testing.assert_array_equal(stats['max'], values.max(axis=0))
+    assert_cov_close(covariance(stats), np.cov(values, rowvar=False))
+
+def test_pairwise_complete_with_missing(values):
+    rng = np.random.default_rng(9)
+    values = values.copy()
+    values[rng.random(values.shape) < 0.2] = np.nan
+    values[:500, 2] = np.nan
+    stats = block_stats(values, block_rows=4096)
+    frame = pd.DataFrame(values)
+    np.testing.assert_array_equal(stats['n'], frame.notna().astype(int).T @ frame.notna().astype(int))
+    assert_cov_close(covariance(stats), frame.cov().to_numpy())
+    np.testing.assert_allclose(np.diag(stats['mean']), frame.mean().to_numpy())
+    np.testing.assert_allclose(np.diag(stats['m2']) / (np.diag(stats['n']) - 1), frame.var().to_numpy(), rtol=1e-7)
+
+def test_merge_with_empty_and_all_missing():
+    values = np.array([[1.0, np.nan], [2.0, np.nan], [4.0, np.nan]])
+    stats = merge_column_stats(column_stats(values[:0]), column_stats(values))
+    assert stats['n'][0, 0] == 3 and stats['n'][1, 1] == 0
+    assert stats['min'][1] == np.inf and stats['max'][1] == -np.inf
+    assert np.isfinite(stats['comoment']).all()
+    assert stats['m2'][0, 0] == pytest.approx(np.var(values[:, 0]) * 3)
@@ -0,0 +1,89 @@
+# test_reports.py - The report command rebuilds only files whose content or settings changed
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import supermarket_multilingual as app
+
+SETTINGS = {'layout': app.REPORT_LAYOUT_VERSION, 'languages': ['en'], 'formats': ['html'],
+            'date_column': None, 'value_column': None, 'category_column': None, 'top_n': 5}
+
+def write_sales(path, rows=60, seed=0):
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        'Date': pd.date_range('2024-01-01', periods=rows, freq='D'),
+        'Store': rng.choice(['North', 'South'], size=rows),
+        'Quantity': rng.integers(1, 5, size=rows),
+        'Total': rng.uniform(5, 50, size=rows).round(2),
+    }).to_csv(path, index=False)
+
+@pytest.fixture
+def folders(work_dir):
+    inbox = work_dir / 'inbox'
+    inbox.mkdir()
+    write_sales(inbox / 'north.csv')
+    write_sales(inbox / 'south.csv', seed=1)
+    # Not a data file: ignored
+    (inbox / 'notes.txt').write_text('weekly exports')
+    return inbox, work_dir / 'reports'
+
+def run(folders, settings=SETTINGS, force=False):
+    inbox, out = folders
+    return app.run_reports(str(inbox), str(out), settings, jobs=1, force=force)
+
+def test_first_run_reports_every_file(folders):
+    inbox, out = folders
+    assert run(folders) == (2, 0, [])
+    assert sorted(os.listdir(out)) == sorted([app.REPORT_MANIFEST, 'north.csv.en.html', 'south.csv.en.html'])
+    manifest = json.loads((out / app.REPORT_MANIFEST).read_text())
+    assert manifest['north.csv']['rows'] == 60 and manifest['north.csv']['outputs'] == ['north.csv.en.html']
+    html = (out / 'north.csv.en.html').read_text(encoding='utf-8')
+    assert html.startswith('<!DOCTYPE html>') and 'north.csv' in html and html.count('<img') == 5
+
+def test_unchanged_files_are_skipped(folders):
+    run(folders)
+    assert run(folders) == (0, 2, [])
+    assert run(folders, force=True) == (2, 0, [])
+
+def test_changed_content_output_or_settings_rebuild(folders):
+    inbox, out = folders
+    run(folders)
+    write_sales(inbox / 'north.csv', seed=5)
+    assert run(folders) == (1, 1, [])
+    os.remove(out / 'south.csv.en.html')
+    assert run(folders) == (1, 1, [])
+    assert run(folders, dict(SETTINGS, top_n=3)) == (2, 0, [])
+
+def test_failed_files_are_retried(folders):
+    inbox, out = folders
+    (inbox / 'broken.parquet').write_bytes(b'not parquet')
+    built, skipped, failures = run(folders)
+    assert (built, skipped) == (2, 0) and [name for name, _ in failures] == ['broken.parquet']
+    assert 'broken.parquet' not in json.loads((out / app.REPORT_MANIFEST).read_text())
+    built, skipped, failures = run(folders)
+    assert (built, skipped) == (0, 2) and [name for name, _ in failures] == ['broken.parquet']
+    pd.read_csv(inbox / 'north.csv').to_parquet(inbox / 'broken.parquet')
+    assert run(folders) == (1, 2, [])
+    assert 'broken.parquet' in json.loads((out / app.REPORT_MANIFEST).read_text())
+
+def test_report_columns_fall_back_to_what_the_file_has():
+    col_types = {'datetime': ['Date'], 'numeric': ['Quantity', 'Total'], 'categorical': ['Store', 'Product']}
+    assert app.report_columns(col_types) == ('Date', 'Total', 'Store')
+    assert app.report_columns(col_types, 'Missing', 'Quantity', 'Product') == ('Date', 'Quantity', 'Product')
+    assert app.report_columns({'datetime': [], 'numeric': [], 'categorical': []}) == (None, None, None)
+
+def test_workbooks_are_reported_from_their_first_sheet(folders, capsys):
+    inbox, out = folders
+    with pd.ExcelWriter(inbox / 'stores.xlsx') as writer:
+        pd.read_csv(inbox / 'north.csv').head(10).to_excel(writer, sheet_name='North', index=False)
+        pd.read_csv(inbox / 'south.csv').to_excel(writer, sheet_name='South', index=False)
+    assert run(folders) == (3, 0, [])
+    assert json.loads((out / app.REPORT_MANIFEST).read_text())['stores.xlsx']['rows'] == 10
+    # The limit is documented in the command's help
+    with pytest.raises(SystemExit):
+        app.report_main(['--help'])
+    assert 'first sheet only' in capsys.readouterr().out
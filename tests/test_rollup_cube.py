@@ -0,0 +1,168 @@
+# test_rollup_cube.py - Cube roll-ups give the sums, counts and means of a direct groupby on the rows
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import supermarket_multilingual as app
+from supermarket_multilingual import CubeAggregates, FrameAggregates, Rollup, RollupCube, RowFilter
+
+@pytest.fixture
+def sales():
+    """Missing values in the measure and in both key kinds, so groupby's dropping of NaN keys is exercised"""
+    rng = np.random.default_rng(8)
+    rows = 4000
+    df = pd.DataFrame({
+        'Date': pd.Timestamp('2024-03-01') + pd.to_timedelta(rng.integers(0, 30 * 24 * 60, size=rows), unit='min'),
+        'Store': pd.Categorical(rng.choice(['North', 'South', 'East', 'West'], size=rows)),
+        'Product': rng.choice(['Milk', 'Bread', 'Eggs'], size=rows).astype(object),
+        'Quantity': rng.integers(1, 12, size=rows),
+        'Total': rng.gamma(2.0, 40.0, size=rows),
+    })
+    df.loc[rng.random(rows) < 0.07, 'Total'] = np.nan
+    df.loc[rng.random(rows) < 0.05, 'Store'] = np.nan
+    df.loc[rng.random(rows) < 0.05, 'Product'] = np.nan
+    df.loc[rng.random(rows) < 0.02, 'Date'] = pd.NaT
+    col_types = {'numeric': ['Quantity', 'Total'], 'categorical': ['Store', 'Product'], 'datetime': ['Date']}
+    return df, col_types
+
+def assert_matches_groupby(rollup, grouped):
+    stats = rollup.stats
+    for col in ('Quantity', 'Total'):
+        expected = grouped[col]
+        np.testing.assert_array_equal(stats[('count', col)].to_numpy(), expected.count().to_numpy())
+        np.testing.assert_allclose(stats[('sum', col)].to_numpy(), expected.sum().to_numpy())
+        means = stats[('sum', col)] / stats[('count', col)]
+        np.testing.assert_allclose(means.to_numpy(), expected.mean().to_numpy())
+        np.testing.assert_allclose(stats[('min', col)].to_numpy(), expected.min().to_numpy())
+        np.testing.assert_allclose(stats[('max', col)].to_numpy(), expected.max().to_numpy())
+    np.testing.assert_array_equal(rollup.rows.to_numpy(), grouped.size().to_numpy())
+
+def test_grand_totals(sales):
+    df, col_types = sales
+    stats = RollupCube.build(df, col_types).grand.stats
+    assert stats[('count', 'Total')].iloc[0] == df['Total'].count()
+    assert stats[('sum', 'Total')].iloc[0] == pytest.approx(df['Total'].sum())
+    assert stats[('sum', 'Quantity')].iloc[0] == df['Quantity'].sum()
+    assert stats[('sumsq', 'Total')].iloc[0] == pytest.approx((df['Total'] ** 2).sum())
+
+def test_by_day(sales):
+    df, col_types = sales
+    rollup = RollupCube.build(df, col_types).by_day['Date']
+    assert_matches_groupby(rollup, df.groupby(df['Date'].dt.floor('D')))
+    # Rows without a date are in the grand totals only
+    assert rollup.rows.sum() == df['Date'].notna().sum()
+
+@pytest.mark.parametrize('col', ['Store', 'Product'])
+def test_by_category(sales, col):
+    df, col_types = sales
+    rollup = RollupCube.build(df, col_types).by_category[col]
+    assert_matches_groupby(rollup, df.groupby(col, observed=True))
+    assert rollup.rows.sum() == df[col].notna().sum()
+
+def widen(df, col_types):
+    return df[col_types['numeric']].astype(np.float64)
+
+def test_collapse_rolls_up_to_one_key(sales):
+    df, col_types = sales
+    keys = [df['Date'].dt.floor('D'), df['Store']]
+    fine = Rollup.build(widen(df, col_types), keys)
+    assert_matches_groupby(fine.collapse(1), df[df['Date'].notna()].groupby('Store', observed=True))
+
+def test_aggregates_answer_like_the_rows(sales):
+    df, col_types = sales
+    cube = CubeAggregates(RollupCube.build(df, col_types), FrameAggregates(df, col_types))
+    rows = FrameAggregates(df, col_types)
+    assert cube.numeric_total(['Quantity', 'Total']) == pytest.approx(rows.numeric_total(['Quantity', 'Total']))
+    assert cube.numeric_average(['Quantity', 'Total']) == pytest.approx(rows.numeric_average(['Quantity', 'Total']))
+    assert cube.unique_count(['Store', 'Product']) == rows.unique_count(['Store', 'Product'])
+    by_cube = cube.category_totals('Store', 'Total').set_index('Store')['Total']
+    by_rows = df.groupby('Store', observed=True)['Total'].sum()
+    pd.testing.assert_series_equal(by_cube.sort_index(), by_rows.sort_index(), check_names=False,
+                                   check_index_type=False, check_categorical=False)
+    assert cube.value_counts('Product').to_dict() == df['Product'].value_counts().to_dict()
+
+@pytest.mark.parametrize('freq', ['D', 'W', 'MS'])
+def test_time_series(sales, freq):
+    df, col_types = sales
+    cube = CubeAggregates(RollupCube.build(df, col_types), FrameAggregates(df, col_types))
+    series = cube.time_series('Date', 'Total', freq)
+    expected = df.set_index('Date')['Total'].dropna().resample(freq).sum()
+    expected = expected[df.set_index('Date')['Total'].dropna().resample(freq).count() > 0]
+    assert list(series['Date']) == list(expected.index)
+    np.testing.assert_allclose(series['Total'].to_numpy(), expected.to_numpy())
+
+def test_narrow_integers_are_widened_before_summing():
+    # Downcast columns, as optimize_memory leaves them: int8 sums and int16 squares would wrap around
+    df = pd.DataFrame({'Units': np.full(1000, 100, dtype=np.int8), 'Price': np.full(1000, 30_000, dtype=np.int16)})
+    stats = RollupCube.build(df, {'numeric': ['Units', 'Price'], 'categorical': [], 'datetime': []}).grand.stats
+    assert stats[('sum', 'Units')].iloc[0] == 100_000
+    assert stats[('sum', 'Price')].iloc[0] == 30_000_000
+    assert stats[('sumsq', 'Price')].iloc[0] == 1000 * 30_000.0 ** 2
+
+def test_high_cardinality_columns_fall_back(sales, monkeypatch):
+    df, col_types = sales
+    monkeypatch.setattr(app, 'CUBE_MAX_CARDINALITY', 3)
+    cube = CubeAggregates(RollupCube.build(df, col_types), FrameAggregates(df, col_types))
+    # Four stores exceed the cap, three products do not
+    assert sorted(cube.cube.by_category) == ['Product']
+    by_cube = cube.category_totals('Store', 'Total').set_index('Store')['Total']
+    by_rows = df.groupby('Store', observed=True)['Total'].sum()
+    np.testing.assert_allclose(by_cube.sort_index().to_numpy(), by_rows.sort_index().to_numpy())
+    assert cube.unique_count(['Store', 'Product']) == 7
+
+def test_cells_keep_rows_with_missing_keys(sales):
+    df, col_types = sales
+    cells = RollupCube.build(df, col_types).cells
+    # Day first, then categorical columns from the fewest values up
+    assert list(cells.stats.index.names) == ['Date', 'Product', 'Store']
+    keys = [df['Date'].dt.floor('D'), df['Product'], df['Store']]
+    assert_matches_groupby(cells, df.groupby(keys, observed=True, dropna=False))
+    assert cells.rows.sum() == len(df)
+
+@pytest.mark.parametrize('values, dates', [
+    ({'Store': ['North', 'South']}, {}),
+    ({'Product': ['Milk']}, {'Date': (pd.Timestamp('2024-03-05'), pd.Timestamp('2024-03-12'))}),
+    ({}, {'Date': (pd.Timestamp('2024-03-20'), pd.Timestamp('2024-04-01'))}),
+])
+def test_filtered_cells_match_masked_rows(sales, values, dates):
+    df, col_types = sales
+    rollup = RollupCube.build(df, col_types).filter_cells(RowFilter(values, dates))
+    mask = np.ones(len(df), dtype=bool)
+    for col, selected in values.items():
+        mask &= df[col].isin(selected).to_numpy()
+    for col, (start, end) in dates.items():
+        mask &= ((df[col] >= start) & (df[col] < end)).to_numpy()
+    selected = df[mask]
+    # Undated and unstocked rows still count when the filter does not select on their missing key
+    assert rollup.rows.sum() == len(selected)
+    assert rollup.total(['Total']) == pytest.approx(selected['Total'].sum())
+    assert rollup.average(['Quantity', 'Total']) == pytest.approx(selected[['Quantity', 'Total']].mean().mean())
+
+def test_filter_on_a_partial_day_is_not_answered(sales):
+    df, col_types = sales
+    cube = RollupCube.build(df, col_types)
+    noon = pd.Timestamp('2024-03-05 12:00')
+    assert cube.filter_cells(RowFilter({}, {'Date': (noon, pd.Timestamp('2024-03-07'))})) is None
+
+def test_hourly_series(sales):
+    df, col_types = sales
+    cube = CubeAggregates(RollupCube.build(df, col_types), FrameAggregates(df, col_types))
+    assert_matches_groupby(cube.cube.by_hour['Date'], df.groupby(df['Date'].dt.floor('h')))
+    series = cube.time_series('Date', 'Total', 'h')
+    expected = df.dropna(subset=['Total']).groupby(df['Date'].dt.floor('h'))['Total'].sum()
+    assert list(series['Date']) == list(expected.index)
+    np.testing.assert_allclose(series['Total'].to_numpy(), expected.to_numpy())
+
+def test_merged_cube_matches_one_built_from_all_rows(sales):
+    df, col_types = sales
+    first, second = df.iloc[:2500], df.iloc[2500:]
+    merged = RollupCube.build(first, col_types).merge(RollupCube.build(second, col_types))
+    whole = RollupCube.build(df, col_types)
+    pd.testing.assert_frame_equal(merged.by_day['Date'].stats, whole.by_day['Date'].stats, check_dtype=False)
+    pd.testing.assert_frame_equal(merged.by_hour['Date'].stats, whole.by_hour['Date'].stats, check_dtype=False)
+    for name in ('Store', 'Product'):
+        pd.testing.assert_frame_equal(merged.by_category[name].stats, whole.by_category[name].stats,
+                                      check_dtype=False, check_index_type=False, check_categorical=False)
+    assert merged.cells.rows.sum() == len(df)
+    assert merged.grand.total(['Total']) == pytest.approx(whole.grand.total(['Total']))
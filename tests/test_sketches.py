@@ -0,0 +1,83 @@
+# test_sketches.py - Sketch estimates stay within their stated error bounds of the exact answers
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sketches import HeavyHitters, HyperLogLog, TDigest
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(7)
+
+@pytest.mark.parametrize('distinct', [50, 5_000, 200_000])
+def test_hyperloglog_within_error(rng, distinct):
+    values = rng.integers(0, distinct, size=300_000)
+    exact = len(np.unique(values))
+    hll = HyperLogLog()
+    for chunk in np.array_split(values, 7):
+        hll.update(chunk)
+    # Four standard errors
+    assert abs(hll.estimate() - exact) <= 4 * hll.relative_error * exact
+
+def test_hyperloglog_merge_matches_single_pass(rng):
+    values = rng.integers(0, 100_000, size=200_000).astype(str)
+    whole, left, right = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    whole.update(values)
+    left.update(values[:80_000])
+    right.update(values[80_000:])
+    assert np.array_equal(left.merge(right).registers, whole.registers)
+
+def test_hyperloglog_ignores_missing():
+    hll = HyperLogLog()
+    hll.update(pd.Series(['a', None, 'b', np.nan, 'a']))
+    assert round(hll.estimate()) == 2
+
+def test_heavy_hitters_bounds(rng):
+    keys = rng.zipf(1.3, size=100_000) % 5_000
+    weights = rng.uniform(0, 100, size=len(keys))
+    exact = pd.Series(weights).groupby(keys).sum()
+    left, right = HeavyHitters(capacity=64), HeavyHitters(capacity=64)
+    left.update(keys[:60_000], weights[:60_000])
+    right.update(keys[60_000:], weights[60_000:])
+    sketch = left.merge(right)
+    top = sketch.top()
+    assert len(top) <= 64
+    assert sketch.total == pytest.approx(exact.sum())
+    assert sketch.error <= sketch.total / 65 + 1e-6
+    # Kept totals are lower bounds short by at most `error`
+    reported = exact[top.index]
+    assert (top <= reported + 1e-6).all()
+    assert (top >= reported - sketch.error - 1e-6).all()
+    # Any key heavier than `error` is kept, so the true top keys are there
+    assert set(exact[exact > sketch.error].index) <= set(top.index)
+
+def test_heavy_hitters_exact_under_capacity():
+    sketch = HeavyHitters(capacity=10)
+    sketch.update(['a', 'b', 'a', None, 'c'], [1.0, 2.0, 3.0, 4.0, 5.0])
+    assert sketch.error == 0
+    assert sketch.top().to_dict() == {'c': 5.0, 'a': 4.0, 'b': 2.0}
+
+@pytest.mark.parametrize('q', [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99])
+def test_tdigest_quantile_rank_error(rng, q):
+    values = rng.lognormal(3, 1, size=200_000)
+    left, right = TDigest(), TDigest()
+    for chunk in np.array_split(values[:120_000], 5):
+        left.update(chunk)
+    right.update(values[120_000:])
+    digest = left.merge(right)
+    assert digest.count == len(values)
+    # Rank of the estimate, against the bound reported for q (plus interpolation slack)
+    rank = np.searchsorted(np.sort(values), digest.quantile(q)) / len(values)
+    assert abs(rank - q) <= digest.rank_error(q) + 0.002
+
+def test_tdigest_extremes_and_histogram(rng):
+    values = rng.normal(0, 1, size=50_000)
+    digest = TDigest()
+    digest.update(np.r_[values, np.nan])
+    assert digest.quantile(0) == values.min()
+    assert digest.quantile(1) == values.max()
+    counts, edges, error = digest.histogram(20)
+    exact, _ = np.histogram(values, bins=edges)
+    assert counts.sum() == pytest.approx(len(values), abs=20)
+    assert np.abs(counts - exact).max() <= error + 1
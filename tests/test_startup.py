@@ -0,0 +1,28 @@
+# test_startup.py - Importing the app leaves the chart, Excel and DuckDB libraries for first use
+
+import json
+import os
+import subprocess
+import sys
+
+import startup_profile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def loaded_after(code):
+    """Which deferred modules a fresh interpreter has loaded after running `code`"""
+    script = (f"import sys\n{code}\n"
+              f"print(__import__('json').dumps([m for m in {startup_profile.DEFERRED_MODULES!r} if m in sys.modules]))")
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+def test_app_import_defers_libraries():
+    assert loaded_after('import supermarket_multilingual') == []
+
+def test_prewarm_imports_them():
+    loaded = loaded_after('import supermarket_multilingual as app\napp.prewarm()')
+    assert {'matplotlib', 'matplotlib.figure', 'openpyxl'} <= set(loaded)
+
+def test_environment_does_not_import_the_app():
+    code = "import environment_info\nenv = environment_info.environment()\nassert 'supermarket_multilingual' not in sys.modules"
+    loaded_after(code)
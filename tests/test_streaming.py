@@ -0,0 +1,87 @@
+# test_streaming.py - A CSV aggregated in small chunks gives the numbers of the same CSV read in one go
+
+import gzip
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import supermarket_multilingual as app
+
+class Upload(io.BytesIO):
+    """Just enough of Streamlit's UploadedFile"""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+def sales_csv(rows=2500):
+    rng = np.random.default_rng(4)
+    df = pd.DataFrame({
+        'Date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 60 * 24, size=rows), unit='h'),
+        'Store': rng.choice(['North', 'South', 'East'], size=rows),
+        'Quantity': rng.integers(1, 20, size=rows),
+        'Total': rng.gamma(2.0, 150.0, size=rows).round(2),
+    })
+    df.loc[rng.random(rows) < 0.05, 'Total'] = np.nan
+    df.loc[rng.random(rows) < 0.05, 'Store'] = np.nan
+    return df.to_csv(index=False).encode('utf-8')
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(app, 'STREAM_CHUNK_ROWS', 300)
+
+def stream_and_read(data, name='sales.csv'):
+    """(streamed aggregates, aggregates of the same file read in one go)"""
+    streamed = app.stream_csv_aggregates(Upload(data, name), app.hash_bytes(data))
+    raw = pd.read_csv(io.BytesIO(data), compression='gzip' if name.endswith('.gz') else None)
+    df, col_types = app.prepare_dataframe(raw)
+    return streamed, app.FrameAggregates(df, col_types)
+
+def test_totals_and_categories():
+    stream, frame = stream_and_read(sales_csv())
+    assert stream.row_count == frame.row_count == 2500
+    assert stream.col_types['numeric'] == ['Quantity', 'Total']
+    assert stream.numeric_total(['Total']) == pytest.approx(frame.numeric_total(['Total']))
+    assert stream.numeric_average(['Quantity', 'Total']) == pytest.approx(frame.numeric_average(['Quantity', 'Total']))
+    assert stream.unique_count(['Store']) == frame.unique_count(['Store']) == 3
+    by_stream = stream.category_totals('Store', 'Total').set_index('Store')['Total']
+    by_frame = frame.category_totals('Store', 'Total').set_index('Store')['Total']
+    pd.testing.assert_series_equal(by_stream.sort_index(), by_frame.sort_index(), check_dtype=False)
+    assert stream.value_counts('Store').to_dict() == frame.value_counts('Store').to_dict()
+
+def test_histogram_rebinned_from_fine_bins():
+    stream, frame = stream_and_read(sales_csv())
+    counts, edges = stream.histogram('Total')
+    exact_counts, exact_edges = frame.histogram('Total')
+    np.testing.assert_allclose(edges, exact_edges)
+    assert counts.sum() == exact_counts.sum()
+    # A fine bin straddling a chart edge lands on one side: counts shift between neighbours only
+    assert np.abs(np.cumsum(counts) - np.cumsum(exact_counts)).max() <= 0.01 * exact_counts.sum()
+
+def test_gzip_upload():
+    data = sales_csv(900)
+    stream, frame = stream_and_read(gzip.compress(data), 'sales.csv.gz')
+    assert stream.row_count == 900
+    assert stream.numeric_total(['Quantity']) == frame.numeric_total(['Quantity'])
+
+def test_progress_per_chunk_and_cached_result():
+    data = sales_csv(3000)
+    progress = []
+    first = app.stream_csv_aggregates(Upload(data, 'sales.csv'), app.hash_bytes(data), progress.append)
+    assert len(progress) == 10 and progress == sorted(progress) and progress[-1] == 1.0
+    # The same content is not read again
+    again = app.stream_csv_aggregates(Upload(data, 'copy.csv'), app.hash_bytes(data), progress.append)
+    assert again is first and len(progress) == 10
+
+def test_later_chunks_take_the_first_chunks_types(monkeypatch):
+    monkeypatch.setattr(app, 'STREAM_CHUNK_ROWS', 2)
+    data = b"Store,Total\nNorth,10\nSouth,5\nEast,n/a\nNorth,2.5\n"
+    stream = app.stream_csv_aggregates(Upload(data, 'mixed.csv'), app.hash_bytes(data))
+    # 'n/a' in a numeric column is missing, not a reason to make the column text
+    assert stream.col_types['numeric'] == ['Total']
+    assert stream.numeric_total(['Total']) == 17.5
+    assert stream.category_totals('Store', 'Total').set_index('Store')['Total'].to_dict() == {
+        'North': 12.5, 'South': 5.0, 'East': 0.0}
@@ -0,0 +1,59 @@
+# test_type_detection.py - Sampled type detection looks at the whole column, not just its first rows
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import supermarket_multilingual as app
+
+ROWS = 10_000
+
+def test_text_after_numeric_head_stays_categorical():
+    # 70% numbers up front, then product codes: a head sample would call this numeric
+    values = [str(i) for i in range(7000)] + [f"SKU-{i}" for i in range(3000)]
+    series = pd.Series(values, name='Code', dtype=object)
+    kind, converted, _ = app.detect_text_column(series, allow_dates=False)
+    assert kind == 'categorical'
+    # Nothing was coerced away
+    assert converted.tolist() == values
+
+def test_sample_spans_every_stratum():
+    sample = app.stratified_sample(pd.Series(np.arange(ROWS)))
+    assert len(sample) == app.TYPE_SAMPLE_SIZE
+    assert sample.is_unique and sample.is_monotonic_increasing
+    # One draw per 5-row stratum
+    assert (sample.to_numpy() // (ROWS // app.TYPE_SAMPLE_SIZE) == np.arange(app.TYPE_SAMPLE_SIZE)).all()
+
+def test_numbers_with_a_few_stray_strings():
+    values = pd.Series([f"{i * 1.5}" for i in range(ROWS)], dtype=object)
+    values[::100] = 'n/a'
+    kind, converted, _ = app.detect_text_column(values, allow_dates=True)
+    assert kind == 'numeric'
+    assert converted.isna().sum() == ROWS // 100
+    assert converted[1] == 1.5 and converted.dtype == np.float64
+
+def test_dates_parsed_with_the_guessed_format():
+    days = pd.date_range('2024-01-01', periods=400, freq='D')
+    values = pd.Series(np.tile(days.strftime('%Y/%m/%d'), 25), dtype=object)
+    kind, converted, date_format = app.detect_text_column(values, allow_dates=True)
+    assert kind == 'datetime' and date_format == '%Y/%m/%d'
+    assert converted[0] == pd.Timestamp('2024-01-01') and converted[12] == pd.Timestamp('2024-01-13')
+    kind, _, _ = app.detect_text_column(values, allow_dates=False)
+    assert kind == 'categorical'
+
+def test_prepare_dataframe_classifies_columns():
+    rng = np.random.default_rng(1)
+    raw = pd.DataFrame({
+        'When': pd.Series(pd.date_range('2024-01-01', periods=ROWS, freq='h').astype(str), dtype=object),
+        'Store': pd.Series(rng.choice(['North', 'South'], size=ROWS), dtype=object),
+        'Units': pd.Series(rng.integers(0, 50, size=ROWS).astype(str), dtype=object),
+        'Empty': np.nan,
+        'Id': pd.Series([f"order-{i}" for i in range(ROWS)], dtype=object),
+    })
+    df, col_types = app.prepare_dataframe(raw)
+    assert 'Empty' not in df.columns
+    assert col_types['numeric'] == ['Units'] and col_types['datetime'] == ['When']
+    assert col_types['categorical'] == ['Store', 'Id']
+    # Two stores repeat; unique order ids do not
+    assert col_types['low_cardinality'] == ['Store']
+    assert df['Units'].sum() == raw['Units'].astype(int).sum()